@@ -2,3 +2,213 @@
 
 """This module contains the value type classes that are used in the ``kiara_plugin.topic_modelling`` package.
 """
+
+import atexit
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, ClassVar, Dict, Mapping, Type, Union
+
+from kiara.data_types import DataTypeConfig
+from kiara.data_types.included_core_types import AnyType
+from kiara.models.module.manifest import Manifest
+from kiara.models.values.value import (
+    SerializationMetadata,
+    SerializationResult,
+    SerializedBytes,
+    SerializedData,
+    SerializedFile,
+    Value,
+)
+from kiara_plugin.topic_modelling.models import DocTermMatrix, LdaModel
+
+
+def _create_serialization_dir() -> str:
+    """Create a temporary directory for the files of a serialized value, which is removed when the process exits.
+
+    The files only need to exist until the value is persisted: data stores read the content of serialized files, and
+    store it in their own chunks (computing the chunk ids from the content), they never keep a reference to the files,
+    and don't move them. So the directory doesn't need to be on the same file system as the data store.
+    """
+
+    temp_dir = tempfile.mkdtemp(prefix="kiara_topic_modelling_")
+    atexit.register(shutil.rmtree, temp_dir, ignore_errors=True)
+    return temp_dir
+
+
+class LdaModelType(AnyType[LdaModel, DataTypeConfig]):
+    """A trained LDA topic model.
+
+    Internally, this type uses the [LdaModel][kiara_plugin.topic_modelling.models.LdaModel] wrapper class, which holds
+    the topic-word matrix, the vocabulary and the hyperparameters of the model. Serialized models are memory-mapped
+    when they are loaded, so downstream steps can use a model without re-training it, and without unpickling it.
+    """
+
+    _data_type_name: ClassVar[str] = "lda_model"
+
+    @classmethod
+    def python_class(cls) -> Type:
+        return LdaModel  # type: ignore
+
+    def parse_python_obj(self, data: Any) -> LdaModel:
+
+        if isinstance(data, LdaModel):
+            return data
+
+        from gensim.models import LdaModel as GensimLdaModel  # type: ignore
+
+        if isinstance(data, GensimLdaModel):
+            return LdaModel.create_from_gensim(data)
+
+        raise Exception(f"Can't create LDA model, invalid source data type: {type(data)}.")
+
+    def _validate(cls, value: Any) -> None:
+
+        if not isinstance(value, LdaModel):
+            raise Exception(
+                f"Invalid type '{type(value).__name__}', must be an instance of the 'LdaModel' class."
+            )
+
+    def serialize(self, data: LdaModel) -> SerializedData:
+
+        import numpy as np
+        import pyarrow as pa
+
+        temp_f = _create_serialization_dir()
+
+        topic_word_file = os.path.join(temp_f, "topic_word.npy")
+        np.save(topic_word_file, np.ascontiguousarray(data.topic_word, dtype=np.float32), allow_pickle=False)
+
+        vocabulary_file = os.path.join(temp_f, "vocabulary.arrow")
+        vocabulary = data.vocabulary
+        with pa.OSFile(vocabulary_file, "wb") as sink:
+            with pa.ipc.new_file(sink, schema=vocabulary.schema) as writer:
+                writer.write_table(vocabulary)
+
+        model_data = data.model_dump(exclude={"topic_word_path", "vocabulary_path"})
+
+        chunks: Dict[str, Union[SerializedBytes, SerializedFile]] = {
+            "model.json": SerializedBytes(chunk=json.dumps(model_data).encode("utf-8"), codec="raw"),
+            "topic_word.npy": SerializedFile(file=topic_word_file, codec="raw"),
+            "vocabulary.arrow": SerializedFile(file=vocabulary_file, codec="raw"),
+        }
+
+        deserialize = Manifest(
+            module_type="load.lda_model",
+            module_config={
+                "value_type": "lda_model",
+                "target_profile": "python_object",
+                "serialization_profile": "lda_model",
+            },
+        )
+
+        serialized = SerializationResult(
+            data_type=self.data_type_name,
+            data_type_config=self.type_config.model_dump(),
+            data=dict(chunks),
+            serialization_profile="lda_model",
+            metadata=SerializationMetadata(environment={}, deserialize={"python_object": deserialize}),
+        )
+        return serialized
+
+    def pretty_print_as__string(
+        self, value: Value, render_config: Mapping[str, Any]
+    ) -> Any:
+
+        model: LdaModel = value.data
+
+        lines = [f"LDA model: {model.num_topics} topics, {model.vocabulary_size} tokens, {model.num_documents} documents"]
+        for topic_id in range(model.num_topics):
+            terms = ", ".join(token for token, _ in model.get_topic_terms(topic_id, topn=10))
+            lines.append(f"  topic {topic_id}: {terms}")
+        return "\n".join(lines)
+
+    def pretty_print_as__terminal_renderable(
+        self, value: Value, render_config: Mapping[str, Any]
+    ) -> Any:
+
+        return self.pretty_print_as__string(value=value, render_config=render_config)
+
+
+class DocTermMatrixType(AnyType[DocTermMatrix, DataTypeConfig]):
+    """A corpus as a sparse (CSR) document-term matrix, with its vocabulary and optional TF-IDF weights.
+
+    Internally, this type uses the [DocTermMatrix][kiara_plugin.topic_modelling.models.DocTermMatrix] wrapper class.
+    Serialized matrices are memory-mapped when they are loaded, so topic model, coherence and statistics modules can
+    all use the same encoded corpus, without building it again, and without copying it.
+    """
+
+    _data_type_name: ClassVar[str] = "doc_term_matrix"
+
+    @classmethod
+    def python_class(cls) -> Type:
+        return DocTermMatrix  # type: ignore
+
+    def parse_python_obj(self, data: Any) -> DocTermMatrix:
+
+        if isinstance(data, DocTermMatrix):
+            return data
+
+        raise Exception(f"Can't create document-term matrix, invalid source data type: {type(data)}.")
+
+    def _validate(cls, value: Any) -> None:
+
+        if not isinstance(value, DocTermMatrix):
+            raise Exception(
+                f"Invalid type '{type(value).__name__}', must be an instance of the 'DocTermMatrix' class."
+            )
+
+    def serialize(self, data: DocTermMatrix) -> SerializedData:
+
+        import numpy as np
+        import pyarrow as pa
+
+        temp_f = _create_serialization_dir()
+
+        chunks: Dict[str, Union[SerializedBytes, SerializedFile]] = {}
+        for name in data.array_names:
+            array_file = os.path.join(temp_f, f"{name}.npy")
+            np.save(array_file, np.ascontiguousarray(getattr(data, name)), allow_pickle=False)
+            chunks[f"{name}.npy"] = SerializedFile(file=array_file, codec="raw")
+
+        vocabulary_file = os.path.join(temp_f, "vocabulary.arrow")
+        vocabulary = data.vocabulary
+        with pa.OSFile(vocabulary_file, "wb") as sink:
+            with pa.ipc.new_file(sink, schema=vocabulary.schema) as writer:
+                writer.write_table(vocabulary)
+        chunks["vocabulary.arrow"] = SerializedFile(file=vocabulary_file, codec="raw")
+
+        matrix_data = data.model_dump(exclude={"array_paths", "vocabulary_path"})
+        chunks["matrix.json"] = SerializedBytes(chunk=json.dumps(matrix_data).encode("utf-8"), codec="raw")
+
+        deserialize = Manifest(
+            module_type="load.doc_term_matrix",
+            module_config={
+                "value_type": "doc_term_matrix",
+                "target_profile": "python_object",
+                "serialization_profile": "doc_term_matrix",
+            },
+        )
+
+        serialized = SerializationResult(
+            data_type=self.data_type_name,
+            data_type_config=self.type_config.model_dump(),
+            data=dict(chunks),
+            serialization_profile="doc_term_matrix",
+            metadata=SerializationMetadata(environment={}, deserialize={"python_object": deserialize}),
+        )
+        return serialized
+
+    def pretty_print_as__string(
+        self, value: Value, render_config: Mapping[str, Any]
+    ) -> Any:
+
+        matrix: DocTermMatrix = value.data
+        return f"Document-term matrix ({matrix.weighting}): {matrix.num_documents} documents, {matrix.vocabulary_size} tokens, {matrix.num_nonzero} non-zero entries"
+
+    def pretty_print_as__terminal_renderable(
+        self, value: Value, render_config: Mapping[str, Any]
+    ) -> Any:
+
+        return self.pretty_print_as__string(value=value, render_config=render_config)
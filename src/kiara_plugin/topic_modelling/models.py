@@ -8,3 +8,416 @@ other type of models -- that is attached to data, as well as *kiara* modules.
 Metadata models must be a sub-class of [kiara.metadata.MetadataModel][kiara.metadata.MetadataModel]. Other models usually
 sub-class a pydantic BaseModel or implement custom base classes.
 """
+
+import hashlib
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    ClassVar,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Tuple,
+    Union,
+)
+
+from pydantic import Field, PrivateAttr
+
+from kiara.models import KiaraModel
+from kiara.models.values.value_metadata import ValueMetadata
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pyarrow as pa
+    from gensim.models import LdaModel as GensimLdaModel  # type: ignore
+    from scipy import sparse  # type: ignore
+
+    from kiara.models.values.value import Value
+
+
+def _hash_model_data(metadata: Dict[str, Any], arrays: Mapping[str, "np.ndarray"], tables: Mapping[str, "pa.Table"]) -> Dict[str, Any]:
+    """Return the data to hash for a model that is backed by (numpy) arrays and (Arrow) tables.
+
+    That is the metadata of the model, and a sha256 digest of the content of every array and table, so the hash of a
+    model doesn't depend on whether its data is in memory or memory-mapped from files (or on the paths of those files).
+    """
+
+    import numpy as np
+    import pyarrow as pa
+
+    digests: Dict[str, str] = {}
+    for name, array in arrays.items():
+        contiguous = np.ascontiguousarray(array)
+        digest = hashlib.sha256(f"{contiguous.dtype.str}{contiguous.shape}".encode("utf-8"))
+        digest.update(contiguous.data)
+        digests[name] = digest.hexdigest()
+
+    for name, table in tables.items():
+        sink = pa.BufferOutputStream()
+        combined = table.combine_chunks()
+        with pa.ipc.new_stream(sink, schema=combined.schema) as writer:
+            writer.write_table(combined)
+        digests[name] = hashlib.sha256(sink.getvalue()).hexdigest()
+
+    return {"metadata": metadata, "data": digests}
+
+
+class LdaModel(KiaraModel):
+    """A trained LDA topic model.
+
+    The model consists of the topic-word matrix (gensim's variational parameters 'lambda': one row per topic, one
+    column per token), the vocabulary (a table with the columns 'id', 'token', 'document_frequency' and
+    'term_frequency', the position of a token in the topic-word matrix is its id), and the hyperparameters of the model.
+
+    Serialized models are stored as a '.npy' file for the topic-word matrix and an Arrow IPC file for the vocabulary,
+    both are memory-mapped when they are loaded, nothing is unpickled.
+    """
+
+    @classmethod
+    def create_from_gensim(
+        cls, model: "GensimLdaModel", vocabulary: Union["pa.Table", None] = None, version: int = 1, **hyperparameters: Any
+    ) -> "LdaModel":
+        """Create a model from a trained gensim model.
+
+        If no vocabulary table is provided, it is created from the dictionary of the gensim model. Additional
+        (training) hyperparameters that gensim doesn't keep, like the number of passes, can be passed as keyword arguments.
+        """
+
+        import numpy as np
+        import pyarrow as pa
+
+        id2word = model.id2word
+        if vocabulary is None:
+            ids = sorted(id2word.token2id.values())
+            vocabulary = pa.table(
+                {
+                    "id": pa.array(ids, type=pa.int64()),
+                    "token": pa.array([id2word[idx] for idx in ids], type=pa.string()),
+                    "document_frequency": pa.array([id2word.dfs.get(idx, 0) for idx in ids], type=pa.int64()),
+                    "term_frequency": pa.array([id2word.cfs.get(idx, 0) for idx in ids], type=pa.int64()),
+                }
+            )
+
+        eta = np.asarray(model.eta)
+        params: Dict[str, Any] = {
+            "alpha": np.asarray(model.alpha).tolist(),
+            "eta": float(eta.flat[0]) if eta.size and np.all(eta == eta.flat[0]) else eta.tolist(),
+            "decay": model.decay,
+            "offset": model.offset,
+            "iterations": model.iterations,
+            "gamma_threshold": model.gamma_threshold,
+            "chunksize": model.chunksize,
+            "passes": model.passes,
+        }
+        params.update(hyperparameters)
+
+        obj = cls(
+            num_topics=model.num_topics,
+            num_documents=id2word.num_docs,
+            num_updates=model.num_updates,
+            num_processed_documents=model.state.numdocs,
+            version=version,
+            hyperparameters=params,
+        )
+        obj._topic_word = model.state.get_lambda().astype(np.float32, copy=False)
+        obj._vocabulary = vocabulary
+        return obj
+
+    num_topics: int = Field(description="The number of topics.")
+    num_documents: int = Field(description="The number of documents in the corpus the model was trained on.")
+    version: int = Field(description="The version of the model, incremented every time the model is updated with new documents.", default=1)
+    num_updates: int = Field(description="The number of documents the model was updated with (counting all passes).", default=0)
+    num_processed_documents: int = Field(description="The number of documents in the sufficient statistics of the model.", default=0)
+    hyperparameters: Dict[str, Any] = Field(description="The hyperparameters of the model ('alpha', 'eta', 'decay', ...).", default_factory=dict)
+    topic_word_path: Union[str, None] = Field(description="The path to the (.npy) file backing the topic-word matrix.", default=None)
+    vocabulary_path: Union[str, None] = Field(description="The path to the (Arrow IPC) file backing the vocabulary.", default=None)
+
+    _topic_word: Union["np.ndarray", None] = PrivateAttr(default=None)
+    _vocabulary: Union["pa.Table", None] = PrivateAttr(default=None)
+
+    def _retrieve_data_to_hash(self) -> Any:
+        return _hash_model_data(
+            self.model_dump(exclude={"topic_word_path", "vocabulary_path"}),
+            arrays={"topic_word": self.topic_word},
+            tables={"vocabulary": self.vocabulary},
+        )
+
+    @property
+    def topic_word(self) -> "np.ndarray":
+        """The (unnormalized) topic-word matrix, with shape (num_topics, vocabulary_size)."""
+
+        if self._topic_word is not None:
+            return self._topic_word
+
+        if not self.topic_word_path:
+            raise Exception("Can't retrieve topic-word matrix, object not initialized (yet).")
+
+        import numpy as np
+
+        self._topic_word = np.load(self.topic_word_path, mmap_mode="r", allow_pickle=False)
+        return self._topic_word
+
+    @property
+    def vocabulary(self) -> "pa.Table":
+        """The vocabulary of the model, sorted by token id."""
+
+        if self._vocabulary is not None:
+            return self._vocabulary
+
+        if not self.vocabulary_path:
+            raise Exception("Can't retrieve vocabulary, object not initialized (yet).")
+
+        import pyarrow as pa
+
+        with pa.memory_map(self.vocabulary_path, "r") as source:
+            self._vocabulary = pa.ipc.open_file(source).read_all()
+        return self._vocabulary
+
+    @property
+    def vocabulary_size(self) -> int:
+        return int(self.vocabulary.num_rows)
+
+    def get_topics(self) -> "np.ndarray":
+        """Return the topic-word probabilities, with shape (num_topics, vocabulary_size)."""
+
+        topic_word = self.topic_word
+        topics: "np.ndarray" = topic_word / topic_word.sum(axis=1, keepdims=True)
+        return topics
+
+    def get_topic_terms(self, topic_id: int, topn: int = 10) -> List[Tuple[str, float]]:
+        """Return the 'topn' most probable tokens of a topic, with their probabilities."""
+
+        import numpy as np
+
+        topic = self.topic_word[topic_id]
+        topic = topic / topic.sum()
+        best = np.argsort(-topic, kind="stable")[:topn]
+        tokens = self.vocabulary.column("token").take(best).to_pylist()
+        return list(zip(tokens, topic[best].tolist()))
+
+    def to_gensim(self) -> "GensimLdaModel":
+        """Re-create the gensim model, e.g. to infer topics for new documents, or to continue training."""
+
+        import numpy as np
+        from gensim.models import LdaModel as GensimLdaModel  # type: ignore
+
+        from kiara_plugin.topic_modelling.utils import create_gensim_dictionary
+
+        params = self.hyperparameters
+        model_args = {
+            key: params[key]
+            for key in ("decay", "offset", "iterations", "gamma_threshold", "chunksize", "passes")
+            if params.get(key) is not None
+        }
+        eta = params.get("eta")
+        if isinstance(eta, (int, float)):
+            eta = np.full(self.vocabulary_size, eta, dtype=np.float32)
+        model = GensimLdaModel(
+            id2word=create_gensim_dictionary(self.vocabulary, num_docs=self.num_documents),
+            num_topics=self.num_topics,
+            alpha=np.asarray(params["alpha"], dtype=np.float32),
+            eta=None if eta is None else np.asarray(eta, dtype=np.float32),
+            random_state=params.get("random_state"),
+            dtype=np.float32,
+            **model_args,
+        )
+        model.state.sstats[...] = self.topic_word - model.eta
+        model.state.numdocs = self.num_processed_documents
+        model.num_updates = self.num_updates
+        model.sync_state()
+        return model
+
+
+class LdaModelMetadata(ValueMetadata):
+    """LDA model stats."""
+
+    _metadata_key: ClassVar[str] = "lda_model"
+
+    @classmethod
+    def retrieve_supported_data_types(cls) -> Iterable[str]:
+        return ["lda_model"]
+
+    @classmethod
+    def create_value_metadata(cls, value: "Value") -> "LdaModelMetadata":
+
+        model: LdaModel = value.data
+        return LdaModelMetadata(
+            num_topics=model.num_topics,
+            vocabulary_size=model.vocabulary_size,
+            num_documents=model.num_documents,
+            version=model.version,
+            hyperparameters=model.hyperparameters,
+        )
+
+    num_topics: int = Field(description="The number of topics.")
+    vocabulary_size: int = Field(description="The number of tokens in the vocabulary.")
+    num_documents: int = Field(description="The number of documents in the corpus the model was trained on.")
+    version: int = Field(description="The version of the model.")
+    hyperparameters: Dict[str, Any] = Field(description="The hyperparameters of the model.")
+
+
+class DocTermMatrix(KiaraModel):
+    """A corpus as a sparse document-term matrix, in CSR format.
+
+    The matrix consists of the row offsets ('indptr', one row per document), the token ids ('indices') and counts of
+    the non-zero entries of every row (sorted by token id), optionally TF-IDF weights for those entries, and the
+    vocabulary (a table with the columns 'id', 'token', 'document_frequency' and 'term_frequency', like the one of
+    [LdaModel][kiara_plugin.topic_modelling.models.LdaModel]).
+
+    Serialized matrices are stored as '.npy' files for the arrays and an Arrow IPC file for the vocabulary, all of them
+    are memory-mapped when they are loaded, so the same encoded corpus can be shared by several modules without copying.
+    """
+
+    @classmethod
+    def create(
+        cls,
+        indptr: "np.ndarray",
+        indices: "np.ndarray",
+        counts: "np.ndarray",
+        vocabulary: "pa.Table",
+        weights: Union["np.ndarray", None] = None,
+    ) -> "DocTermMatrix":
+
+        import numpy as np
+
+        obj = cls(
+            num_documents=len(indptr) - 1,
+            vocabulary_size=vocabulary.num_rows,
+            num_nonzero=len(indices),
+            weighting="count" if weights is None else "tfidf",
+        )
+        obj._arrays = {
+            "indptr": indptr.astype(np.int64, copy=False),
+            "indices": indices.astype(np.int64, copy=False),
+            "counts": counts.astype(np.int64, copy=False),
+        }
+        if weights is not None:
+            obj._arrays["weights"] = weights.astype(np.float64, copy=False)
+        obj._vocabulary = vocabulary
+        return obj
+
+    num_documents: int = Field(description="The number of documents (rows).")
+    vocabulary_size: int = Field(description="The number of tokens in the vocabulary (columns).")
+    num_nonzero: int = Field(description="The number of non-zero entries.")
+    weighting: str = Field(description="The weighting of the entries: 'count', or 'tfidf' if the matrix has TF-IDF weights.", default="count")
+    array_paths: Dict[str, str] = Field(description="The paths to the (.npy) files backing the arrays, by array name.", default_factory=dict)
+    vocabulary_path: Union[str, None] = Field(description="The path to the (Arrow IPC) file backing the vocabulary.", default=None)
+
+    _arrays: Dict[str, "np.ndarray"] = PrivateAttr(default_factory=dict)
+    _vocabulary: Union["pa.Table", None] = PrivateAttr(default=None)
+
+    def _retrieve_data_to_hash(self) -> Any:
+        return _hash_model_data(
+            self.model_dump(exclude={"array_paths", "vocabulary_path"}),
+            arrays={name: self._get_array(name) for name in self.array_names},
+            tables={"vocabulary": self.vocabulary},
+        )
+
+    def _get_array(self, name: str) -> "np.ndarray":
+
+        if name in self._arrays:
+            return self._arrays[name]
+
+        path = self.array_paths.get(name)
+        if not path:
+            raise Exception(f"Can't retrieve array '{name}', object not initialized (yet).")
+
+        import numpy as np
+
+        self._arrays[name] = np.load(path, mmap_mode="r", allow_pickle=False)
+        return self._arrays[name]
+
+    @property
+    def array_names(self) -> List[str]:
+        """The names of the arrays of the matrix ('weights' is only available for TF-IDF weighted matrices)."""
+
+        names = ["indptr", "indices", "counts"]
+        if self.weighting == "tfidf":
+            names.append("weights")
+        return names
+
+    @property
+    def indptr(self) -> "np.ndarray":
+        """The row offsets, with length num_documents + 1."""
+        return self._get_array("indptr")
+
+    @property
+    def indices(self) -> "np.ndarray":
+        """The token ids of the non-zero entries."""
+        return self._get_array("indices")
+
+    @property
+    def counts(self) -> "np.ndarray":
+        """The token counts of the non-zero entries."""
+        return self._get_array("counts")
+
+    @property
+    def weights(self) -> "np.ndarray":
+        """The TF-IDF weights of the non-zero entries, or the counts (as floats) if the matrix isn't TF-IDF weighted."""
+
+        if self.weighting != "tfidf":
+            import numpy as np
+
+            return self.counts.astype(np.float64)
+        return self._get_array("weights")
+
+    @property
+    def vocabulary(self) -> "pa.Table":
+        """The vocabulary of the matrix, sorted by token id."""
+
+        if self._vocabulary is not None:
+            return self._vocabulary
+
+        if not self.vocabulary_path:
+            raise Exception("Can't retrieve vocabulary, object not initialized (yet).")
+
+        import pyarrow as pa
+
+        with pa.memory_map(self.vocabulary_path, "r") as source:
+            self._vocabulary = pa.ipc.open_file(source).read_all()
+        return self._vocabulary
+
+    def to_scipy(self, weighted: bool = True) -> "sparse.csr_matrix":
+        """Return the matrix as a scipy CSR matrix, with the TF-IDF weights (if 'weighted' is set and available) or the counts."""
+
+        from scipy import sparse  # type: ignore
+
+        data = self.weights if weighted else self.counts
+        return sparse.csr_matrix((data, self.indices, self.indptr), shape=(self.num_documents, self.vocabulary_size), copy=False)
+
+    def iter_documents(self) -> Iterator[List[Tuple[int, int]]]:
+        """Iterate over the documents as gensim bag-of-words documents ((token id, count) tuples)."""
+
+        from kiara_plugin.topic_modelling.utils import pairwise
+
+        indices, counts = self.indices, self.counts
+        for start, end in pairwise(self.indptr.tolist()):
+            yield list(zip(indices[start:end].tolist(), counts[start:end].tolist()))
+
+
+class DocTermMatrixMetadata(ValueMetadata):
+    """Document-term matrix stats."""
+
+    _metadata_key: ClassVar[str] = "doc_term_matrix"
+
+    @classmethod
+    def retrieve_supported_data_types(cls) -> Iterable[str]:
+        return ["doc_term_matrix"]
+
+    @classmethod
+    def create_value_metadata(cls, value: "Value") -> "DocTermMatrixMetadata":
+
+        matrix: DocTermMatrix = value.data
+        return DocTermMatrixMetadata(
+            num_documents=matrix.num_documents,
+            vocabulary_size=matrix.vocabulary_size,
+            num_nonzero=matrix.num_nonzero,
+            weighting=matrix.weighting,
+        )
+
+    num_documents: int = Field(description="The number of documents.")
+    vocabulary_size: int = Field(description="The number of tokens in the vocabulary.")
+    num_nonzero: int = Field(description="The number of non-zero entries.")
+    weighting: str = Field(description="The weighting of the entries ('count' or 'tfidf').")
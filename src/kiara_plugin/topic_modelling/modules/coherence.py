@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Tuple, Union
+
+from kiara.api import KiaraModule
+from kiara.exceptions import KiaraProcessingException
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pyarrow as pa
+    from scipy import sparse  # type: ignore
+
+COHERENCE_MEASURES = ["u_mass", "c_npmi", "c_v"]
+
+# the default (sliding) window sizes of the measures, like in gensim; 'u_mass' uses the whole document as window
+DEFAULT_WINDOW_SIZES = {"u_mass": None, "c_npmi": 10, "c_v": 110}
+
+# number of documents that are counted at a time, by one worker process
+COUNT_CHUNK_SIZE = 10000
+
+# same as gensim, to avoid taking the logarithm of 0
+EPSILON = 1e-12
+
+# (corpus hash, window size) -> co-occurrence statistics, the most recently used entries are kept
+_MAX_CACHED_STATISTICS = 16
+_statistics_cache: "OrderedDict[Tuple[str, Union[int, None]], Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _count_chunk(
+    doc_lengths: "np.ndarray", doc_of: "np.ndarray", positions: "np.ndarray", word_ids: "np.ndarray", num_words: int,
+    window_size: Union[int, None], first_word: int = 0
+) -> Tuple["np.ndarray", "sparse.csr_matrix", int]:
+    """Count the (co-)occurrences of the relevant words in a chunk of documents, this is the unit of work of a worker process.
+
+    'doc_of', 'positions' and 'word_ids' describe every occurrence of a relevant word: the document, the position of
+    the token within the document, and the index of the word. If 'window_size' is None, every document is one
+    window, otherwise every document has a window for every position a window of that size fits in (and documents
+    that are shorter than the window are one window), like gensim's boolean sliding window.
+
+    Only the words from index 'first_word' on are counted, with all of the words. Returns the number of windows every
+    counted word occurs in, the number of windows every pair of a counted word and a word occurs in (a sparse matrix
+    with one row per counted word), and the number of windows.
+    """
+
+    import numpy as np
+    from scipy import sparse  # type: ignore
+
+    if window_size is None:
+        keys = np.unique(doc_of.astype(np.int64) * num_words + word_ids)
+        presence = sparse.csr_matrix(
+            (np.ones(len(keys)), (keys // num_words, keys % num_words)), shape=(len(doc_lengths), num_words)
+        )
+        co_occurrences = (presence.T.tocsr()[first_word:] @ presence).tocsr()
+        return co_occurrences.diagonal(k=first_word), co_occurrences, len(doc_lengths)
+
+    # windows of every document, and their offsets within the chunk
+    num_windows = np.maximum(doc_lengths - window_size + 1, 1)
+    window_offsets = np.cumsum(num_windows) - num_windows
+
+    # every occurrence is in a range of windows [start, end)
+    starts = np.maximum(positions - window_size + 1, 0) + window_offsets[doc_of]
+    ends = np.minimum(positions, num_windows[doc_of] - 1) + 1 + window_offsets[doc_of]
+
+    # merge the overlapping ranges of the same word; for a word, ends grow with starts, since all ranges have the same length
+    order = np.lexsort((starts, word_ids))
+    starts, ends, word_ids = starts[order], ends[order], word_ids[order]
+    new_range = np.ones(len(starts), dtype=bool)
+    new_range[1:] = (word_ids[1:] != word_ids[:-1]) | (starts[1:] > ends[:-1])
+    range_index = np.cumsum(new_range) - 1
+    range_starts = starts[new_range]
+    range_ends = np.zeros(len(range_starts), dtype=np.int64)
+    np.maximum.at(range_ends, range_index, ends)
+    range_words = word_ids[new_range]
+
+    # split the windows into segments in which the set of words doesn't change, weighted by their number of windows
+    bounds = np.unique(np.concatenate([range_starts, range_ends]))
+    segment_lengths = np.diff(bounds)
+    first_segment = np.searchsorted(bounds, range_starts)
+    segments_per_range = np.searchsorted(bounds, range_ends) - first_segment
+    rows = np.repeat(first_segment - np.cumsum(segments_per_range) + segments_per_range, segments_per_range)
+    rows += np.arange(len(rows))
+    presence = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, np.repeat(range_words, segments_per_range))), shape=(len(segment_lengths), num_words)
+    )
+
+    weighted = sparse.diags(segment_lengths.astype(np.float64)) @ presence
+    co_occurrences = (presence.T.tocsr()[first_word:] @ weighted).tocsr()
+    return co_occurrences.diagonal(k=first_word), co_occurrences, int(num_windows.sum())
+
+
+def _iter_count_tasks(
+    tokens_array: "pa.ChunkedArray", word_index: "np.ndarray", chunk_size: int
+) -> Iterator[Tuple["np.ndarray", "np.ndarray", "np.ndarray", "np.ndarray"]]:
+    """Yield the arguments of '_count_chunk' for every chunk of documents of a dictionary-encoded token array."""
+
+    import numpy as np
+    import pyarrow.compute as pc  # type: ignore
+
+    from kiara_plugin.topic_modelling.utils import iter_chunks
+
+    for chunk in iter_chunks(tokens_array, chunk_size=chunk_size):
+        doc_lengths = pc.fill_null(pc.list_value_length(chunk), 0).to_numpy(zero_copy_only=False).astype(np.int64)
+        token_ids = pc.fill_null(chunk.flatten().indices, -1).to_numpy(zero_copy_only=False).astype(np.int64)
+        doc_of = pc.list_parent_indices(chunk).to_numpy(zero_copy_only=False).astype(np.int64)
+        positions = np.arange(len(token_ids)) - (np.cumsum(doc_lengths) - doc_lengths)[doc_of]
+
+        word_ids = np.where(token_ids >= 0, word_index[np.maximum(token_ids, 0)], -1)
+        relevant = word_ids >= 0
+        yield doc_lengths, doc_of[relevant], positions[relevant], word_ids[relevant]
+
+
+def _count_co_occurrences(
+    tokens_array: "pa.ChunkedArray", words: List[str], window_size: Union[int, None], num_workers: Union[int, None],
+    first_word: int = 0
+) -> Tuple["np.ndarray", "sparse.csr_matrix", int]:
+    """Count the (co-)occurrences of a list of words in a dictionary-encoded token array, in parallel over chunks of documents.
+
+    Only the words from index 'first_word' on are counted (with all of the words), see '_count_chunk'.
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc  # type: ignore
+    from scipy import sparse  # type: ignore
+
+    from kiara_plugin.topic_modelling.utils import get_vocabulary
+
+    num_words = len(words)
+    vocabulary = get_vocabulary(tokens_array)
+    word_index = pc.fill_null(pc.index_in(vocabulary, value_set=pa.array(words, type=pa.string())), -1)
+    word_index = word_index.to_numpy(zero_copy_only=False).astype(np.int64)
+
+    occurrences = np.zeros(num_words - first_word, dtype=np.float64)
+    co_occurrences = sparse.csr_matrix((num_words - first_word, num_words), dtype=np.float64)
+    num_windows = 0
+
+    tasks = _iter_count_tasks(tokens_array, word_index, chunk_size=COUNT_CHUNK_SIZE)
+    if num_workers == 1 or len(tokens_array) <= COUNT_CHUNK_SIZE:
+        results = (_count_chunk(*task, num_words, window_size, first_word) for task in tasks)
+        for chunk_occurrences, chunk_co_occurrences, chunk_windows in results:
+            occurrences += chunk_occurrences
+            co_occurrences += chunk_co_occurrences
+            num_windows += chunk_windows
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers or os.cpu_count()) as executor:
+            futures = [executor.submit(_count_chunk, *task, num_words, window_size, first_word) for task in tasks]
+            for future in futures:
+                chunk_occurrences, chunk_co_occurrences, chunk_windows = future.result()
+                occurrences += chunk_occurrences
+                co_occurrences += chunk_co_occurrences
+                num_windows += chunk_windows
+
+    return occurrences, co_occurrences, num_windows
+
+
+def get_co_occurrence_statistics(
+    corpus_hash: str, tokens_array: "pa.ChunkedArray", words: List[str], window_size: Union[int, None], num_workers: Union[int, None] = None
+) -> Dict[str, Any]:
+    """Return the (co-)occurrence statistics of a list of words in a corpus, for a window size.
+
+    The statistics are a dict with the index of every word ('index'), the number of windows every word occurs in
+    ('occurrences'), the number of windows every pair of words occurs in (a sparse matrix, 'co_occurrences'), and
+    the number of windows ('num_windows').
+
+    Statistics are cached per corpus hash and window size, for the lifetime of the process. If the cached statistics
+    don't contain all of the words, only the new words are counted (with the cached and the new words), and merged
+    into the cached statistics, so scoring many (overlapping) topic sets against the same corpus is cheap.
+    """
+
+    import numpy as np
+    from scipy import sparse  # type: ignore
+
+    key = (corpus_hash, window_size)
+    with _cache_lock:
+        statistics = _statistics_cache.get(key)
+        if statistics is not None:
+            _statistics_cache.move_to_end(key)
+
+    if statistics is not None and all(word in statistics["index"] for word in words):
+        return statistics
+
+    counted_words = list(statistics["index"].keys()) if statistics else []
+    all_words = list(dict.fromkeys(counted_words + list(words)))
+    num_counted = len(counted_words)
+    occurrences, co_occurrences, num_windows = _count_co_occurrences(
+        tokens_array, all_words, window_size=window_size, num_workers=num_workers, first_word=num_counted
+    )
+    if statistics is not None:
+        # the counts of the new words with the cached words are the (transposed) columns of the cached words
+        co_occurrences = sparse.vstack(
+            [sparse.hstack([statistics["co_occurrences"], co_occurrences[:, :num_counted].T]), co_occurrences]
+        ).tocsr()
+        occurrences = np.concatenate([statistics["occurrences"], occurrences])
+
+    statistics = {
+        "index": {word: idx for idx, word in enumerate(all_words)},
+        "occurrences": occurrences,
+        "co_occurrences": co_occurrences,
+        "num_windows": num_windows,
+    }
+
+    with _cache_lock:
+        _statistics_cache[key] = statistics
+        _statistics_cache.move_to_end(key)
+        while len(_statistics_cache) > _MAX_CACHED_STATISTICS:
+            _statistics_cache.popitem(last=False)
+
+    return statistics
+
+
+def _topic_coherence(measure: str, topic: List[str], statistics: Dict[str, Any]) -> float:
+    """Compute the coherence of a topic (a list of words), with the same segmentations and measures as gensim."""
+
+    import numpy as np
+
+    idx = np.array([statistics["index"][word] for word in topic], dtype=np.int64)
+    num_windows = float(statistics["num_windows"]) or 1.0
+    occurrences = statistics["occurrences"][idx] / num_windows
+    co_occurrences = statistics["co_occurrences"][idx][:, idx].toarray() / num_windows
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if measure == "u_mass":
+            # log conditional probability of every word given each of the words before it
+            lower = np.tril_indices(len(idx), k=-1)
+            values = np.log((co_occurrences[lower] + EPSILON) / occurrences[lower[1]])
+            return float(np.mean(values)) if len(values) else float("nan")
+
+        npmi = np.log((co_occurrences + EPSILON) / np.outer(occurrences, occurrences)) / -np.log(co_occurrences + EPSILON)
+        if measure == "c_npmi":
+            off_diagonal = ~np.eye(len(idx), dtype=bool)
+            values = npmi[off_diagonal]
+            return float(np.mean(values)) if len(values) else float("nan")
+
+        # c_v: cosine similarity between the npmi context vectors of every word and of the whole topic
+        topic_vector = npmi.sum(axis=0)
+        similarities = (npmi @ topic_vector) / (np.linalg.norm(npmi, axis=1) * np.linalg.norm(topic_vector))
+        return float(np.mean(similarities))
+
+
+class TopicCoherence(KiaraModule):
+    """
+    This module computes the coherence of topics against a corpus of tokenized documents.
+
+    Topics are either the top words of the topics of a trained LDA model (see 'topic_modelling.lda'), or lists of words.
+    Supported measures are 'u_mass', 'c_npmi' and 'c_v', with the same definitions and default window sizes as
+    gensim's 'CoherenceModel' ('u_mass' uses whole documents, 'c_npmi' a sliding window of 10 tokens, and 'c_v' one of
+    110 tokens).
+
+    Occurrence and co-occurrence counts of the topic words are computed once per window size, in parallel over chunks
+    of the corpus, and cached by the hash of the corpus and the window size, so scoring many topic sets against the
+    same corpus doesn't count the corpus again. Sliding window counts are exact; gensim's default (single process)
+    accumulator misses some words that occur more than once in a window, so 'c_npmi' and 'c_v' scores can differ
+    slightly from gensim's for documents that are longer than the window.
+
+    Dependencies:
+    - SciPy: https://scipy.org/
+    """
+
+    _module_type_name = "topic_modelling.coherence"
+
+    def create_inputs_schema(self):
+        return {
+            "tokens_array": {
+                "type": "array",
+                "doc": "Array that contains the tokens of the corpus.",
+            },
+            "model": {
+                "type": "lda_model",
+                "doc": "A trained model, whose topics are scored.",
+                "optional": True
+            },
+            "topics": {
+                "type": "list",
+                "doc": "A list of topics (lists of words) to score, used instead of the topics of a model.",
+                "optional": True
+            },
+            "measures": {
+                "type": "list",
+                "doc": "The coherence measures to compute: 'u_mass', 'c_npmi' and/or 'c_v' (default: all).",
+                "optional": True
+            },
+            "topn": {
+                "type": "integer",
+                "doc": "Number of top words per topic of a model to score.",
+                "optional": True,
+                "default": 20
+            },
+            "window_size": {
+                "type": "integer",
+                "doc": "The size of the sliding window for 'c_npmi' and 'c_v' (default: 10 for 'c_npmi', 110 for 'c_v').",
+                "optional": True
+            },
+            "num_workers": {
+                "type": "integer",
+                "doc": "Number of worker processes that count the corpus (default: number of CPUs). If set to 1, counting runs in the current process.",
+                "optional": True
+            },
+        }
+
+    def create_outputs_schema(self):
+        return {
+            "coherence": {
+                "type": "table",
+                "doc": "The coherence of every topic, with the columns 'topic', 'words', and one column per measure."
+            },
+            "model_coherence": {
+                "type": "dict",
+                "doc": "The mean coherence of all topics, per measure."
+            }
+        }
+
+    def process(self, inputs, outputs):
+
+        import numpy as np
+        import pyarrow as pa
+
+        from kiara_plugin.topic_modelling.utils import encode_tokens
+
+        tokens_value = inputs.get_value_obj("tokens_array")
+        model_value = inputs.get_value_obj("model")
+        topics_value = inputs.get_value_obj("topics")
+        measures_value = inputs.get_value_obj("measures")
+        topn = inputs.get_value_data("topn")
+        window_size = inputs.get_value_data("window_size")
+        num_workers = inputs.get_value_data("num_workers")
+
+        if num_workers is not None and num_workers < 1:
+            raise KiaraProcessingException(f"Invalid number of workers '{num_workers}', must be at least 1.")
+        if window_size is not None and window_size < 1:
+            raise KiaraProcessingException(f"Invalid window size '{window_size}', must be at least 1.")
+
+        measures = measures_value.data.list_data if measures_value.is_set else COHERENCE_MEASURES
+        for measure in measures:
+            if measure not in COHERENCE_MEASURES:
+                raise KiaraProcessingException(f"Unknown coherence measure '{measure}', available: {', '.join(COHERENCE_MEASURES)}")
+
+        if topics_value.is_set:
+            topics = [[str(word) for word in topic] for topic in topics_value.data.list_data]
+        elif model_value.is_set:
+            model = model_value.data
+            topics = [[token for token, _ in model.get_topic_terms(topic_id, topn=topn)] for topic_id in range(model.num_topics)]
+        else:
+            raise KiaraProcessingException("Either a model or a list of topics must be provided.")
+
+        words = list(dict.fromkeys(word for topic in topics for word in topic))
+        tokens_array_pa = encode_tokens(tokens_value.data.arrow_array)
+
+        columns: Dict[str, Any] = {
+            "topic": pa.array(np.arange(len(topics)), type=pa.int64()),
+            "words": pa.array(topics, type=pa.list_(pa.string())),
+        }
+        model_coherence = {}
+        for measure in measures:
+            measure_window = DEFAULT_WINDOW_SIZES[measure] if measure == "u_mass" or window_size is None else window_size
+            try:
+                statistics = get_co_occurrence_statistics(
+                    str(tokens_value.value_hash), tokens_array_pa, words, window_size=measure_window, num_workers=num_workers
+                )
+                scores = [_topic_coherence(measure, topic, statistics) for topic in topics]
+            except Exception as e:
+                raise KiaraProcessingException(f"Failed to compute '{measure}' coherence: {e}")
+            columns[measure] = pa.array(scores, type=pa.float64())
+            model_coherence[measure] = float(np.nanmean(scores)) if scores else None
+
+        outputs.set_value("coherence", pa.table(columns))
+        outputs.set_value("model_coherence", model_coherence)
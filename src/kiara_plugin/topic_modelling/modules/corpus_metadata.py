@@ -1,8 +1,102 @@
 # -*- coding: utf-8 -*-
 
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Tuple, TypeVar
+
 from kiara.api import KiaraModule
 from kiara.exceptions import KiaraProcessingException
-from typing import Union
+
+if TYPE_CHECKING:
+    import polars as pl  # type: ignore
+    import pyarrow as pa  # type: ignore
+
+PERIODICITIES = ["day", "month", "year"]
+
+# named-group patterns for the dates and publication references of LCCN file names
+LCCN_PATTERNS = [r"_(?P<date>\d{4}-\d{2}-\d{2})_", r"(?P<publication_ref>sn\d+)_"]
+
+FrameType = TypeVar("FrameType", "pl.DataFrame", "pl.LazyFrame")
+
+
+@lru_cache(maxsize=128)
+def compile_metadata_patterns(patterns: Tuple[str, ...]) -> Tuple[Tuple[str, str, int], ...]:
+    """Validate a set of named-group regex patterns, and return the pattern, name and index of every named group.
+
+    Patterns are parsed by Polars, which applies them, so patterns its regex engine doesn't support (e.g. look-around
+    or backreferences) are rejected here, with its error message. Every named group becomes a metadata column, so
+    every pattern needs at least one named group, and group names must be unique across the set. Results are cached,
+    so a pattern set is only parsed once per process.
+    """
+
+    import polars as pl  # type: ignore
+
+    empty = pl.Series([], dtype=pl.Utf8)
+    groups = []
+    names = set()
+    for pattern in patterns:
+        try:
+            # the fields are the names of the groups, or their (1-based) index for unnamed groups
+            fields = empty.str.extract_groups(pattern).struct.fields
+        except pl.exceptions.PolarsError as e:
+            raise KiaraProcessingException(f"Invalid metadata pattern '{pattern}': {e}")
+        named_groups = [(name, index) for index, name in enumerate(fields, start=1) if name != str(index)]
+        if not named_groups:
+            raise KiaraProcessingException(f"Invalid metadata pattern '{pattern}': no named group, use '(?P<name>...)' for the values to extract.")
+        for name, index in named_groups:
+            if name in names:
+                raise KiaraProcessingException(f"Duplicate group name '{name}' in metadata patterns.")
+            names.add(name)
+            groups.append((pattern, name, index))
+    return tuple(groups)
+
+
+def add_metadata_columns(frame: FrameType, column: str, patterns: Tuple[str, ...], name_map: Any = None, map_source_col: str = "publication_ref", map_target_col: str = "publication_name") -> FrameType:
+    """Add the values of the named groups of a pattern set as columns to a Polars (lazy) frame.
+
+    Patterns are applied as native (vectorized) 'str.extract' expressions, the first match of a pattern in a value is
+    used. If a name map (a list of keys and a list of values, in the same order) is given, the values of the
+    'map_source_col' column are looked up with a (left) hash join against the map, as the new 'map_target_col' column.
+    """
+
+    import polars as pl  # type: ignore
+
+    frame = frame.with_columns([
+        pl.col(column).cast(pl.Utf8).str.extract(pattern, group_index=index).alias(name)
+        for pattern, name, index in compile_metadata_patterns(tuple(patterns))
+    ])
+
+    if name_map is None:
+        return frame
+
+    if len(name_map) != 2 or len(name_map[0]) != len(name_map[1]):
+        raise KiaraProcessingException("Invalid map, it must consist of two lists of the same length: the keys and the values.")
+
+    # like a dict built from the map, the last value of a duplicate key wins
+    lookup = pl.DataFrame(
+        {map_source_col: [None if key is None else str(key) for key in name_map[0]], map_target_col: [None if value is None else str(value) for value in name_map[1]]},
+        schema={map_source_col: pl.Utf8, map_target_col: pl.Utf8},
+    ).unique(subset=[map_source_col], keep="last")
+    if isinstance(frame, pl.LazyFrame):
+        lazy_lookup = lookup.lazy()
+        return frame.join(lazy_lookup, on=map_source_col, how="left", maintain_order="left")
+    return frame.join(lookup, on=map_source_col, how="left", maintain_order="left")
+
+
+def _quote_identifier(name: str) -> str:
+    """Quote a column name for use in a DuckDB query."""
+
+    escaped = name.replace('"', '""')
+    return f'"{escaped}"'
+
+
+def _date_expression(column: str, data_type: "pa.DataType") -> str:
+    """Return the DuckDB expression that parses a date column (strings in the '%Y-%m-%d' format, or dates/timestamps) to dates."""
+
+    import pyarrow as pa  # type: ignore
+
+    if pa.types.is_date(data_type) or pa.types.is_timestamp(data_type):
+        return f"CAST({_quote_identifier(column)} AS DATE)"
+    return f"CAST(strptime(CAST({_quote_identifier(column)} AS VARCHAR), '%Y-%m-%d') AS DATE)"
 
 
 class GetLccnMetadata(KiaraModule):
@@ -44,7 +138,6 @@ class GetLccnMetadata(KiaraModule):
         }
 
     def process(self, inputs, outputs):
-        import re
         import polars as pl  # type: ignore
         import pyarrow as pa  # type: ignore
 
@@ -64,45 +157,12 @@ class GetLccnMetadata(KiaraModule):
         
         sources_tb: pl.DataFrame = pl.from_arrow(sources_data)  # type: ignore
 
-        def get_ref(file):
-            try:
-                ref_match = re.findall(r"(sn\d+)_", file)
-                if not ref_match:
-                    return None
-                return ref_match[0]
-            except Exception as e:
-                msg = f"There was a problem in the publication reference pattern: {e}"
-                raise KiaraProcessingException(msg)
-
-        def get_date(file):
-            try:
-                date_match = re.findall(r"_(\d{4}-\d{2}-\d{2})_", file)
-                if not date_match:
-                    return None
-                return date_match[0]
-            except Exception as e:
-                msg = f"There was a problem in the date pattern: {e}"
-                raise KiaraProcessingException(msg)
-
         try:
-            augm_sources = sources_tb.with_columns([
-                sources_tb[column_name].map_elements(get_date, return_dtype=pl.Utf8).alias("date"),
-                sources_tb[column_name].map_elements(get_ref, return_dtype=pl.Utf8).alias("publication_ref"),
-            ])
-
-            # If a map is provided, add the publication_name column
             map_input = inputs.get_value_obj("map")
-            if map_input is not None and map_input.data is not None:
-                pub_refs: list[str] = inputs.get_value_obj("map").data[0]
-                pub_names: list[str] = inputs.get_value_obj("map").data[1]
-                pub_ref_to_name = dict(zip(pub_refs, pub_names))
-                
-                augm_sources = augm_sources.with_columns(
-                    augm_sources["publication_ref"]
-                    .map_elements(lambda x: pub_ref_to_name.get(x, None), return_dtype=pl.Utf8)
-                    .alias("publication_name")
-                )
-
+            name_map = map_input.data.list_data if map_input.is_set else None
+            augm_sources = add_metadata_columns(sources_tb, column_name, tuple(LCCN_PATTERNS), name_map=name_map)
+        except KiaraProcessingException:
+            raise
         except Exception as e:
             msg = f"An error occurred while augmenting the dataframe: {e}"
             raise KiaraProcessingException(msg)
@@ -115,10 +175,106 @@ class GetLccnMetadata(KiaraModule):
         outputs.set_value("corpus_table", output_table)
 
 
+class ExtractMetadata(KiaraModule):
+    """
+    This module extracts metadata from the strings of a column (for example file names), and adds it to the table as new columns.
+
+    The metadata is described by a set of regular expressions with named groups, every named group becomes a column with the first match of its pattern in every value. For example, the default (LCCN) pattern set:
+    ["_(?P<date>\\d{4}-\\d{2}-\\d{2})_", "(?P<publication_ref>sn\\d+)_"]
+    adds the columns 'date' and 'publication_ref'. The patterns are compiled once, and applied as native, vectorized Polars expressions (using the Rust regex syntax, so look-arounds and back-references are not supported).
+
+    In addition, if a mapping scheme is provided, the values of one of the new columns (default: 'publication_ref') are mapped to names in another new column (default: 'publication_name'), like in 'topic_modelling.lccn_metadata'.
+    """
+
+    _module_type_name = "topic_modelling.extract_metadata"
+
+    def create_inputs_schema(self):
+        return {
+            "corpus_table": {
+                "type": "table",
+                "doc": "Table that contains a column with the strings to extract metadata from.",
+                "optional": False,
+            },
+            "column_name": {
+                "type": "string",
+                "doc": "Name of the column that contains the strings to extract metadata from.",
+                "optional": False,
+            },
+            "patterns": {
+                "type": "list",
+                "doc": "List of regular expressions with named groups, every named group becomes a column (default: the LCCN patterns for dates and publication references).",
+                "optional": True,
+            },
+            "map": {
+                "type": "list",
+                "doc": "List of lists of unique keys and names in the same order.",
+                "optional": True,
+            },
+            "map_source_col": {
+                "type": "string",
+                "doc": "Name of the extracted column with the keys of the map.",
+                "default": "publication_ref",
+                "optional": True,
+            },
+            "map_target_col": {
+                "type": "string",
+                "doc": "Name of the column to add with the mapped names.",
+                "default": "publication_name",
+                "optional": True,
+            },
+        }
+
+    def create_outputs_schema(self):
+        return {
+            "corpus_table": {
+                "type": "table",
+                "doc": "The augmented table with extracted metadata."
+            }
+        }
+
+    def process(self, inputs, outputs):
+        import polars as pl  # type: ignore
+        import pyarrow as pa  # type: ignore
+
+        column_name = inputs.get_value_obj("column_name").data
+        patterns = inputs.get_value_obj("patterns").data
+        name_map = inputs.get_value_obj("map").data
+        map_source_col = inputs.get_value_obj("map_source_col").data
+        map_target_col = inputs.get_value_obj("map_target_col").data
+
+        sources_data: pa.Table = inputs.get_value_obj("corpus_table").data.arrow_table
+        if column_name not in sources_data.column_names:
+            raise KiaraProcessingException(
+                f"Could not find column '{column_name}' in the table. Please specify a valid column name manually, using one of: {', '.join(sources_data.column_names)}"
+            )
+
+        patterns = tuple(LCCN_PATTERNS if patterns is None else patterns.list_data)
+        if name_map is not None:
+            name_map = name_map.list_data
+            group_names = [name for _, name, _ in compile_metadata_patterns(patterns)]
+            if map_source_col not in group_names:
+                raise KiaraProcessingException(
+                    f"Invalid map source column '{map_source_col}', must be one of the named groups of the patterns: {', '.join(group_names)}"
+                )
+
+        try:
+            augm_sources = add_metadata_columns(
+                pl.from_arrow(sources_data), column_name, patterns, name_map=name_map,  # type: ignore
+                map_source_col=map_source_col, map_target_col=map_target_col,
+            )
+        except KiaraProcessingException:
+            raise
+        except Exception as e:
+            raise KiaraProcessingException(f"An error occurred while augmenting the dataframe: {e}")
+
+        outputs.set_value("corpus_table", augm_sources.to_arrow())
+
+
 class CorpusDistTime(KiaraModule):
     """
     This module aggregates a table by day, month or year from a corpus table that contains a date column. It returns the distribution over time, which can be used for display purposes, such as visualization.
-    
+
+    Only the date and publication columns are read: DuckDB scans them directly from the Arrow table, parses the dates and aggregates them in a single query, and the list output is converted from the result table in one go. By default all columns of the output are strings, set 'typed_output' to keep the date as a timestamp and the count as an integer.
     """
 
     _module_type_name = "topic_modelling.corpus_distribution"
@@ -128,13 +284,13 @@ class CorpusDistTime(KiaraModule):
         return {
             "periodicity": {
                 "type": "string",
-                "type_config": {"allowed_strings": ["day", "month", "year"]},
+                "type_config": {"allowed_strings": PERIODICITIES},
                 "doc": "The desired data periodicity to aggregate the data. Values can be either 'day','month' or 'year'.",
                 "optional": False,
             },
             "date_col": {
                 "type": "string",
-                "doc": "Column name of the column that contains the date. Values in this column need to comply with date format: https://docs.rs/chrono/latest/chrono/format/strftime/index.html.",
+                "doc": "Column name of the column that contains the date. Values in this column need to be dates, or strings in the '%Y-%m-%d' format.",
                 "optional": False,
             },
             "publication_ref_col": {
@@ -147,6 +303,12 @@ class CorpusDistTime(KiaraModule):
                 "doc": "The corpus table for which the distribution over time is needed.",
                 "optional": False,
             },
+            "typed_output": {
+                "type": "boolean",
+                "doc": "Whether to keep the types of the output columns (timestamp, string, integer), instead of converting all of them to strings.",
+                "default": False,
+                "optional": True,
+            },
         }
 
     def create_outputs_schema(self):
@@ -156,18 +318,15 @@ class CorpusDistTime(KiaraModule):
 
     def process(self, inputs, outputs) -> None:
         
-        import duckdb # type: ignore
-        import polars as pl # type: ignore
-        import pyarrow as pa   # type: ignore
-        import pyarrow.compute as pc  # type: ignore
+        import duckdb  # type: ignore
+        import pyarrow as pa  # type: ignore
 
         agg = inputs.get_value_obj("periodicity").data
         title_col = inputs.get_value_obj("publication_ref_col").data
         time_col = inputs.get_value_obj("date_col").data
-        table_obj = inputs.get_value_obj("corpus_table")
+        typed_output = inputs.get_value_obj("typed_output").data
 
-
-        sources: Union[pa.Table, None] = table_obj.data
+        sources: pa.Table = inputs.get_value_obj("corpus_table").data.arrow_table
             
         sources_col_names = sources.column_names
 
@@ -182,105 +341,447 @@ class CorpusDistTime(KiaraModule):
             raise KiaraProcessingException(
                 f"Could not find date column '{time_col}' in the table. Please specify a valid column name manually, using one of: {', '.join(sources_col_names)}"
             )
-            
-        sources_data: pa.Table = table_obj.data.arrow_table
-            
-        sources_tb: pl.DataFrame = pl.from_arrow(sources_data) # type: ignore
 
+        # selecting columns of an Arrow table doesn't copy any data
+        corpus = sources.select(list(dict.fromkeys([time_col, title_col])))
+        date_expr = _date_expression(time_col, corpus.schema.field(time_col).type)
+
+        # 'agg' is restricted by 'allowed_strings', and column names go through '_quote_identifier'
+        query = f"""
+        SELECT CAST(date_trunc('{agg}', {date_expr}) AS TIMESTAMP) AS date,
+            {_quote_identifier(title_col)} AS publication_name,
+            COUNT(*) AS count
+        FROM corpus
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        """  # noqa: S608
+
+        con = duckdb.connect(":memory:")
+        con.register("corpus", corpus)
         try:
-            sources_tb = sources_tb.with_columns(
-                pl.col(time_col).str.strptime(pl.Date, "%Y-%m-%d")
-            )
-
-        except:
+            queried_table = con.execute(query).fetch_arrow_table()
+        except duckdb.Error as e:
             raise KiaraProcessingException(
-                f"Could not convert time column to a valid date format. Please check the pattern of source values."
+                f"Could not convert time column to a valid date format. Please check the pattern of source values: {e}"
             )
+        finally:
+            con.close()
 
+        if not typed_output:
+            queried_table = queried_table.cast(pa.schema([(name, pa.string()) for name in queried_table.column_names]))
 
-        if agg == 'month':
-            query = f"""
-            SELECT strptime(concat(CAST(month AS VARCHAR), '/', CAST(year AS VARCHAR)), '%m/%Y') as date, 
-                {title_col} as publication_name, 
-                count 
-            FROM (
-                SELECT EXTRACT(year FROM date) as year, 
-                    EXTRACT(month FROM date) as month, 
-                    {title_col}, 
-                    COUNT(*) as count 
-                FROM sources 
-                GROUP BY {title_col}, EXTRACT(year FROM date), EXTRACT(month FROM date)
-            )
-            """
-        elif agg == 'year':
-            query = f"""
-            SELECT strptime(CAST(year AS VARCHAR), '%Y') as date, 
-                {title_col} as publication_name, 
-                count 
-            FROM (
-                SELECT EXTRACT(year FROM date) as year, 
-                    {title_col}, 
-                    COUNT(*) as count 
-                FROM sources 
-                GROUP BY {title_col}, EXTRACT(year FROM date)
-            )
-            """
-        elif agg == 'day':
-            query = f"""
-            SELECT strptime(concat('01/', CAST(month AS VARCHAR), '/', CAST(year AS VARCHAR)), '%d/%m/%Y') as date, 
-                {title_col} as publication_name, 
-                count 
-            FROM (
-                SELECT EXTRACT(year FROM date) as year, 
-                    EXTRACT(month FROM date) as month, 
-                    {title_col}, 
-                    COUNT(*) as count 
-                FROM sources 
-                GROUP BY {title_col}, EXTRACT(year FROM date), EXTRACT(month FROM date), EXTRACT(day FROM date)
-            )
-            """
+        dist_list = [{"agg": agg, **row} for row in queried_table.to_pylist()]
 
-        # Register the PyArrow table with DuckDB
-        con = duckdb.connect(':memory:')
-        con.register('sources', sources_tb)
+        outputs.set_value("dist_table", queried_table)
+        outputs.set_value("dist_list", dist_list)
 
-        # Execute the query
-        result = con.execute(query)
-        
 
-        # Convert the result to a PyArrow table
-        queried_table = result.fetch_arrow_table()
+class TopicDistTime(KiaraModule):
+    """
+    This module aggregates the topic weights of the documents of a corpus by day, month or year, and by publication. It returns how the prevalence of every topic changes over time for every publication, which can be used for display purposes, such as visualization.
+
+    The topic weights are taken from a document-topic table, in the wide ('document_id', 'topic_0', 'topic_1', ...) or the long ('document_id', 'topic', 'probability') format of 'topic_modelling.document_topics'. Documents are matched to the rows of the corpus table by the values of the 'document_id_col' column, or by their position in the corpus table if no such column is given.
+
+    The join, the date parsing and the aggregation are a single DuckDB query over the Arrow data. The weight of a topic is the mean (or sum) of its weights over all documents of a period and publication, documents without a weight for a topic (in the long format) count as 0. Documents without a date are ignored.
+    """
+
+    _module_type_name = "topic_modelling.topic_distribution_over_time"
+
+    def create_inputs_schema(self):
+
+        return {
+            "periodicity": {
+                "type": "string",
+                "type_config": {"allowed_strings": PERIODICITIES},
+                "doc": "The desired data periodicity to aggregate the data. Values can be either 'day','month' or 'year'.",
+                "optional": False,
+            },
+            "date_col": {
+                "type": "string",
+                "doc": "Column name of the column that contains the date. Values in this column need to be dates, or strings in the '%Y-%m-%d' format.",
+                "optional": False,
+            },
+            "publication_ref_col": {
+                "type": "string",
+                "doc": "Column name of the values containing publication names or ref/id. This column will be used in the output.",
+                "optional": False,
+            },
+            "corpus_table": {
+                "type": "table",
+                "doc": "The corpus table for which the topic distribution over time is needed.",
+                "optional": False,
+            },
+            "document_topics": {
+                "type": "table",
+                "doc": "The topic weights of the documents, as returned by 'topic_modelling.document_topics'.",
+                "optional": False,
+            },
+            "document_id_col": {
+                "type": "string",
+                "doc": "Column name of the values in the corpus table that match the 'document_id' column of the document topics (default: the position of the rows).",
+                "optional": True,
+            },
+            "aggregation": {
+                "type": "string",
+                "type_config": {"allowed_strings": ["mean", "sum"]},
+                "doc": "How to aggregate the topic weights of the documents of a period and publication: 'mean' or 'sum'.",
+                "default": "mean",
+                "optional": True,
+            },
+        }
+
+    def create_outputs_schema(self):
+        return {"dist_table": {"type": "table", "doc": "The aggregated data table, with the columns 'date', 'publication_name', 'topic', 'weight' and 'count' (the number of documents)."},
+               "dist_list": {"type": "list", "doc": "The aggregated data as a list of lists."}
+        }
+
+    def process(self, inputs, outputs) -> None:
+
+        import duckdb  # type: ignore
+        import numpy as np
+        import pyarrow as pa  # type: ignore
 
-        # Convert all columns to strings
+        agg = inputs.get_value_obj("periodicity").data
+        title_col = inputs.get_value_obj("publication_ref_col").data
+        time_col = inputs.get_value_obj("date_col").data
+        document_id_col = inputs.get_value_obj("document_id_col").data
+        aggregation = inputs.get_value_obj("aggregation").data
+
+        sources: pa.Table = inputs.get_value_obj("corpus_table").data.arrow_table
+        document_topics: pa.Table = inputs.get_value_obj("document_topics").data.arrow_table
+
+        for column in (title_col, time_col, document_id_col):
+            if column is not None and column not in sources.column_names:
+                raise KiaraProcessingException(
+                    f"Could not find column '{column}' in the corpus table. Please specify a valid column name manually, using one of: {', '.join(sources.column_names)}"
+                )
+
+        if "document_id" not in document_topics.column_names:
+            raise KiaraProcessingException("Invalid document topics table, missing column 'document_id'.")
+        if "topic" in document_topics.column_names and "probability" in document_topics.column_names:
+            weights_query = "SELECT document_id, CAST(topic AS INTEGER) AS topic, probability AS weight FROM document_topics"
+        else:
+            topic_columns = [column for column in document_topics.column_names if column.startswith("topic_")]
+            if not topic_columns:
+                raise KiaraProcessingException("Invalid document topics table, it needs either 'topic_<n>' columns, or the columns 'topic' and 'probability'.")
+            document_topics = document_topics.select(["document_id", *topic_columns])
+            weights_query = """
+                SELECT document_id, CAST(replace(topic, 'topic_', '') AS INTEGER) AS topic, weight
+                FROM (UNPIVOT document_topics ON COLUMNS('^topic_[0-9]+$') INTO NAME topic VALUE weight)
+            """
+
+        # only the needed columns are scanned, the document ids are the row positions unless a column is given
+        if document_id_col is None:
+            corpus = sources.select([time_col, title_col]).append_column("document_id", pa.array(np.arange(sources.num_rows), type=pa.int64()))
+            document_id_expr = "document_id"
+        else:
+            corpus = sources.select(list(dict.fromkeys([time_col, title_col, document_id_col])))
+            document_id_expr = _quote_identifier(document_id_col)
+
+        date_expr = _date_expression(time_col, corpus.schema.field(time_col).type)
+        weight_expr = "SUM(w.weight)" if aggregation == "sum" else "SUM(w.weight) / c.count"
+
+        # 'agg' and 'aggregation' are restricted by 'allowed_strings', and column names go through '_quote_identifier'
+        query = f"""
+        WITH docs AS (
+            SELECT {document_id_expr} AS document_id,
+                CAST(date_trunc('{agg}', {date_expr}) AS TIMESTAMP) AS date,
+                {_quote_identifier(title_col)} AS publication_name
+            FROM corpus
+            WHERE {_quote_identifier(time_col)} IS NOT NULL
+        ),
+        weights AS ({weights_query}),
+        counts AS (
+            SELECT date, publication_name, COUNT(*) AS count FROM docs GROUP BY date, publication_name
+        )
+        SELECT d.date, d.publication_name, w.topic, {weight_expr} AS weight, c.count
+        FROM docs d
+        JOIN weights w ON w.document_id = d.document_id
+        JOIN counts c ON c.date IS NOT DISTINCT FROM d.date AND c.publication_name IS NOT DISTINCT FROM d.publication_name
+        GROUP BY d.date, d.publication_name, w.topic, c.count
+        ORDER BY d.date, d.publication_name, w.topic
+        """  # noqa: S608
+
+        con = duckdb.connect(":memory:")
+        con.register("corpus", corpus)
+        con.register("document_topics", document_topics)
         try:
-            for column in queried_table.column_names:
-                new_column = pc.cast(queried_table.column(column), pa.string())
-                queried_table = queried_table.set_column(
-                    queried_table.schema.get_field_index(column),
-                    column,
-                    new_column
+            queried_table = con.execute(query).fetch_arrow_table()
+        except duckdb.Error as e:
+            raise KiaraProcessingException(f"Could not aggregate the topic weights: {e}")
+        finally:
+            con.close()
+
+        queried_table = queried_table.cast(pa.schema([(name, pa.string()) for name in queried_table.column_names]))
+        dist_list = [{"agg": agg, **row} for row in queried_table.to_pylist()]
+
+        outputs.set_value("dist_table", queried_table)
+        outputs.set_value("dist_list", dist_list)
+
+
+class CorpusDistCube(KiaraModule):
+    """
+    This module counts the documents of a corpus table by day, month and year, and by publication, in a single scan of the table. The result is a small table (the 'cube') with the counts of all periodicities, so distributions for any periodicity can be retrieved from it later (see 'topic_modelling.corpus_distribution_from_cube') without scanning the corpus again.
+
+    The cube has the columns 'periodicity' ('day', 'month' or 'year'), 'date' (the start of the period), 'publication_name' and 'count'.
+    """
+
+    _module_type_name = "topic_modelling.corpus_distribution_cube"
+
+    def create_inputs_schema(self):
+
+        return {
+            "date_col": {
+                "type": "string",
+                "doc": "Column name of the column that contains the date. Values in this column need to be dates, or strings in the '%Y-%m-%d' format.",
+                "optional": False,
+            },
+            "publication_ref_col": {
+                "type": "string",
+                "doc": "Column name of the values containing publication names or ref/id. This column will be used in the output.",
+                "optional": False,
+            },
+            "corpus_table": {
+                "type": "table",
+                "doc": "The corpus table for which the distribution over time is needed.",
+                "optional": False,
+            },
+        }
+
+    def create_outputs_schema(self):
+        return {"dist_cube": {"type": "table", "doc": "The counts of all periodicities, with the columns 'periodicity', 'date', 'publication_name' and 'count'."}}
+
+    def process(self, inputs, outputs) -> None:
+
+        import duckdb  # type: ignore
+        import pyarrow as pa  # type: ignore
+
+        title_col = inputs.get_value_obj("publication_ref_col").data
+        time_col = inputs.get_value_obj("date_col").data
+
+        sources: pa.Table = inputs.get_value_obj("corpus_table").data.arrow_table
+
+        for column in (title_col, time_col):
+            if column not in sources.column_names:
+                raise KiaraProcessingException(
+                    f"Could not find column '{column}' in the table. Please specify a valid column name manually, using one of: {', '.join(sources.column_names)}"
                 )
-        except Exception as e:
-            print(f"Error during column conversion to string: {str(e)}")
-            raise
 
-        # Convert to list of dictionaries
+        corpus = sources.select(list(dict.fromkeys([time_col, title_col])))
+        date_expr = _date_expression(time_col, corpus.schema.field(time_col).type)
+
+        # column names go through '_quote_identifier'
+        query = f"""
+        WITH parsed AS (
+            SELECT {date_expr} AS day, {_quote_identifier(title_col)} AS publication_name FROM corpus
+        )
+        SELECT
+            CASE WHEN GROUPING(day) = 0 THEN 'day' WHEN GROUPING(month) = 0 THEN 'month' ELSE 'year' END AS periodicity,
+            CAST(CASE WHEN GROUPING(day) = 0 THEN day WHEN GROUPING(month) = 0 THEN month ELSE year END AS TIMESTAMP) AS date,
+            publication_name,
+            COUNT(*) AS count
+        FROM (
+            SELECT day, date_trunc('month', day) AS month, date_trunc('year', day) AS year, publication_name FROM parsed
+        )
+        GROUP BY GROUPING SETS ((day, publication_name), (month, publication_name), (year, publication_name))
+        ORDER BY periodicity, date, publication_name
+        """  # noqa: S608
+
+        con = duckdb.connect(":memory:")
+        con.register("corpus", corpus)
         try:
-            list_of_dicts = []
-            for row_index, row in enumerate(queried_table.to_pylist()):
-                row_dict = {"agg": agg}  # Add the agg value to each dictionary
-                for column_index, column in enumerate(queried_table.column_names):
-                    try:
-                        # Directly access the column value using PyArrow
-                        value = queried_table.column(column)[row_index].as_py()
-                        row_dict[column] = value
-                    except Exception as e:
-                        row_dict[column] = None
-                list_of_dicts.append(row_dict)
+            dist_cube = con.execute(query).fetch_arrow_table()
+        except duckdb.Error as e:
+            raise KiaraProcessingException(
+                f"Could not convert time column to a valid date format. Please check the pattern of source values: {e}"
+            )
+        finally:
+            con.close()
+
+        outputs.set_value("dist_cube", dist_cube)
+
+
+class CorpusDistFromCube(KiaraModule):
+    """
+    This module retrieves the distribution over time of a corpus for a periodicity from a precomputed cube (see 'topic_modelling.corpus_distribution_cube'), without touching the corpus table. The output has the same format as the one of 'topic_modelling.corpus_distribution'.
+    """
 
+    _module_type_name = "topic_modelling.corpus_distribution_from_cube"
+
+    def create_inputs_schema(self):
+
+        return {
+            "periodicity": {
+                "type": "string",
+                "type_config": {"allowed_strings": PERIODICITIES},
+                "doc": "The desired data periodicity to aggregate the data. Values can be either 'day','month' or 'year'.",
+                "optional": False,
+            },
+            "dist_cube": {
+                "type": "table",
+                "doc": "The precomputed counts, as returned by 'topic_modelling.corpus_distribution_cube'.",
+                "optional": False,
+            },
+            "typed_output": {
+                "type": "boolean",
+                "doc": "Whether to keep the types of the output columns (timestamp, string, integer), instead of converting all of them to strings.",
+                "default": False,
+                "optional": True,
+            },
+        }
+
+    def create_outputs_schema(self):
+        return {"dist_table": {"type": "table", "doc": "The aggregated data table."},
+               "dist_list": {"type": "list", "doc": "The aggregated data as a list of lists."}
+        }
+
+    def process(self, inputs, outputs) -> None:
+
+        import pyarrow as pa  # type: ignore
+        import pyarrow.compute as pc  # type: ignore
+
+        agg = inputs.get_value_obj("periodicity").data
+        dist_cube: pa.Table = inputs.get_value_obj("dist_cube").data.arrow_table
+
+        columns = ["date", "publication_name", "count"]
+        missing = [column for column in ["periodicity", *columns] if column not in dist_cube.column_names]
+        if missing:
+            raise KiaraProcessingException(f"Invalid distribution cube, missing column(s): {', '.join(missing)}")
+
+        queried_table = dist_cube.filter(pc.equal(dist_cube.column("periodicity"), agg)).select(columns)
+        if not inputs.get_value_obj("typed_output").data:
+            queried_table = queried_table.cast(pa.schema([(name, pa.string()) for name in columns]))
+        dist_list = [{"agg": agg, **row} for row in queried_table.to_pylist()]
+
+        outputs.set_value("dist_table", queried_table)
+        outputs.set_value("dist_list", dist_list)
+
+
+class MetadataDistTime(KiaraModule):
+    """
+    This module combines 'topic_modelling.extract_metadata' (or 'topic_modelling.lccn_metadata') and 'topic_modelling.corpus_distribution': it extracts the dates and publications of the documents from a column of strings (for example file names), and aggregates the documents by day, month or year and by publication.
+
+    Everything is one lazy Polars query plan (extract, map names, parse dates, group by period and publication), so only the column with the strings is read from the corpus table, the augmented table is never materialized, and the extracted dates are parsed right away instead of being written out as strings and parsed again. The output has the same format as the one of 'topic_modelling.corpus_distribution'.
+    """
+
+    _module_type_name = "topic_modelling.metadata_distribution"
+
+    def create_inputs_schema(self):
+        return {
+            "periodicity": {
+                "type": "string",
+                "type_config": {"allowed_strings": PERIODICITIES},
+                "doc": "The desired data periodicity to aggregate the data. Values can be either 'day','month' or 'year'.",
+                "optional": False,
+            },
+            "corpus_table": {
+                "type": "table",
+                "doc": "Table that contains a column with the strings to extract metadata from.",
+                "optional": False,
+            },
+            "column_name": {
+                "type": "string",
+                "doc": "Name of the column that contains the strings to extract metadata from.",
+                "optional": False,
+            },
+            "patterns": {
+                "type": "list",
+                "doc": "List of regular expressions with named groups (default: the LCCN patterns for dates and publication references), see 'topic_modelling.extract_metadata'.",
+                "optional": True,
+            },
+            "date_group": {
+                "type": "string",
+                "doc": "Name of the group of the patterns that contains the date (in the '%Y-%m-%d' format).",
+                "default": "date",
+                "optional": True,
+            },
+            "publication_group": {
+                "type": "string",
+                "doc": "Name of the group of the patterns that contains the publication reference.",
+                "default": "publication_ref",
+                "optional": True,
+            },
+            "map": {
+                "type": "list",
+                "doc": "List of lists of unique publications references and publication names in the collection provided in the same order, to aggregate by publication name instead of reference.",
+                "optional": True,
+            },
+            "typed_output": {
+                "type": "boolean",
+                "doc": "Whether to keep the types of the output columns (timestamp, string, integer), instead of converting all of them to strings.",
+                "default": False,
+                "optional": True,
+            },
+        }
+
+    def create_outputs_schema(self):
+        return {"dist_table": {"type": "table", "doc": "The aggregated data table."},
+               "dist_list": {"type": "list", "doc": "The aggregated data as a list of lists."}
+        }
+
+    def process(self, inputs, outputs) -> None:
+
+        import polars as pl  # type: ignore
+        import pyarrow as pa  # type: ignore
+
+        agg = inputs.get_value_obj("periodicity").data
+        column_name = inputs.get_value_obj("column_name").data
+        patterns = inputs.get_value_obj("patterns").data
+        date_group = inputs.get_value_obj("date_group").data
+        publication_group = inputs.get_value_obj("publication_group").data
+        name_map = inputs.get_value_obj("map").data
+        typed_output = inputs.get_value_obj("typed_output").data
+
+        sources_data: pa.Table = inputs.get_value_obj("corpus_table").data.arrow_table
+        if column_name not in sources_data.column_names:
+            raise KiaraProcessingException(
+                f"Could not find column '{column_name}' in the table. Please specify a valid column name manually, using one of: {', '.join(sources_data.column_names)}"
+            )
+
+        patterns = tuple(LCCN_PATTERNS if patterns is None else patterns.list_data)
+        group_names = [name for _, name, _ in compile_metadata_patterns(patterns)]
+        for group in (date_group, publication_group):
+            if group not in group_names:
+                raise KiaraProcessingException(
+                    f"Invalid group '{group}', must be one of the named groups of the patterns: {', '.join(group_names)}"
+                )
+
+        if name_map is not None:
+            publication_col = "__publication_name"
+            name_map = name_map.list_data
+        else:
+            publication_col = publication_group
+
+        # only the column with the strings is converted, and only the needed groups are kept after the extraction
+        plan = add_metadata_columns(
+            pl.from_arrow(sources_data.select([column_name])).lazy(),  # type: ignore
+            column_name, patterns, name_map=name_map, map_source_col=publication_group, map_target_col=publication_col,
+        )
+        truncate_every = {"day": "1d", "month": "1mo", "year": "1y"}[agg]
+        plan = (
+            plan.select(
+                pl.col(date_group).str.strptime(pl.Date, "%Y-%m-%d").dt.truncate(truncate_every).cast(pl.Datetime("us")).alias("date"),
+                pl.col(publication_col).alias("publication_name"),
+            )
+            .group_by(["date", "publication_name"])
+            .agg(pl.len().cast(pl.Int64).alias("count"))
+            .sort(["date", "publication_name"], nulls_last=True)
+        )
+
+        try:
+            queried_table = plan.collect().to_arrow()
         except Exception as e:
-            print(f"Error during conversion to list of dicts: {str(e)}")
-            raise
+            raise KiaraProcessingException(
+                f"Could not aggregate the extracted metadata, please check the patterns and the format of the dates: {e}"
+            )
+
+        schema = pa.schema([
+            ("date", pa.string() if not typed_output else pa.timestamp("us")),
+            ("publication_name", pa.string()),
+            ("count", pa.string() if not typed_output else pa.int64()),
+        ])
+        queried_table = queried_table.cast(schema)
+        dist_list = [{"agg": agg, **row} for row in queried_table.to_pylist()]
 
         outputs.set_value("dist_table", queried_table)
-        outputs.set_value("dist_list", list_of_dicts)
\ No newline at end of file
+        outputs.set_value("dist_list", dist_list)
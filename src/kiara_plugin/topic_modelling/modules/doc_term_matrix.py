@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import json
+from typing import Any, Dict, Mapping, Type
+
+from kiara.api import KiaraModule
+from kiara.exceptions import KiaraProcessingException
+from kiara.models.values.value import SerializedData
+from kiara.modules.included_core_modules.serialization import DeserializeValueModule
+from kiara_plugin.topic_modelling.models import DocTermMatrix
+
+
+class DeserializeDocTermMatrixModule(DeserializeValueModule):
+    """Deserialize a document-term matrix."""
+
+    _module_type_name = "load.doc_term_matrix"
+
+    @classmethod
+    def retrieve_supported_target_profiles(cls) -> Mapping[str, Type]:
+        return {"python_object": DocTermMatrix}
+
+    @classmethod
+    def retrieve_serialized_value_type(cls) -> str:
+        return "doc_term_matrix"
+
+    @classmethod
+    def retrieve_supported_serialization_profile(cls) -> str:
+        return "doc_term_matrix"
+
+    def to__python_object(self, data: SerializedData, **config: Any):
+
+        from kiara_plugin.topic_modelling.utils import decode_chunk
+
+        matrix_chunk = next(data.get_serialized_data("matrix.json").get_chunks(as_files=False))
+        matrix_data = json.loads(decode_chunk(matrix_chunk))
+
+        paths: Dict[str, str] = {}
+        for key in data.get_keys():
+            if key == "matrix.json":
+                continue
+            files = list(data.get_serialized_data(key).get_chunks(as_files=True, symlink_ok=True))
+            assert len(files) == 1
+            paths[key] = decode_chunk(files[0])
+
+        vocabulary_path = paths.pop("vocabulary.arrow")
+        array_paths = {key[: -len(".npy")]: path for key, path in paths.items()}
+        return DocTermMatrix(array_paths=array_paths, vocabulary_path=vocabulary_path, **matrix_data)
+
+
+class CreateDocTermMatrix(KiaraModule):
+    """Create a sparse document-term matrix from an array of tokens.
+
+    The matrix is built from token ids, like the corpus of 'topic_modelling.lda' (with the same 'no_below' and
+    'no_above' filters): one row per document, one column per token of the vocabulary, the counts of the tokens as
+    values. If 'tfidf' is set, TF-IDF weights (like gensim's default 'TfidfModel') are stored alongside the counts.
+
+    The result is stored as CSR arrays and memory-mapped when it is loaded, so downstream modules can share one
+    encoded corpus instead of tokenizing and counting it again.
+    """
+
+    _module_type_name = "topic_modelling.doc_term_matrix"
+
+    def create_inputs_schema(self):
+        return {
+            "tokens_array": {
+                "type": "array",
+                "doc": "Array that contains the tokens to process.",
+            },
+            "no_below": {
+                "type": "integer",
+                "doc": "Remove tokens that appear in less than no_below documents.",
+                "optional": True
+            },
+            "no_above": {
+                "type": "float",
+                "doc": "Remove tokens that appear in more than this fraction of the documents (e.g. 0.5).",
+                "optional": True
+            },
+            "tfidf": {
+                "type": "boolean",
+                "doc": "Whether to compute TF-IDF weights.",
+                "optional": True,
+                "default": False
+            },
+        }
+
+    def create_outputs_schema(self):
+        return {
+            "doc_term_matrix": {
+                "type": "doc_term_matrix",
+                "doc": "The document-term matrix."
+            }
+        }
+
+    def process(self, inputs, outputs):
+
+        from kiara_plugin.topic_modelling.utils import (
+            build_dictionary,
+            csr_from_token_ids,
+            tfidf_weights,
+        )
+
+        tokens_array = inputs.get_value_data("tokens_array")
+        tokens_array_pa = tokens_array.arrow_array
+
+        no_below = inputs.get_value_data("no_below")
+        no_above = inputs.get_value_data("no_above")
+        tfidf = inputs.get_value_data("tfidf")
+
+        try:
+            tokens_array_pa, (doc_index, token_ids, counts), vocabulary_table, id_map, _ = build_dictionary(
+                tokens_array_pa, no_below=no_below, no_above=no_above
+            )
+        except Exception as e:
+            raise KiaraProcessingException(
+                f"Failed to create dictionary: {e}"
+            )
+
+        indptr, indices, counts = csr_from_token_ids(id_map, doc_index, token_ids, counts, num_docs=len(tokens_array_pa))
+        weights = tfidf_weights(indptr, indices, counts, num_terms=vocabulary_table.num_rows) if tfidf else None
+
+        outputs.set_value(
+            "doc_term_matrix",
+            DocTermMatrix.create(indptr, indices, counts, vocabulary=vocabulary_table, weights=weights),
+        )
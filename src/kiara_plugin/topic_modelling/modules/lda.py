@@ -1,12 +1,350 @@
+import functools
+import json
+import os
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Mapping, Tuple, Type, Union
+
 from kiara.api import KiaraModule
 from kiara.exceptions import KiaraProcessingException
+from kiara.models.values.value import SerializedData
+from kiara.modules.included_core_modules.serialization import DeserializeValueModule
+from kiara_plugin.topic_modelling.models import LdaModel
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pyarrow as pa  # type: ignore
+    from scipy import sparse  # type: ignore
+
+# number of documents per batch when streaming the corpus, if no batch size is set
+DEFAULT_STREAM_BATCH_SIZE = 10000
+
+# maximum number of training documents to compute the perplexity on after every pass, if no documents are held out
+DEFAULT_EVALUATION_SAMPLE_SIZE = 1000
 
 # work in progress, not ready for use
 
+
+def _bow_documents_from_token_ids(id_map: "np.ndarray", doc_index: "np.ndarray", token_ids: "np.ndarray", counts: "np.ndarray", num_docs: int) -> List[List[Tuple[int, int]]]:
+    """Create bag-of-words documents from per-document token counts, using a map from token ids to dictionary ids.
+
+    The result is the same as calling 'doc2bow' on every document: (id, count) tuples, sorted by id.
+    """
+
+    from kiara_plugin.topic_modelling.utils import csr_from_token_ids
+
+    indptr, ids, counts = csr_from_token_ids(id_map, doc_index, token_ids, counts, num_docs=num_docs)
+    ids_list, counts_list = ids.tolist(), counts.tolist()
+    return [
+        list(zip(ids_list[start:end], counts_list[start:end]))
+        for start, end in zip(indptr[:-1].tolist(), indptr[1:].tolist())
+    ]
+
+
+def _model_id_map(vocabulary: "pa.Array", model_vocabulary: "pa.Table") -> "np.ndarray":
+    """Map the positions of a (token array) vocabulary to the token ids of a model's vocabulary (-1 for unknown tokens)."""
+
+    import numpy as np
+    import pyarrow.compute as pc  # type: ignore
+
+    model_ids = pc.index_in(vocabulary, value_set=model_vocabulary.column("token"))
+    model_ids = pc.take(model_vocabulary.column("id"), model_ids)
+    return pc.fill_null(model_ids, -1).to_numpy(zero_copy_only=False).astype(np.int64)
+
+
+def _infer_document_topics(
+    topic_word: "np.ndarray", alpha: "np.ndarray", indptr: "np.ndarray", ids: "np.ndarray", counts: "np.ndarray",
+    iterations: int = 50, gamma_threshold: float = 0.001
+) -> "np.ndarray":
+    """Infer the topic distributions of a batch of (CSR) bag-of-words documents, with shape (num_docs, num_topics).
+
+    This is the variational E-step of gensim's 'LdaModel.inference', vectorized over all documents of the batch: every
+    iteration is a few sparse matrix products, instead of a Python loop over the documents. Like in gensim, a document
+    stops being updated once the mean change of its topic weights is below 'gamma_threshold', so only the documents
+    that haven't converged yet are part of the products of later iterations. Topic weights are initialized to 1
+    (instead of randomly), so the result is deterministic.
+    """
+
+    import numpy as np
+    from scipy import sparse  # type: ignore
+    from scipy.special import psi  # type: ignore
+
+    # gensim's epsilon, for models with the default (float32) dtype
+    epsilon = np.finfo(np.float32).eps
+
+    num_docs = len(indptr) - 1
+    num_topics = topic_word.shape[0]
+
+    topic_word = np.asarray(topic_word, dtype=np.float64)
+    exp_elog_beta = np.exp(psi(topic_word) - psi(topic_word.sum(axis=1))[:, np.newaxis])
+    doc_term = sparse.csr_matrix((counts.astype(np.float64), ids, indptr), shape=(num_docs, topic_word.shape[1]))
+
+    def pairs(matrix: "sparse.csr_matrix") -> Tuple["np.ndarray", "np.ndarray"]:
+        # the rows, and the (nnz, num_topics) topic-word weights of every (document, token) pair of a matrix
+        return np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr)), exp_elog_beta[:, matrix.indices].T
+
+    gamma = np.ones((num_docs, num_topics))
+    active = np.arange(num_docs)
+    active_gamma = gamma
+    active_doc_term = doc_term
+    rows, beta_nnz = pairs(active_doc_term)
+    for _ in range(max(iterations, 1)):
+        exp_elog_theta = np.exp(psi(active_gamma) - psi(active_gamma.sum(axis=1))[:, np.newaxis])
+        phinorm = np.einsum("ij,ij->i", exp_elog_theta[rows], beta_nnz) + epsilon
+        weights = sparse.csr_matrix(
+            (active_doc_term.data / phinorm, active_doc_term.indices, active_doc_term.indptr), shape=active_doc_term.shape
+        )
+        new_gamma = alpha + exp_elog_theta * np.asarray(weights @ exp_elog_beta.T)
+        not_converged = np.abs(new_gamma - active_gamma).mean(axis=1) >= gamma_threshold
+        gamma[active] = new_gamma
+        if not not_converged.any():
+            break
+
+        active_gamma = new_gamma
+        if not not_converged.all():
+            active = active[not_converged]
+            active_gamma = new_gamma[not_converged]
+            active_doc_term = doc_term[active]
+            rows, beta_nnz = pairs(active_doc_term)
+
+    result: "np.ndarray" = gamma / gamma.sum(axis=1, keepdims=True)
+    return result
+
+
+class _CsrCorpus(object):
+    """A bag-of-words corpus that is backed by CSR arrays, documents are only converted while iterating over them."""
+
+    @classmethod
+    def from_scipy(cls, matrix: "sparse.csr_matrix") -> "_CsrCorpus":
+        return cls(matrix.indptr, matrix.indices, matrix.data)
+
+    def __init__(self, indptr: "np.ndarray", ids: "np.ndarray", counts: "np.ndarray"):
+
+        self.indptr, self.ids, self.counts = indptr, ids, counts
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def __iter__(self) -> Iterator[List[Tuple[int, int]]]:
+
+        from kiara_plugin.topic_modelling.utils import pairwise
+
+        for start, end in pairwise(self.indptr.tolist()):
+            yield list(zip(self.ids[start:end].tolist(), self.counts[start:end].tolist()))
+
+
+class _MemoryMappedCorpus(_CsrCorpus):
+    """A bag-of-words corpus that is backed by memory-mapped CSR arrays ('.npy' files in a directory).
+
+    The files are only read (and shared) through the page cache, so the corpus can be used by several processes at the
+    same time without copying it.
+    """
+
+    @classmethod
+    def save(cls, directory: str, indptr: "np.ndarray", ids: "np.ndarray", counts: "np.ndarray") -> "_MemoryMappedCorpus":
+
+        import numpy as np
+
+        np.save(os.path.join(directory, "indptr.npy"), indptr.astype(np.int64, copy=False), allow_pickle=False)
+        np.save(os.path.join(directory, "ids.npy"), ids.astype(np.int64, copy=False), allow_pickle=False)
+        np.save(os.path.join(directory, "counts.npy"), counts.astype(np.int64, copy=False), allow_pickle=False)
+        return cls(directory)
+
+    def __init__(self, directory: str):
+
+        import numpy as np
+
+        self.directory = directory
+        super().__init__(
+            *(
+                np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+                for name in ("indptr", "ids", "counts")
+            )
+        )
+
+
+def _iter_bow_documents(id_map: "np.ndarray", tokens_array: Union["pa.Array", "pa.ChunkedArray"], batch_size: int) -> Iterator[List[Tuple[int, int]]]:
+    """Stream the bag-of-words documents of a dictionary-encoded token array, converting at most 'batch_size' documents at a time."""
+
+    from kiara_plugin.topic_modelling.utils import count_token_ids, iter_chunks
+
+    for batch in iter_chunks(tokens_array, chunk_size=batch_size):
+        doc_index, token_ids, counts = count_token_ids(batch)
+        yield from _bow_documents_from_token_ids(id_map, doc_index, token_ids, counts, num_docs=len(batch))
+
+
+def _split_documents(num_docs: int, holdout_fraction: Union[float, None], random_state: Union[int, None]) -> Tuple[Union["np.ndarray", None], "np.ndarray"]:
+    """Select the documents to train on, and the documents to evaluate the model on after every pass.
+
+    Returns a mask of the training documents (None for all documents), and a mask of the evaluation documents. If a
+    holdout fraction is set, that fraction of the documents is sampled and excluded from training, otherwise a sample
+    of (at most 'DEFAULT_EVALUATION_SAMPLE_SIZE') training documents is used for evaluation.
+    """
+
+    import numpy as np
+
+    # like gensim, only an unset random state is unseeded (0 is a seed)
+    rng = np.random.default_rng(None if random_state is None or random_state is False else random_state)
+    eval_mask = np.zeros(num_docs, dtype=bool)
+    if holdout_fraction:
+        if not 0 < holdout_fraction < 1:
+            raise KiaraProcessingException(f"Invalid holdout fraction '{holdout_fraction}', must be between 0 and 1.")
+        num_holdout = min(max(int(round(num_docs * holdout_fraction)), 1), num_docs - 1)
+        eval_mask[rng.choice(num_docs, size=num_holdout, replace=False)] = True
+        return ~eval_mask, eval_mask
+
+    eval_mask[rng.choice(num_docs, size=min(num_docs, DEFAULT_EVALUATION_SAMPLE_SIZE), replace=False)] = True
+    return None, eval_mask
+
+
+def _mean_hellinger_distance(topics_a: "np.ndarray", topics_b: "np.ndarray") -> float:
+    """Return the mean Hellinger distance between the rows of two (normalized) topic-word matrices."""
+
+    import numpy as np
+
+    distances = np.sqrt(0.5 * ((np.sqrt(topics_a) - np.sqrt(topics_b)) ** 2).sum(axis=1))
+    return float(distances.mean())
+
+
+def _extra_pass_mstep(model: Any, rho: float, other: Any, extra_pass: bool = False):
+    """Update a gensim model like gensim does in every pass after the first one (without increasing 'num_updates')."""
+
+    type(model).do_mstep(model, rho, other, True)
+
+
+def _train_pass(model: Any, corpus: Any, pass_: int):
+    """Run one training pass of a gensim 'LdaMulticore' (or 'LdaModel') model over a corpus.
+
+    Calling 'update' once per pass would restart the learning rate schedule, and count the corpus again, on every
+    pass. So the offset is shifted by the number of previous passes, and (like gensim does for all but the first pass)
+    neither the number of updates nor the number of documents of the model state are increased by passes after the
+    first one. Every pass then updates the model like it would when training all passes in one call.
+    """
+
+    offset, numdocs = model.offset, model.state.numdocs
+    model.offset = offset + pass_
+    if pass_ > 0:
+        # 'update' adds the corpus size to the document count that every update is scaled to, gensim does that only once
+        model.state.numdocs = numdocs - len(corpus)
+        model.do_mstep = functools.partial(_extra_pass_mstep, model)
+    try:
+        model.update(corpus)
+    finally:
+        model.offset = offset
+        if pass_ > 0:
+            model.state.numdocs = numdocs
+            del model.do_mstep
+
+
+def _log_perplexity(model: Any, corpus: Any) -> float:
+    """Return the perplexity of a gensim model on a corpus, without changing the random state used for training."""
+
+    import numpy as np
+
+    random_state = model.random_state.get_state()
+    try:
+        return float(np.exp2(-model.log_perplexity(corpus)))
+    finally:
+        model.random_state.set_state(random_state)
+
+
+def _parse_alpha(alpha: Any) -> Union[str, float]:
+
+    if isinstance(alpha, str) and alpha in ("symmetric", "asymmetric", "auto"):
+        return alpha
+    try:
+        return float(alpha)
+    except (TypeError, ValueError):
+        raise KiaraProcessingException(f"Invalid alpha value '{alpha}', must be 'symmetric', 'asymmetric', 'auto' or a number.")
+
+
+def _train_sweep_candidate(corpus_dir: str, vocabulary_path: str, num_docs: int, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Train one candidate model of a sweep on the shared corpus, and evaluate it.
+
+    This runs in a worker process, the corpus and the vocabulary are memory-mapped from the files of the parent process.
+    """
+
+    import time
+
+    import numpy as np
+    import pyarrow as pa  # type: ignore
+    from gensim.models import CoherenceModel  # type: ignore
+    from gensim.models import LdaModel as GensimLdaModel  # type: ignore
+
+    from kiara_plugin.topic_modelling.utils import create_gensim_dictionary
+
+    with pa.memory_map(vocabulary_path, "r") as source:
+        vocabulary_table = pa.ipc.open_file(source).read_all()
+    id2word = create_gensim_dictionary(vocabulary_table, num_docs=num_docs)
+    corpus = _MemoryMappedCorpus(corpus_dir)
+
+    start = time.perf_counter()
+    model = GensimLdaModel(corpus, id2word=id2word, eval_every=None, **settings)
+    training_time = time.perf_counter() - start
+
+    perplexity = float(np.exp2(-model.log_perplexity(corpus)))
+    coherence = CoherenceModel(model=model, corpus=corpus, dictionary=id2word, coherence="u_mass").get_coherence()
+
+    return {"coherence": float(coherence), "perplexity": perplexity, "training_time": training_time}
+
+
+class DeserializeLdaModelModule(DeserializeValueModule):
+    """Deserialize an LDA model."""
+
+    _module_type_name = "load.lda_model"
+
+    @classmethod
+    def retrieve_supported_target_profiles(cls) -> Mapping[str, Type]:
+        return {"python_object": LdaModel}
+
+    @classmethod
+    def retrieve_serialized_value_type(cls) -> str:
+        return "lda_model"
+
+    @classmethod
+    def retrieve_supported_serialization_profile(cls) -> str:
+        return "lda_model"
+
+    def to__python_object(self, data: SerializedData, **config: Any):
+
+        from kiara_plugin.topic_modelling.utils import decode_chunk
+
+        model_chunk = next(data.get_serialized_data("model.json").get_chunks(as_files=False))
+        model_data = json.loads(decode_chunk(model_chunk))
+
+        paths: Dict[str, str] = {}
+        for key in ("topic_word.npy", "vocabulary.arrow"):
+            files = list(data.get_serialized_data(key).get_chunks(as_files=True, symlink_ok=True))
+            assert len(files) == 1
+            paths[key] = decode_chunk(files[0])
+
+        return LdaModel(topic_word_path=paths["topic_word.npy"], vocabulary_path=paths["vocabulary.arrow"], **model_data)
+
+
 class RunLda(KiaraModule):
     """
     https://radimrehurek.com/gensim/models/ldamulticore.html
-    
+
+    The gensim dictionary and the bag-of-words corpus are built from token ids, without converting the tokens to
+    Python strings: token arrays are dictionary-encoded (see 'topic_modelling.tokenize_array') if they aren't already,
+    and document and term frequencies are counted on the ids. The 'no_below' and 'no_above' filters are applied in a
+    single pass, like one call to gensim's 'filter_extremes' (gensim's defaults apply to the filter that is not set).
+    The token ids, and the document and term frequencies of the remaining tokens are returned as the 'vocabulary' table.
+
+    The trained model is returned as an 'lda_model' value, so later steps can use it without training it again.
+
+    Instead of a tokens array, an existing document-term matrix can be used (see 'topic_modelling.doc_term_matrix'),
+    its vocabulary and counts are then used as they are, and documents are read from its (memory-mapped) arrays on
+    every pass.
+
+    If 'streaming' is set, the token array is never converted as a whole: documents are converted in batches (of
+    'batch_size' documents), the bag-of-words corpus is serialized once to a temporary Matrix Market file, and the
+    model is trained on a lazy corpus that is read from that file on every pass. Memory use during training then
+    doesn't depend on the size of the corpus.
+
+    The model is trained one pass at a time, and every pass is recorded in the 'training_log' table: its wall time,
+    the perplexity of the model on the evaluation documents, and how much the topics changed. The evaluation documents
+    are a held-out sample of the corpus if 'holdout_fraction' is set (they are then not used for training, nor for
+    building the vocabulary, so their unknown tokens are ignored), otherwise a sample of the training documents. If 'convergence_threshold' is set, training stops early once a pass improves
+    the perplexity by less than that fraction.
     """
 
     _module_type_name = "topic_modelling.lda"
@@ -16,6 +354,12 @@ class RunLda(KiaraModule):
             "tokens_array": {
                 "type": "array",
                 "doc": "Array that contains the tokens to process.",
+                "optional": True
+            },
+            "doc_term_matrix": {
+                "type": "doc_term_matrix",
+                "doc": "A document-term matrix (see 'topic_modelling.doc_term_matrix') to use instead of the tokens array, the filters and 'streaming' are ignored then.",
+                "optional": True
             },
             "no_below": {
                 "type": "integer",
@@ -24,10 +368,9 @@ class RunLda(KiaraModule):
                 "default": False
             },
             "no_above": {
-                "type": "integer",
-                "doc": "Remove tokens that appear in more than no_above documents.",
-                "optional": True,
-                "default": False
+                "type": "float",
+                "doc": "Remove tokens that appear in more than this fraction of the documents (e.g. 0.5).",
+                "optional": True
             },
             "num_topics": {
                 "type": "integer",
@@ -58,10 +401,39 @@ class RunLda(KiaraModule):
                 "optional": True,
                 "default": False
             },
+            "streaming": {
+                "type": "boolean",
+                "doc": "Whether to stream the corpus from a temporary memory-mapped file, instead of keeping it in memory.",
+                "optional": True,
+                "default": False
+            },
+            "batch_size": {
+                "type": "integer",
+                "doc": f"Number of documents to convert at a time in streaming mode (default: {DEFAULT_STREAM_BATCH_SIZE}).",
+                "optional": True
+            },
+            "holdout_fraction": {
+                "type": "float",
+                "doc": f"Fraction of the documents to exclude from training, to compute the perplexity on after every pass (default: a sample of at most {DEFAULT_EVALUATION_SAMPLE_SIZE} training documents).",
+                "optional": True
+            },
+            "convergence_threshold": {
+                "type": "float",
+                "doc": "Stop training before all passes are done, once a pass improves the perplexity by less than this fraction.",
+                "optional": True
+            },
         }
 
     def create_outputs_schema(self):
         return {
+            "model": {
+                "type": "lda_model",
+                "doc": "The trained model (topic-word matrix, vocabulary and hyperparameters)."
+            },
+            "vocabulary": {
+                "type": "table",
+                "doc": "The vocabulary of the model, with the columns 'id', 'token', 'document_frequency' and 'term_frequency'."
+            },
             "most_common_words": {
                 "type": "list",
                 "doc": "The 15 most common words overall."
@@ -69,18 +441,33 @@ class RunLda(KiaraModule):
             "topics": {
                 "type": "list",
                 "doc": "The topics generated by LDA."
+            },
+            "training_log": {
+                "type": "table",
+                "doc": "One row per training pass, with the columns 'pass', 'wall_time' (in seconds), 'perplexity' (on the evaluation documents) and 'topic_diff' (mean Hellinger distance of the topics to the ones before the pass)."
             }
         }
 
     def process(self, inputs, outputs):
 
+        import tempfile
+        import time
+
         import gensim  # type: ignore
-        from gensim import corpora # type: ignore
+        import pyarrow as pa  # type: ignore
+        from gensim import corpora  # type: ignore
+
+        from kiara_plugin.topic_modelling.utils import (
+            build_dictionary,
+            create_gensim_dictionary,
+            select_documents,
+        )
+
+        tokens_array_value = inputs.get_value_obj("tokens_array")
+        doc_term_matrix_value = inputs.get_value_obj("doc_term_matrix")
+        if tokens_array_value.is_set == doc_term_matrix_value.is_set:
+            raise KiaraProcessingException("Either a tokens array or a document-term matrix must be provided (but not both).")
 
-        tokens_array = inputs.get_value_data("tokens_array")
-        tokens_array_pa = tokens_array.arrow_array
-        tokens_list = tokens_array_pa.to_pylist()
-        
         no_below = inputs.get_value_data("no_below")
         no_above = inputs.get_value_data("no_above")
         
@@ -91,43 +478,675 @@ class RunLda(KiaraModule):
         iterations = inputs.get_value_data("iterations")
         random_state = inputs.get_value_data("random_state")
 
+        streaming = inputs.get_value_data("streaming")
+        batch_size = inputs.get_value_data("batch_size")
+        if batch_size is None:
+            batch_size = DEFAULT_STREAM_BATCH_SIZE
+        elif batch_size < 1:
+            raise KiaraProcessingException(f"Invalid batch size '{batch_size}', must be at least 1.")
+
+        holdout_fraction = inputs.get_value_data("holdout_fraction")
+        convergence_threshold = inputs.get_value_data("convergence_threshold")
+        if convergence_threshold is not None and convergence_threshold < 0:
+            raise KiaraProcessingException(f"Invalid convergence threshold '{convergence_threshold}', must not be negative.")
+
+        if doc_term_matrix_value.is_set:
+            doc_term_matrix = doc_term_matrix_value.data
+            num_docs = doc_term_matrix.num_documents
+        else:
+            tokens_array_pa = tokens_array_value.data.arrow_array
+            num_docs = len(tokens_array_pa)
+        train_mask, eval_mask = _split_documents(num_docs, holdout_fraction=holdout_fraction, random_state=random_state)
+
+        if doc_term_matrix_value.is_set:
+            # the vocabulary of the matrix is used as is, so it also contains the tokens of held-out documents
+            vocabulary_table = doc_term_matrix.vocabulary
+            id2word = create_gensim_dictionary(
+                vocabulary_table, num_docs=num_docs, num_pos=int(doc_term_matrix.counts.sum()), num_nnz=doc_term_matrix.num_nonzero
+            )
+            count_matrix = doc_term_matrix.to_scipy(weighted=False)
+            eval_corpus = list(_CsrCorpus.from_scipy(count_matrix[eval_mask]))
+        else:
+            try:
+                tokens_array_pa, (doc_index, token_ids, counts), vocabulary_table, id_map, id2word = build_dictionary(
+                    tokens_array_pa, no_below=no_below, no_above=no_above, doc_mask=train_mask
+                )
+            except Exception as e:
+                raise KiaraProcessingException(
+                    f"Failed to create dictionary: {e}"
+                )
+
+            eval_corpus = _bow_documents_from_token_ids(id_map, *select_documents(eval_mask, doc_index, token_ids, counts))
+
+        # only pass the training parameters that are set, so gensim's defaults apply to the others
+        # (a value of 0 would mean no training at all, or a division by zero for 'chunksize')
+        training_args = {
+            key: value
+            for key, value in {"chunksize": chunksize, "iterations": iterations}.items()
+            if value
+        }
+        num_passes = passes or 1
+
+        def train(corpus) -> Tuple[Any, Dict[str, List[Any]]]:
+
+            try:
+                model = gensim.models.ldamulticore.LdaMulticore(id2word=id2word, num_topics=num_topics, random_state=random_state, **training_args)
+            except Exception as e:
+                raise KiaraProcessingException(
+                    f"Failed to run LDA: {e}"
+                )
+
+            log: Dict[str, List[Any]] = {"pass": [], "wall_time": [], "perplexity": [], "topic_diff": []}
+            topics = model.get_topics()
+            for pass_ in range(num_passes):
+                start = time.perf_counter()
+                try:
+                    _train_pass(model, corpus, pass_)
+                except Exception as e:
+                    raise KiaraProcessingException(
+                        f"Failed to run LDA: {e}"
+                    )
+                wall_time = time.perf_counter() - start
+
+                perplexity = _log_perplexity(model, eval_corpus)
+                previous_topics, topics = topics, model.get_topics()
+
+                log["pass"].append(pass_ + 1)
+                log["wall_time"].append(wall_time)
+                log["perplexity"].append(perplexity)
+                log["topic_diff"].append(_mean_hellinger_distance(previous_topics, topics))
+
+                if convergence_threshold is not None and pass_ > 0:
+                    previous_perplexity = log["perplexity"][-2]
+                    if (previous_perplexity - perplexity) / previous_perplexity < convergence_threshold:
+                        break
+
+            model.passes = len(log["pass"])
+            return model, log
+
+        if doc_term_matrix_value.is_set:
+            # the arrays of a loaded matrix are memory-mapped, so documents are read from them on every pass
+            if train_mask is None:
+                corpus = _CsrCorpus(doc_term_matrix.indptr, doc_term_matrix.indices, doc_term_matrix.counts)
+            else:
+                corpus = _CsrCorpus.from_scipy(count_matrix[train_mask])
+            model, training_log = train(corpus)
+        elif streaming:
+            if train_mask is not None:
+                tokens_array_pa = tokens_array_pa.filter(pa.array(train_mask))
+            with tempfile.TemporaryDirectory(prefix="kiara_lda_") as temp_dir:
+                corpus_path = f"{temp_dir}/corpus.mm"
+                try:
+                    corpora.MmCorpus.serialize(corpus_path, _iter_bow_documents(id_map, tokens_array_pa, batch_size=batch_size), id2word=id2word)
+                    corpus = corpora.MmCorpus(corpus_path)
+                except Exception as e:
+                    raise KiaraProcessingException(
+                        f"Failed to create doc2bow: {e}"
+                    )
+
+                model, training_log = train(corpus)
+        else:
+            try:
+                if train_mask is not None:
+                    corpus = _bow_documents_from_token_ids(id_map, *select_documents(train_mask, doc_index, token_ids, counts))
+                else:
+                    corpus = _bow_documents_from_token_ids(id_map, doc_index, token_ids, counts, num_docs=num_docs)
+            except Exception as e:
+                raise KiaraProcessingException(
+                    f"Failed to create doc2bow: {e}"
+                )
+
+            model, training_log = train(corpus)
+
+        outputs.set_value("model", LdaModel.create_from_gensim(model, vocabulary=vocabulary_table, random_state=random_state))
+        outputs.set_value("vocabulary", vocabulary_table)
+        outputs.set_value("topics", model.print_topics(num_words=30))
+        outputs.set_value("most_common_words", id2word.most_common(15))
+        outputs.set_value("training_log", pa.table({
+            "pass": pa.array(training_log["pass"], type=pa.int32()),
+            "wall_time": pa.array(training_log["wall_time"], type=pa.float64()),
+            "perplexity": pa.array(training_log["perplexity"], type=pa.float64()),
+            "topic_diff": pa.array(training_log["topic_diff"], type=pa.float64()),
+        }))
+
+
+class LdaSweep(KiaraModule):
+    """
+    This module trains LDA models for a list of topic counts (and optionally of alpha values and numbers of passes),
+    and evaluates them, to help choosing the number of topics.
+
+    The dictionary and the bag-of-words corpus are built once (like in 'topic_modelling.lda'), and written to
+    temporary files that are memory-mapped by a pool of worker processes, which train the candidate models concurrently.
+    For every combination of settings, the output table contains the 'u_mass' topic coherence (higher is better),
+    the perplexity on the corpus (lower is better), and the training time in seconds.
+
+    Dependencies:
+    - gensim: https://radimrehurek.com/gensim/
+    """
+
+    _module_type_name = "topic_modelling.lda_sweep"
+
+    def create_inputs_schema(self):
+        return {
+            "tokens_array": {
+                "type": "array",
+                "doc": "Array that contains the tokens to process.",
+            },
+            "num_topics_list": {
+                "type": "list",
+                "doc": "The numbers of topics to train models for, e.g. [5, 10, 20].",
+                "optional": False,
+            },
+            "alpha_list": {
+                "type": "list",
+                "doc": "The alpha values to train models for: 'symmetric', 'asymmetric', 'auto' or numbers (default: ['symmetric']).",
+                "optional": True
+            },
+            "passes_list": {
+                "type": "list",
+                "doc": "The numbers of passes to train models for (default: [1]).",
+                "optional": True
+            },
+            "no_below": {
+                "type": "integer",
+                "doc": "Remove tokens that appear in less than no_below documents.",
+                "optional": True
+            },
+            "no_above": {
+                "type": "float",
+                "doc": "Remove tokens that appear in more than this fraction of the documents (e.g. 0.5).",
+                "optional": True
+            },
+            "chunksize": {
+                "type": "integer",
+                "doc": "Chunksize.",
+                "optional": True,
+                "default": False
+            },
+            "iterations": {
+                "type": "integer",
+                "doc": "Number of iterations.",
+                "optional": True,
+                "default": False
+            },
+            "random_state": {
+                "type": "integer",
+                "doc": "Random state.",
+                "optional": True,
+                "default": False
+            },
+            "num_workers": {
+                "type": "integer",
+                "doc": "Number of worker processes that train models concurrently (default: number of CPUs). If set to 1, models are trained in the current process.",
+                "optional": True
+            },
+        }
+
+    def create_outputs_schema(self):
+        return {
+            "sweep_results": {
+                "type": "table",
+                "doc": "One row per combination of settings, with the columns 'num_topics', 'alpha', 'passes', 'coherence', 'perplexity' and 'training_time'."
+            }
+        }
+
+    def process(self, inputs, outputs):
+
+        import itertools
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor
+
+        import pyarrow as pa  # type: ignore
+
+        from kiara_plugin.topic_modelling.utils import (
+            build_dictionary,
+            csr_from_token_ids,
+        )
+
+        tokens_array_pa = inputs.get_value_data("tokens_array").arrow_array
+        num_topics_list = inputs.get_value_data("num_topics_list").list_data
+        alpha_list_value = inputs.get_value_data("alpha_list")
+        passes_list_value = inputs.get_value_data("passes_list")
+
+        no_below = inputs.get_value_data("no_below")
+        no_above = inputs.get_value_data("no_above")
+        chunksize = inputs.get_value_data("chunksize")
+        iterations = inputs.get_value_data("iterations")
+        random_state = inputs.get_value_data("random_state")
+        num_workers = inputs.get_value_data("num_workers")
+
+        if num_workers is not None and num_workers < 1:
+            raise KiaraProcessingException(f"Invalid number of workers '{num_workers}', must be at least 1.")
+
+        alpha_list = alpha_list_value.list_data if alpha_list_value else ["symmetric"]
+        passes_list = passes_list_value.list_data if passes_list_value else [1]
+
         try:
-            id2word = corpora.Dictionary(tokens_list)
+            num_topics_list = [int(num_topics) for num_topics in num_topics_list]
+            passes_list = [int(passes) for passes in passes_list]
+        except (TypeError, ValueError) as e:
+            raise KiaraProcessingException(f"Invalid number of topics or passes: {e}")
+        if not num_topics_list or min(num_topics_list) < 1 or min(passes_list) < 1:
+            raise KiaraProcessingException("The numbers of topics and passes must be at least 1.")
+
+        # only pass the training parameters that are set, so gensim's defaults apply to the others
+        training_args = {
+            key: value
+            for key, value in {"chunksize": chunksize, "iterations": iterations}.items()
+            if value
+        }
+
+        candidates = [
+            {"num_topics": num_topics, "alpha": _parse_alpha(alpha), "passes": passes, "random_state": random_state, **training_args}
+            for num_topics, alpha, passes in itertools.product(num_topics_list, alpha_list, passes_list)
+        ]
+
+        try:
+            tokens_array_pa, (doc_index, token_ids, counts), vocabulary_table, id_map, _ = build_dictionary(
+                tokens_array_pa, no_below=no_below, no_above=no_above
+            )
+            num_docs = len(tokens_array_pa)
         except Exception as e:
             raise KiaraProcessingException(
                 f"Failed to create dictionary: {e}"
             )
 
-        if not no_below == False:
+        with tempfile.TemporaryDirectory(prefix="kiara_lda_sweep_") as temp_dir:
+
             try:
-                id2word.filter_extremes(no_below=no_below)
+                indptr, ids, id_counts = csr_from_token_ids(id_map, doc_index, token_ids, counts, num_docs=num_docs)
+                _MemoryMappedCorpus.save(temp_dir, indptr, ids, id_counts)
+                vocabulary_path = os.path.join(temp_dir, "vocabulary.arrow")
+                with pa.OSFile(vocabulary_path, "wb") as sink:
+                    with pa.ipc.new_file(sink, schema=vocabulary_table.schema) as writer:
+                        writer.write_table(vocabulary_table)
             except Exception as e:
                 raise KiaraProcessingException(
-                    f"Failed to filter extremes with no_below value: {e}"
+                    f"Failed to create doc2bow: {e}"
                 )
 
-        if not no_above == False:
             try:
-                id2word.filter_extremes(no_above=no_above)
+                if num_workers == 1 or len(candidates) == 1:
+                    results = [_train_sweep_candidate(temp_dir, vocabulary_path, num_docs, settings) for settings in candidates]
+                else:
+                    max_workers = min(num_workers or os.cpu_count() or 1, len(candidates))
+                    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                        futures = [
+                            executor.submit(_train_sweep_candidate, temp_dir, vocabulary_path, num_docs, settings)
+                            for settings in candidates
+                        ]
+                        results = [future.result() for future in futures]
             except Exception as e:
                 raise KiaraProcessingException(
-                    f"Failed to filter extremes with no_above value: {e}"
+                    f"Failed to run LDA: {e}"
                 )
-            id2word.filter_extremes(no_above=no_above)
+
+        sweep_results = pa.table(
+            {
+                "num_topics": pa.array([settings["num_topics"] for settings in candidates], type=pa.int64()),
+                "alpha": pa.array([str(settings["alpha"]) for settings in candidates], type=pa.string()),
+                "passes": pa.array([settings["passes"] for settings in candidates], type=pa.int64()),
+                "coherence": pa.array([result["coherence"] for result in results], type=pa.float64()),
+                "perplexity": pa.array([result["perplexity"] for result in results], type=pa.float64()),
+                "training_time": pa.array([result["training_time"] for result in results], type=pa.float64()),
+            }
+        )
+        outputs.set_value("sweep_results", sweep_results)
+
+
+class UpdateLda(KiaraModule):
+    """
+    This module updates a trained LDA model (see 'topic_modelling.lda') with a batch of new documents, using gensim's
+    online training ('LdaModel.update'), so the cost depends on the size of the new batch, not on the whole corpus.
+
+    Tokens of the new documents are mapped to the vocabulary of the model; unknown tokens are ignored, unless
+    'extend_vocabulary' is set, in which case they are added to the vocabulary (their topic-word weights start at the
+    prior 'eta'). Document and term frequencies of the vocabulary are updated with the counts of the new documents.
+
+    The result is a new version of the model, and the record of the documents the model has seen: the previous record
+    (if provided) plus the ids of the new documents, with the model version that added them. Documents that are
+    already in the record can't be added again.
+
+    Dependencies:
+    - gensim: https://radimrehurek.com/gensim/
+    """
+
+    _module_type_name = "topic_modelling.lda_update"
+
+    def create_inputs_schema(self):
+        return {
+            "model": {
+                "type": "lda_model",
+                "doc": "The model to update.",
+            },
+            "tokens_array": {
+                "type": "array",
+                "doc": "Array that contains the tokens of the new documents.",
+            },
+            "document_ids": {
+                "type": "array",
+                "doc": "The ids of the new documents (default: their position in the collection, after the documents the model was trained on).",
+                "optional": True
+            },
+            "seen_documents": {
+                "type": "table",
+                "doc": "The record of the documents the model has already seen, as returned by a previous update.",
+                "optional": True
+            },
+            "extend_vocabulary": {
+                "type": "boolean",
+                "doc": "Whether to add tokens that are not in the vocabulary of the model.",
+                "optional": True,
+                "default": False
+            },
+            "passes": {
+                "type": "integer",
+                "doc": "Number of passes over the new documents (default: the number of passes of the model).",
+                "optional": True
+            },
+            "chunksize": {
+                "type": "integer",
+                "doc": "Chunksize (default: the chunksize of the model).",
+                "optional": True
+            },
+        }
+
+    def create_outputs_schema(self):
+        return {
+            "model": {
+                "type": "lda_model",
+                "doc": "The updated model, with an incremented version."
+            },
+            "seen_documents": {
+                "type": "table",
+                "doc": "The record of the documents the model has seen, with the columns 'document_id' and 'model_version'."
+            }
+        }
+
+    def process(self, inputs, outputs):
+
+        import numpy as np
+        import pyarrow as pa  # type: ignore
+        import pyarrow.compute as pc  # type: ignore
+
+        from kiara_plugin.topic_modelling.utils import (
+            build_vocabulary,
+            count_token_ids,
+            encode_tokens,
+            get_vocabulary,
+        )
+
+        model: LdaModel = inputs.get_value_data("model")
+        tokens_array_pa = inputs.get_value_data("tokens_array").arrow_array
+        document_ids_value = inputs.get_value_obj("document_ids")
+        seen_documents_value = inputs.get_value_obj("seen_documents")
+        extend_vocabulary = inputs.get_value_data("extend_vocabulary")
+        passes = inputs.get_value_data("passes")
+        chunksize = inputs.get_value_data("chunksize")
+
+        num_new_docs = len(tokens_array_pa)
+        new_version = model.version + 1
+
+        if document_ids_value.is_set:
+            document_ids = pc.cast(document_ids_value.data.arrow_array, pa.string()).combine_chunks()
+            if len(document_ids) != num_new_docs:
+                raise KiaraProcessingException(
+                    f"Number of document ids ({len(document_ids)}) doesn't match the number of documents ({num_new_docs})."
+                )
+        else:
+            document_ids = pa.array([str(idx) for idx in range(model.num_documents, model.num_documents + num_new_docs)], type=pa.string())
+
+        if document_ids.null_count or len(pc.unique(document_ids)) != len(document_ids):
+            raise KiaraProcessingException("Document ids must be unique and not null.")
+
+        seen_documents = pa.table({"document_id": pa.array([], type=pa.string()), "model_version": pa.array([], type=pa.int64())})
+        if seen_documents_value.is_set:
+            seen_documents = seen_documents_value.data.arrow_table.select(["document_id", "model_version"])
+            seen_documents = seen_documents.cast(pa.schema([("document_id", pa.string()), ("model_version", pa.int64())]))
+            already_seen = pc.is_in(document_ids, value_set=seen_documents.column("document_id").combine_chunks())
+            if pc.any(already_seen).as_py():
+                duplicates = document_ids.filter(already_seen).to_pylist()
+                raise KiaraProcessingException(f"The model has already seen some of the documents: {', '.join(duplicates[:10])}")
 
         try:
-            corpus = [id2word.doc2bow(text) for text in tokens_list]
+            tokens_array_pa = encode_tokens(tokens_array_pa)
+            doc_index, token_ids, counts = count_token_ids(tokens_array_pa)
+            batch_vocabulary = get_vocabulary(tokens_array_pa)
+            # the tokens of the batch, in the order gensim would add them to a dictionary
+            batch_table, _ = build_vocabulary(batch_vocabulary, doc_index, token_ids, counts, num_docs=num_new_docs)
+
+            vocabulary = model.vocabulary
+            topic_word = np.asarray(model.topic_word)
+            hyperparameters = dict(model.hyperparameters)
+
+            if extend_vocabulary:
+                is_new = pc.invert(pc.is_in(batch_table.column("token"), value_set=vocabulary.column("token")))
+                new_tokens = batch_table.column("token").filter(is_new)
+                if len(new_tokens):
+                    num_tokens = vocabulary.num_rows
+                    vocabulary = pa.concat_tables([
+                        vocabulary,
+                        pa.table(
+                            {
+                                "id": pa.array(np.arange(num_tokens, num_tokens + len(new_tokens)), type=pa.int64()),
+                                "token": new_tokens.combine_chunks(),
+                                "document_frequency": pa.array(np.zeros(len(new_tokens), dtype=np.int64)),
+                                "term_frequency": pa.array(np.zeros(len(new_tokens), dtype=np.int64)),
+                            },
+                            schema=vocabulary.schema,
+                        ),
+                    ]).combine_chunks()
+
+                    eta = hyperparameters.get("eta")
+                    if isinstance(eta, list):
+                        new_eta = float(np.mean(eta)) if eta else 1.0 / model.num_topics
+                        hyperparameters["eta"] = eta + [new_eta] * len(new_tokens)
+                    else:
+                        new_eta = 1.0 / model.num_topics if eta is None else eta
+                    topic_word = np.hstack([topic_word, np.full((model.num_topics, len(new_tokens)), new_eta, dtype=topic_word.dtype)])
+
+            id_map = _model_id_map(batch_vocabulary, vocabulary)
+
+            # add the frequencies of the new documents to the vocabulary
+            known = pc.fill_null(pc.index_in(batch_table.column("token"), value_set=vocabulary.column("token")), -1)
+            known = known.to_numpy(zero_copy_only=False).astype(np.int64)
+            dfs = vocabulary.column("document_frequency").to_numpy().copy()
+            cfs = vocabulary.column("term_frequency").to_numpy().copy()
+            known_mask = known >= 0
+            dfs[known[known_mask]] += batch_table.column("document_frequency").to_numpy()[known_mask]
+            cfs[known[known_mask]] += batch_table.column("term_frequency").to_numpy()[known_mask]
+            vocabulary = vocabulary.set_column(2, "document_frequency", pa.array(dfs, type=pa.int64()))
+            vocabulary = vocabulary.set_column(3, "term_frequency", pa.array(cfs, type=pa.int64()))
+
+            corpus = _bow_documents_from_token_ids(id_map, doc_index, token_ids, counts, num_docs=num_new_docs)
         except Exception as e:
             raise KiaraProcessingException(
-                f"Failed to create doc2bow: {e}"
+                f"Failed to map the new documents to the vocabulary: {e}"
             )
-        
+
+        base = LdaModel(
+            num_topics=model.num_topics,
+            num_documents=model.num_documents + num_new_docs,
+            version=model.version,
+            num_updates=model.num_updates,
+            num_processed_documents=model.num_processed_documents,
+            hyperparameters=hyperparameters,
+        )
+        base._topic_word = topic_word
+        base._vocabulary = vocabulary
+
+        update_args = {key: value for key, value in {"passes": passes, "chunksize": chunksize}.items() if value}
         try:
-            model = gensim.models.ldamulticore.LdaMulticore(corpus, id2word=id2word, num_topics=num_topics, random_state=random_state, passes=passes, chunksize=chunksize, iterations=iterations)
+            gensim_model = base.to_gensim()
+            gensim_model.update(corpus, **update_args)
         except Exception as e:
             raise KiaraProcessingException(
-                f"Failed to run LDA: {e}"
+                f"Failed to update LDA model: {e}"
             )
-        
-        outputs.set_value("topics", model.print_topics(num_words=30))
-        outputs.set_value("most_common_words", id2word.most_common(15))
\ No newline at end of file
+
+        extra_hyperparameters = {key: value for key, value in hyperparameters.items() if key == "random_state"}
+        updated_model = LdaModel.create_from_gensim(gensim_model, vocabulary=vocabulary, version=new_version, **extra_hyperparameters)
+
+        seen_documents = pa.concat_tables([
+            seen_documents,
+            pa.table(
+                {"document_id": document_ids, "model_version": pa.array(np.full(num_new_docs, new_version), type=pa.int64())},
+                schema=seen_documents.schema,
+            ),
+        ])
+
+        outputs.set_value("model", updated_model)
+        outputs.set_value("seen_documents", seen_documents)
+
+
+
+class DocumentTopics(KiaraModule):
+    """
+    This module computes the topic distributions of documents, with a trained LDA model (see 'topic_modelling.lda').
+
+    Documents are processed in batches (of 'batch_size' documents): every batch is converted to a sparse document-term
+    matrix, and the topic distributions of all of its documents are inferred at once, with a vectorized version of
+    gensim's inference. Tokens that are not in the vocabulary of the model are ignored.
+
+    The result is a table with a 'document_id' column and one float32 column per topic ('topic_0', 'topic_1', ...),
+    or, in the 'long' format, a table with the columns 'document_id', 'topic' and 'probability' that only contains the
+    topics of a document with a probability of at least 'minimum_probability'.
+
+    Dependencies:
+    - gensim: https://radimrehurek.com/gensim/
+    - SciPy: https://scipy.org/
+    """
+
+    _module_type_name = "topic_modelling.document_topics"
+
+    def create_inputs_schema(self):
+        return {
+            "model": {
+                "type": "lda_model",
+                "doc": "The trained model.",
+            },
+            "tokens_array": {
+                "type": "array",
+                "doc": "Array that contains the tokens of the documents.",
+            },
+            "document_ids": {
+                "type": "array",
+                "doc": "The ids of the documents (default: their position in the array).",
+                "optional": True
+            },
+            "format": {
+                "type": "string",
+                "type_config": {"allowed_strings": ["wide", "long"]},
+                "doc": "The format of the result: 'wide' (one column per topic) or 'long' (one row per document and topic).",
+                "optional": True,
+                "default": "wide"
+            },
+            "minimum_probability": {
+                "type": "float",
+                "doc": "In the 'long' format, the minimum probability of the topics to include.",
+                "optional": True,
+                "default": 0.01
+            },
+            "batch_size": {
+                "type": "integer",
+                "doc": f"Number of documents to process at a time (default: {DEFAULT_STREAM_BATCH_SIZE}).",
+                "optional": True
+            },
+        }
+
+    def create_outputs_schema(self):
+        return {
+            "document_topics": {
+                "type": "table",
+                "doc": "The topic distributions of the documents."
+            }
+        }
+
+    def process(self, inputs, outputs):
+
+        import numpy as np
+        import pyarrow as pa  # type: ignore
+        import pyarrow.compute as pc  # type: ignore
+
+        from kiara_plugin.topic_modelling.utils import (
+            count_token_ids,
+            csr_from_token_ids,
+            encode_tokens,
+            get_vocabulary,
+            iter_chunks,
+        )
+
+        model: LdaModel = inputs.get_value_data("model")
+        tokens_array_pa = inputs.get_value_data("tokens_array").arrow_array
+        document_ids_value = inputs.get_value_obj("document_ids")
+        table_format = inputs.get_value_data("format")
+        minimum_probability = inputs.get_value_data("minimum_probability")
+        batch_size = inputs.get_value_data("batch_size")
+
+        if batch_size is None:
+            batch_size = DEFAULT_STREAM_BATCH_SIZE
+        elif batch_size < 1:
+            raise KiaraProcessingException(f"Invalid batch size '{batch_size}', must be at least 1.")
+
+        num_docs = len(tokens_array_pa)
+        if document_ids_value.is_set:
+            document_ids = document_ids_value.data.arrow_array.combine_chunks()
+            if len(document_ids) != num_docs:
+                raise KiaraProcessingException(
+                    f"Number of document ids ({len(document_ids)}) doesn't match the number of documents ({num_docs})."
+                )
+        else:
+            document_ids = pa.array(np.arange(num_docs), type=pa.int64())
+
+        num_topics = model.num_topics
+        topic_columns = [f"topic_{topic_id}" for topic_id in range(num_topics)]
+        topic_word = np.asarray(model.topic_word)
+        alpha = np.asarray(model.hyperparameters["alpha"], dtype=np.float64)
+        iterations = model.hyperparameters.get("iterations") or 50
+        gamma_threshold = model.hyperparameters.get("gamma_threshold") or 0.001
+
+        try:
+            tokens_array_pa = encode_tokens(tokens_array_pa)
+            id_map = _model_id_map(get_vocabulary(tokens_array_pa), model.vocabulary)
+
+            tables = []
+            offset = 0
+            for batch in iter_chunks(tokens_array_pa, chunk_size=batch_size):
+                batch_docs = len(batch)
+                doc_index, token_ids, counts = count_token_ids(batch)
+                indptr, ids, id_counts = csr_from_token_ids(id_map, doc_index, token_ids, counts, num_docs=batch_docs)
+                theta = _infer_document_topics(
+                    topic_word, alpha, indptr, ids, id_counts, iterations=iterations, gamma_threshold=gamma_threshold
+                ).astype(np.float32)
+                batch_ids = document_ids.slice(offset, batch_docs)
+
+                if table_format == "long":
+                    doc_positions, topics = np.nonzero(theta >= minimum_probability)
+                    tables.append(
+                        pa.table(
+                            {
+                                "document_id": pc.take(batch_ids, pa.array(doc_positions, type=pa.int64())),
+                                "topic": pa.array(topics, type=pa.int32()),
+                                "probability": pa.array(theta[doc_positions, topics], type=pa.float32()),
+                            }
+                        )
+                    )
+                else:
+                    columns = {"document_id": batch_ids}
+                    for topic_id, column_name in enumerate(topic_columns):
+                        columns[column_name] = pa.array(theta[:, topic_id], type=pa.float32())
+                    tables.append(pa.table(columns))
+                offset += batch_docs
+        except Exception as e:
+            raise KiaraProcessingException(
+                f"Failed to infer the document topics: {e}"
+            )
+
+        if tables:
+            document_topics = pa.concat_tables(tables)
+        elif table_format == "long":
+            document_topics = pa.table({"document_id": document_ids, "topic": pa.array([], type=pa.int32()), "probability": pa.array([], type=pa.float32())})
+        else:
+            document_topics = pa.table({"document_id": document_ids, **{name: pa.array([], type=pa.float32()) for name in topic_columns}})
+
+        outputs.set_value("document_topics", document_topics)
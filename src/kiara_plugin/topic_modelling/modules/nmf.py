@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple, Union
+
+from kiara.api import KiaraModule
+from kiara.exceptions import KiaraProcessingException
+
+if TYPE_CHECKING:
+    import numpy as np
+    from scipy import sparse  # type: ignore
+
+DEFAULT_MAX_ITERATIONS = 200
+DEFAULT_TOLERANCE = 1e-4
+
+# added to the denominators of the multiplicative updates, to avoid divisions by zero
+EPSILON = 1e-10
+
+
+def _factorize(
+    matrix: "sparse.csr_matrix", num_topics: int, max_iterations: int, tolerance: float, random_state: Union[int, None]
+) -> Tuple["np.ndarray", "np.ndarray", Dict[str, List[Any]]]:
+    """Factorize a sparse (documents x terms) matrix into non-negative document-topic and topic-term matrices.
+
+    Uses the multiplicative updates of Lee & Seung for the Frobenius norm. Every update is a few products of the sparse
+    matrix with the (small, dense) factors, so the matrix is never densified. The reconstruction error is computed
+    from the products of the factors, without building the reconstruction. Stops once an iteration improves the error
+    by less than 'tolerance' (relative to the error of the previous iteration).
+
+    Returns the document-topic matrix, the topic-term matrix and the training log (one row per iteration).
+    """
+
+    import time
+
+    import numpy as np
+
+    num_docs, num_terms = matrix.shape
+    # like gensim, only an unset random state is unseeded (0 is a seed)
+    rng = np.random.default_rng(None if random_state is None or random_state is False else random_state)
+    scale = np.sqrt(matrix.sum() / (num_docs * num_terms * num_topics)) if matrix.nnz else 1.0
+    doc_topic = scale * rng.random((num_docs, num_topics))
+    topic_term = scale * rng.random((num_topics, num_terms))
+
+    squared_norm = float(matrix.multiply(matrix).sum())
+    matrix_t = matrix.T.tocsr()
+
+    log: Dict[str, List[Any]] = {"iteration": [], "wall_time": [], "reconstruction_error": [], "topic_diff": []}
+    previous_error = None
+    topics = topic_term / np.maximum(topic_term.sum(axis=1, keepdims=True), EPSILON)
+    for iteration in range(max_iterations):
+        start = time.perf_counter()
+
+        topic_term *= np.asarray(matrix_t @ doc_topic).T / (doc_topic.T @ doc_topic @ topic_term + EPSILON)
+        xh = np.asarray(matrix @ topic_term.T)
+        hh = topic_term @ topic_term.T
+        doc_topic *= xh / (doc_topic @ hh + EPSILON)
+
+        # ||X - WH||^2 = ||X||^2 - 2 tr(W^T X H^T) + tr(W^T W H H^T)
+        error_squared = squared_norm - 2 * np.einsum("ij,ij->", doc_topic, xh) + np.einsum("ij,ij->", doc_topic.T @ doc_topic, hh)
+        error = float(np.sqrt(max(error_squared, 0.0)))
+        wall_time = time.perf_counter() - start
+
+        previous_topics, topics = topics, topic_term / np.maximum(topic_term.sum(axis=1, keepdims=True), EPSILON)
+        topic_diff = float(np.sqrt(0.5 * ((np.sqrt(previous_topics) - np.sqrt(topics)) ** 2).sum(axis=1)).mean())
+
+        log["iteration"].append(iteration + 1)
+        log["wall_time"].append(wall_time)
+        log["reconstruction_error"].append(error)
+        log["topic_diff"].append(topic_diff)
+
+        if previous_error is not None and previous_error > 0 and (previous_error - error) / previous_error < tolerance:
+            break
+        previous_error = error
+
+    return doc_topic, topic_term, log
+
+
+def _format_topics(topic_term: "np.ndarray", id2word: Any, num_words: int) -> List[Tuple[int, str]]:
+    """Format the topics of a topic-term matrix like gensim's 'print_topics' (weights normalized per topic)."""
+
+    import numpy as np
+
+    topics = topic_term / np.maximum(topic_term.sum(axis=1, keepdims=True), EPSILON)
+    result = []
+    for topic_id, weights in enumerate(topics):
+        top = np.argsort(-weights, kind="stable")[:num_words]
+        result.append((topic_id, " + ".join(f'{weights[idx]:.3f}*"{id2word[int(idx)]}"' for idx in top)))
+    return result
+
+
+class RunNmf(KiaraModule):
+    """Non-negative matrix factorization (NMF) of a document-term matrix, as a faster alternative to LDA.
+
+    The document-term matrix is built from the token ids like in 'topic_modelling.lda' (with the same 'no_below' and
+    'no_above' filters), as a sparse CSR matrix. It is TF-IDF weighted by default, which usually works better for
+    short documents. Instead of a tokens array, an existing document-term matrix can be used (see
+    'topic_modelling.doc_term_matrix'), its TF-IDF weights are used if it has them. The factorization uses vectorized
+    (NumPy/SciPy) multiplicative updates, so the matrix is never densified, and stops early once the reconstruction
+    error converges.
+
+    The 'vocabulary', 'most_common_words' and 'topics' outputs have the same format as the ones of
+    'topic_modelling.lda'. The topic weights of every document are a by-product of the factorization, and are
+    returned as the 'document_topics' table (in the wide format of 'topic_modelling.document_topics').
+
+    Other outputs differ from the ones of 'topic_modelling.lda', so it can't be swapped in for it everywhere:
+    - there is no 'model' output: NMF doesn't produce an 'lda_model' value, so it can't be used with
+      'topic_modelling.document_topics', 'topic_modelling.lda_update' or other modules that take a model
+    - the 'training_log' table has one row per iteration (not per pass), with the columns 'iteration', 'wall_time',
+      'reconstruction_error' (the Frobenius norm of the residual, instead of the perplexity) and 'topic_diff'
+    """
+
+    _module_type_name = "topic_modelling.nmf"
+
+    def create_inputs_schema(self):
+        return {
+            "tokens_array": {
+                "type": "array",
+                "doc": "Array that contains the tokens to process.",
+                "optional": True
+            },
+            "doc_term_matrix": {
+                "type": "doc_term_matrix",
+                "doc": "A document-term matrix (see 'topic_modelling.doc_term_matrix') to use instead of the tokens array, the filters are ignored then.",
+                "optional": True
+            },
+            "no_below": {
+                "type": "integer",
+                "doc": "Remove tokens that appear in less than no_below documents.",
+                "optional": True
+            },
+            "no_above": {
+                "type": "float",
+                "doc": "Remove tokens that appear in more than this fraction of the documents (e.g. 0.5).",
+                "optional": True
+            },
+            "num_topics": {
+                "type": "integer",
+                "doc": "Number of topics to process.",
+                "optional": False,
+            },
+            "tfidf": {
+                "type": "boolean",
+                "doc": "Whether to weight the document-term matrix by TF-IDF (instead of using the raw counts).",
+                "optional": True,
+                "default": True
+            },
+            "iterations": {
+                "type": "integer",
+                "doc": f"Maximum number of iterations (default: {DEFAULT_MAX_ITERATIONS}).",
+                "optional": True
+            },
+            "convergence_threshold": {
+                "type": "float",
+                "doc": f"Stop once an iteration improves the reconstruction error by less than this fraction (default: {DEFAULT_TOLERANCE}).",
+                "optional": True
+            },
+            "random_state": {
+                "type": "integer",
+                "doc": "Random state.",
+                "optional": True,
+                "default": False
+            },
+        }
+
+    def create_outputs_schema(self):
+        return {
+            "vocabulary": {
+                "type": "table",
+                "doc": "The vocabulary of the model, with the columns 'id', 'token', 'document_frequency' and 'term_frequency'."
+            },
+            "most_common_words": {
+                "type": "list",
+                "doc": "The 15 most common words overall."
+            },
+            "topics": {
+                "type": "list",
+                "doc": "The topics generated by NMF."
+            },
+            "document_topics": {
+                "type": "table",
+                "doc": "The (normalized) topic weights of every document, with the columns 'document_id' and 'topic_<n>'."
+            },
+            "training_log": {
+                "type": "table",
+                "doc": "One row per iteration, with the columns 'iteration', 'wall_time' (in seconds), 'reconstruction_error' and 'topic_diff' (mean Hellinger distance of the topics to the ones before the iteration)."
+            }
+        }
+
+    def process(self, inputs, outputs):
+
+        import numpy as np
+        import pyarrow as pa  # type: ignore
+        from scipy import sparse  # type: ignore
+
+        from kiara_plugin.topic_modelling.utils import (
+            build_dictionary,
+            create_gensim_dictionary,
+            csr_from_token_ids,
+            tfidf_weights,
+        )
+
+        tokens_array_value = inputs.get_value_obj("tokens_array")
+        doc_term_matrix_value = inputs.get_value_obj("doc_term_matrix")
+        if tokens_array_value.is_set == doc_term_matrix_value.is_set:
+            raise KiaraProcessingException("Either a tokens array or a document-term matrix must be provided (but not both).")
+
+        no_below = inputs.get_value_data("no_below")
+        no_above = inputs.get_value_data("no_above")
+        num_topics = inputs.get_value_data("num_topics")
+        tfidf = inputs.get_value_data("tfidf")
+        random_state = inputs.get_value_data("random_state")
+
+        max_iterations = inputs.get_value_data("iterations")
+        if max_iterations is None:
+            max_iterations = DEFAULT_MAX_ITERATIONS
+        tolerance = inputs.get_value_data("convergence_threshold")
+        if tolerance is None:
+            tolerance = DEFAULT_TOLERANCE
+
+        if not num_topics or num_topics < 1:
+            raise KiaraProcessingException(f"Invalid number of topics '{num_topics}', must be at least 1.")
+        if max_iterations < 1:
+            raise KiaraProcessingException(f"Invalid number of iterations '{max_iterations}', must be at least 1.")
+
+        if doc_term_matrix_value.is_set:
+            doc_term_matrix = doc_term_matrix_value.data
+            vocabulary_table = doc_term_matrix.vocabulary
+            num_docs = doc_term_matrix.num_documents
+            id2word = create_gensim_dictionary(vocabulary_table, num_docs=num_docs)
+            if tfidf and doc_term_matrix.weighting != "tfidf":
+                weights = tfidf_weights(doc_term_matrix.indptr, doc_term_matrix.indices, doc_term_matrix.counts, num_terms=len(id2word))
+                matrix = sparse.csr_matrix((weights, doc_term_matrix.indices, doc_term_matrix.indptr), shape=(num_docs, len(id2word)))
+            else:
+                matrix = doc_term_matrix.to_scipy(weighted=tfidf)
+        else:
+            try:
+                tokens_array_pa, (doc_index, token_ids, counts), vocabulary_table, id_map, id2word = build_dictionary(
+                    tokens_array_value.data.arrow_array, no_below=no_below, no_above=no_above
+                )
+                num_docs = len(tokens_array_pa)
+            except Exception as e:
+                raise KiaraProcessingException(
+                    f"Failed to create dictionary: {e}"
+                )
+
+            indptr, ids, counts = csr_from_token_ids(id_map, doc_index, token_ids, counts, num_docs=num_docs)
+            if tfidf:
+                weights = tfidf_weights(indptr, ids, counts, num_terms=len(id2word))
+            else:
+                weights = counts.astype(np.float64)
+            matrix = sparse.csr_matrix((weights, ids, indptr), shape=(num_docs, len(id2word)))
+
+        try:
+            doc_topic, topic_term, training_log = _factorize(
+                matrix, num_topics=num_topics, max_iterations=max_iterations, tolerance=tolerance, random_state=random_state
+            )
+        except Exception as e:
+            raise KiaraProcessingException(
+                f"Failed to run NMF: {e}"
+            )
+
+        doc_topic = doc_topic / np.maximum(doc_topic.sum(axis=1, keepdims=True), EPSILON)
+        document_topics = {"document_id": pa.array(np.arange(num_docs), type=pa.int64())}
+        for topic_id in range(num_topics):
+            document_topics[f"topic_{topic_id}"] = pa.array(doc_topic[:, topic_id].astype(np.float32))
+
+        outputs.set_value("vocabulary", vocabulary_table)
+        outputs.set_value("most_common_words", id2word.most_common(15))
+        outputs.set_value("topics", _format_topics(topic_term, id2word, num_words=30))
+        outputs.set_value("document_topics", pa.table(document_topics))
+        outputs.set_value("training_log", pa.table({
+            "iteration": pa.array(training_log["iteration"], type=pa.int32()),
+            "wall_time": pa.array(training_log["wall_time"], type=pa.float64()),
+            "reconstruction_error": pa.array(training_log["reconstruction_error"], type=pa.float64()),
+            "topic_diff": pa.array(training_log["topic_diff"], type=pa.float64()),
+        }))
@@ -1,7 +1,114 @@
 # -*- coding: utf-8 -*-
+from typing import TYPE_CHECKING, Deque, Iterable, Iterator, List, Union
+
 from kiara.api import KiaraModule
 from kiara.exceptions import KiaraProcessingException
 
+# below this number of documents, tokenization always runs in the current process,
+# since starting a process pool costs more than it saves
+PARALLEL_MIN_DOCUMENTS = 1000
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+
+def _tokenize_text(text: str, tokenize_by_character: bool = False) -> Union[List[str], None]:
+    from kiara_plugin.topic_modelling.nltk_resources import get_word_tokenizer
+
+    if not tokenize_by_character:
+        try:
+            return get_word_tokenizer()(str(text))
+        except Exception:
+            return None
+    else:
+        # same as nltk's 'CharTokenizer.tokenize', which can't be instantiated in the nltk version we depend on
+        return list(text)
+
+
+def _tokenize_texts(texts: List[str], tokenize_by_character: bool = False) -> List[Union[List[str], None]]:
+    """Tokenize a chunk of documents, this is the unit of work of a worker process."""
+
+    return [_tokenize_text(str(x), tokenize_by_character=tokenize_by_character) for x in texts]
+
+
+def _iter_tokenized_chunks(chunks: Iterable["pa.Array"], num_workers: int = 1, tokenize_by_character: bool = False) -> Iterator[List[Union[List[str], None]]]:
+    """Tokenize chunks of an Arrow array of documents, and yield the results in the order of the chunks.
+
+    If 'num_workers' is larger than 1, chunks are tokenized in a process pool. Only a bounded number of chunks is
+    submitted to the pool at any time, so memory use depends on the size of the chunks, not of the whole array.
+    """
+
+    from collections import deque
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+    if num_workers <= 1:
+        for chunk in chunks:
+            yield _tokenize_texts(chunk.to_pylist(), tokenize_by_character=tokenize_by_character)
+        return
+
+    pending: Deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for chunk in chunks:
+            pending.append(executor.submit(_tokenize_texts, chunk.to_pylist(), tokenize_by_character))
+            if len(pending) >= num_workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _iter_token_chunks(corpus_array_pa, tokenize_by_character: bool = False, engine: str = "nltk", num_workers: int = 1, chunk_size: Union[int, None] = None) -> Iterator["pa.Array"]:
+    """Tokenize an Arrow array of documents chunk by chunk, and yield the tokens of each chunk as a 'list<string>' array."""
+
+    import math
+
+    import pyarrow as pa  # type: ignore
+
+    from kiara_plugin.topic_modelling.utils import (
+        iter_chunks,
+        split_characters,
+        split_whitespace,
+    )
+
+    if engine == "arrow":
+        split = split_characters if tokenize_by_character else split_whitespace
+        for chunk in iter_chunks(corpus_array_pa, chunk_size=chunk_size):
+            yield split(chunk)
+        return
+
+    if len(corpus_array_pa) < PARALLEL_MIN_DOCUMENTS:
+        num_workers = 1
+    if chunk_size is None and num_workers > 1:
+        # a few chunks per worker, so a slow chunk doesn't leave the other workers idle
+        chunk_size = max(1, math.ceil(len(corpus_array_pa) / (num_workers * 4)))
+
+    tokenized_chunks = _iter_tokenized_chunks(
+        iter_chunks(corpus_array_pa, chunk_size=chunk_size), num_workers=num_workers, tokenize_by_character=tokenize_by_character
+    )
+    for tokenized_chunk in tokenized_chunks:
+        yield pa.array(tokenized_chunk, type=pa.list_(pa.string()))
+
+
+def _validate_chunking(num_workers: Union[int, None] = None, chunk_size: Union[int, None] = None):
+
+    if num_workers is not None and num_workers < 1:
+        raise KiaraProcessingException(
+            f"Invalid number of workers '{num_workers}', must be at least 1."
+        )
+    if chunk_size is not None and chunk_size < 1:
+        raise KiaraProcessingException(
+            f"Invalid chunk size '{chunk_size}', must be at least 1."
+        )
+
+
+def _with_string_values(data_type: "pa.DataType") -> "pa.DataType":
+    """Return the (nested) list type with the same structure as 'data_type', but with string values."""
+
+    import pyarrow as pa  # type: ignore
+
+    if pa.types.is_list(data_type) or pa.types.is_large_list(data_type):
+        return pa.list_(_with_string_values(data_type.value_type))
+    return pa.string()
+
 
 class TokenizeArray(KiaraModule):
     """
@@ -9,6 +116,23 @@ class TokenizeArray(KiaraModule):
     It returns a table containing the initial array or table, and the tokens as a new column.
     It is possible to tokenize by word or by character. If not specified, tokenization is done by word.
 
+    Two tokenization engines are available:
+    - 'nltk' (default): words are tokenized with NLTK's recommended word tokenizer.
+    - 'arrow': tokenization is done with Arrow compute kernels directly on the string buffers of the array, without
+      converting the documents to Python objects. Words are split on whitespace (punctuation is not separated from words),
+      characters are split on unicode code points. Null documents result in null token lists. This is much faster on large arrays.
+
+    With the 'nltk' engine, if 'num_workers' is larger than 1, the array is split into chunks that are tokenized in a pool of worker processes.
+    The result is the same as with a single process. Small arrays are always tokenized in the current process.
+
+    If 'chunk_size' is set, the array is processed in chunks of at most that many documents, and the result is assembled
+    as a chunked array. Only one chunk (or a few, when using worker processes) is converted to Python objects at any time,
+    so memory use depends on the chunk size, and not on the size of the corpus.
+
+    If 'encode_tokens' is set, the tokens are returned dictionary-encoded ('list<dictionary<int32, string>>'): each document
+    holds integer ids into one vocabulary that is shared by the whole array. The token modules of this plugin accept this
+    representation, and work on the vocabulary instead of on every single token.
+
     Dependencies:
     - NLTK: https://www.nltk.org/
     """
@@ -26,6 +150,30 @@ class TokenizeArray(KiaraModule):
                 "doc": "Tokenization",
                 "optional": True,
                 "default": False
+            },
+            "engine": {
+                "type": "string",
+                "type_config": {"allowed_strings": ["nltk", "arrow"]},
+                "doc": "The tokenization engine, either 'nltk' or 'arrow'. The 'arrow' engine tokenizes words by splitting on whitespace.",
+                "optional": True,
+                "default": "nltk"
+            },
+            "num_workers": {
+                "type": "integer",
+                "doc": "Number of worker processes used to tokenize the array. If set to 1, tokenization runs in the current process.",
+                "optional": True,
+                "default": 1
+            },
+            "chunk_size": {
+                "type": "integer",
+                "doc": "If set, process the array in chunks of at most this many documents, and return the tokens as a chunked array.",
+                "optional": True
+            },
+            "encode_tokens": {
+                "type": "boolean",
+                "doc": "Whether to return the tokens dictionary-encoded, with one vocabulary shared by all documents.",
+                "optional": True,
+                "default": False
             }
         }
 
@@ -39,54 +187,56 @@ class TokenizeArray(KiaraModule):
 
     def process(self, inputs, outputs):
 
-        import nltk  # type: ignore
         import pyarrow as pa  # type: ignore
-        from nltk.tokenize.simple import CharTokenizer  # type: ignore
 
-        nltk.download("punkt")
+        from kiara_plugin.topic_modelling.nltk_resources import ensure_nltk_resource
+        from kiara_plugin.topic_modelling.utils import encode_tokens
 
         corpus_array = inputs.get_value_data("corpus_array")
         corpus_array_pa = corpus_array.arrow_array
-        corpus_list = corpus_array_pa.to_pylist()
-
-        def tokenize(text: str, tokenize_by_character:bool = False):
-            if not tokenize_by_character:
-                try:
-                    return nltk.word_tokenize(str(text))
-                except Exception:
-                    return None
-            else:
-                try:
-                    tokenizer = CharTokenizer()
-                    return tokenizer.tokenize(text)
-                except Exception:
-                    return None
-
-        if not inputs.get_value_data("tokenize_by_character"):
-            try:
-                tokenized_list = [tokenize(str(x)) for x in corpus_list]
-                tokens_array = pa.array(tokenized_list)
-
-            except Exception as e:
-                raise KiaraProcessingException(
-                    f"An error occurred while tokenizing the corpus by word: {e}."
-                )
-        else:
-            try:
-                tokenized_list = [tokenize(str(x), tokenize_by_character=True) for x in corpus_list]
-                tokens_array = pa.array(tokenized_list)
-
-            except Exception as e:
-                raise KiaraProcessingException(
-                    f"An error occurred while tokenizing the corpus by character: {e}."
-                )
-        
+        tokenize_by_character = inputs.get_value_data("tokenize_by_character")
+        engine = inputs.get_value_data("engine")
+        num_workers = inputs.get_value_data("num_workers")
+        chunk_size = inputs.get_value_data("chunk_size")
+        do_encode = inputs.get_value_data("encode_tokens")
+
+        _validate_chunking(num_workers=num_workers, chunk_size=chunk_size)
+        if engine == "nltk" and not tokenize_by_character:
+            ensure_nltk_resource("punkt")
+
+        mode = "character" if tokenize_by_character else "word"
+        tokens_type = pa.list_(pa.string())
+
+        try:
+            token_chunks = _iter_token_chunks(
+                corpus_array_pa, tokenize_by_character=tokenize_by_character, engine=engine, num_workers=num_workers, chunk_size=chunk_size
+            )
+            tokens_array = pa.chunked_array(token_chunks, type=tokens_type)
+
+        except Exception as e:
+            raise KiaraProcessingException(
+                f"An error occurred while tokenizing the corpus by {mode}: {e}."
+            )
+
+        if do_encode:
+            tokens_array = encode_tokens(tokens_array)
         outputs.set_value("tokens_array", tokens_array)
 
+
 class PreprocessTokens(KiaraModule):
     """
     This module offers pre-processing options for an array of tokens.
 
+    All options are applied with Arrow compute kernels on the flattened tokens of the array, the documents are then
+    rebuilt from the tokens that are kept. Tokens are not converted to Python objects. Arrow lowercases character by
+    character, so the result differs from Python's 'str.lower' for characters with special casing rules (U+0130,
+    capital I with dot above, becomes 'i', and a final U+03A3, capital sigma, becomes U+03C3, small sigma).
+
+    Dictionary-encoded token arrays (see 'topic_modelling.tokenize_array') are processed on their vocabulary, and the
+    result is dictionary-encoded again.
+
+    If 'chunk_size' is set, the array is processed in chunks of at most that many documents, so memory use for
+    intermediate results depends on the chunk size, and not on the size of the corpus.
     """
 
     _module_type_name = "topic_modelling.preprocess_tokens"
@@ -114,6 +264,11 @@ class PreprocessTokens(KiaraModule):
                 "doc": "Whether to remove tokens that contain less than min_length characters.",
                 "optional": True,
                 "default": False
+            },
+            "chunk_size": {
+                "type": "integer",
+                "doc": "If set, process the array in chunks of at most this many documents, and return the tokens as a chunked array.",
+                "optional": True
             }
         }
 
@@ -126,41 +281,286 @@ class PreprocessTokens(KiaraModule):
         }
 
     def process(self, inputs, outputs):
-        import polars as pl # type: ignore
-        import pyarrow as pa # type: ignore
+        import pyarrow as pa  # type: ignore
+        import pyarrow.compute as pc  # type: ignore
+
+        from kiara_plugin.topic_modelling.utils import (
+            get_vocabulary,
+            is_dictionary_encoded,
+            map_chunks,
+            preprocess_token_values,
+            preprocess_tokens,
+            remap_vocabulary,
+        )
 
         tokens_array = inputs.get_value_data("tokens_array")
         tokens_array_pa = tokens_array.arrow_array
-        
-        tokens_list = tokens_array_pa.to_pylist()
+
+        chunk_size = inputs.get_value_data("chunk_size")
+        _validate_chunking(chunk_size=chunk_size)
 
         do_lowercase = inputs.get_value_data("lowercase")
         do_isalpha = inputs.get_value_data("isalpha")
         min_length = inputs.get_value_data("min_length")
 
-        def preprocess_token(token):
-            if not isinstance(token, str):
-                token = str(token)
-            
-            if do_lowercase:
-                token = token.lower()
-            
-            if do_isalpha and not token.isalpha():
-                return None
-            
-            if min_length and len(token) < min_length:
-                return None
-            
-            return token
-
-        def process_nested(item):
-            if isinstance(item, list):
-                return [y for y in (process_nested(subitem) for subitem in item) if y is not None]
+        try:
+            if is_dictionary_encoded(tokens_array_pa.type):
+                # every distinct token is processed once, documents only need their ids remapped
+                values, keep = preprocess_token_values(
+                    get_vocabulary(tokens_array_pa), lowercase=do_lowercase, isalpha=do_isalpha, min_length=min_length
+                )
+                new_tokens = values if keep is None else pc.if_else(keep, values, pa.scalar(None, pa.string()))
+                processed_array = remap_vocabulary(tokens_array_pa, new_tokens)
             else:
-                return preprocess_token(item)
+                processed_array = map_chunks(
+                    tokens_array_pa,
+                    lambda chunk: preprocess_tokens(chunk, lowercase=do_lowercase, isalpha=do_isalpha, min_length=min_length),
+                    result_type=_with_string_values(tokens_array_pa.type),
+                    chunk_size=chunk_size,
+                )
+        except Exception as e:
+            raise KiaraProcessingException(f"An error occurred while pre-processing the tokens: {e}")
+
+        outputs.set_value("tokens_array", processed_array)
+
+
+class CleanTokens(KiaraModule):
+    """
+    This module tokenizes an array of texts, pre-processes the tokens and removes stop words, in a single pass.
+
+    It produces the same tokens as running 'topic_modelling.tokenize_array', 'topic_modelling.preprocess_tokens' and
+    'topic_modelling.remove_stopwords' one after the other, and takes the options of all three modules. Each chunk of
+    documents is tokenized, then lowercasing, filtering and stop word removal are applied to its tokens with one combined
+    mask, so no intermediate token arrays are created or stored. Like in 'topic_modelling.preprocess_tokens',
+    lowercasing is done by Arrow, not by Python's 'str.lower'.
+
+    Dependencies:
+    - NLTK: https://www.nltk.org/
+    """
+
+    _module_type_name = "topic_modelling.clean_tokens"
+
+    def create_inputs_schema(self):
+        return {
+            "corpus_array": {
+                "type": "array",
+                "doc": "Array that contains the text to tokenize.",
+            },
+            "tokenize_by_character": {
+                "type": "boolean",
+                "doc": "Whether to tokenize by character instead of by word.",
+                "optional": True,
+                "default": False
+            },
+            "engine": {
+                "type": "string",
+                "type_config": {"allowed_strings": ["nltk", "arrow"]},
+                "doc": "The tokenization engine, either 'nltk' or 'arrow'. The 'arrow' engine tokenizes words by splitting on whitespace.",
+                "optional": True,
+                "default": "nltk"
+            },
+            "lowercase": {
+                "type": "boolean",
+                "doc": "Whether to lowercase the tokens.",
+                "optional": True,
+                "default": False
+            },
+            "isalpha": {
+                "type": "boolean",
+                "doc": "Whether to remove tokens that contain other characters than letters.",
+                "optional": True,
+                "default": False
+            },
+            "min_length": {
+                "type": "integer",
+                "doc": "Whether to remove tokens that contain less than min_length characters.",
+                "optional": True,
+                "default": False
+            },
+            "stopwords_list": {
+                "type": "list",
+                "doc": "A list of stop words to be removed from the tokens.",
+                "optional": True
+            },
+            "stopwords_set": {
+                "type": "table",
+                "doc": "A stopword set, as created by 'topic_modelling.stopwords_list'. Used instead of 'stopwords_list' if provided.",
+                "optional": True
+            },
+            "ignore_case": {
+                "type": "boolean",
+                "doc": "Whether to match stop words case-insensitively.",
+                "optional": True,
+                "default": False
+            },
+            "num_workers": {
+                "type": "integer",
+                "doc": "Number of worker processes used to tokenize the array with the 'nltk' engine. If set to 1, tokenization runs in the current process.",
+                "optional": True,
+                "default": 1
+            },
+            "chunk_size": {
+                "type": "integer",
+                "doc": "If set, process the array in chunks of at most this many documents.",
+                "optional": True
+            },
+            "encode_tokens": {
+                "type": "boolean",
+                "doc": "Whether to return the tokens dictionary-encoded, with one vocabulary shared by all documents.",
+                "optional": True,
+                "default": False
+            }
+        }
+
+    def create_outputs_schema(self):
+        return {
+            "tokens_array": {
+                "type": "array",
+                "doc": "The array that contains the cleaned tokens."
+            }
+        }
+
+    def process(self, inputs, outputs):
+
+        import pyarrow as pa  # type: ignore
+        import pyarrow.compute as pc  # type: ignore
+
+        from kiara_plugin.topic_modelling.nltk_resources import ensure_nltk_resource
+        from kiara_plugin.topic_modelling.utils import (
+            build_stopwords_set,
+            encode_tokens,
+            filter_list_values,
+            get_stopwords_values,
+            preprocess_token_values,
+            stopwords_keep_mask,
+        )
+
+        corpus_array_pa = inputs.get_value_data("corpus_array").arrow_array
+        tokenize_by_character = inputs.get_value_data("tokenize_by_character")
+        engine = inputs.get_value_data("engine")
+        num_workers = inputs.get_value_data("num_workers")
+        chunk_size = inputs.get_value_data("chunk_size")
+
+        do_lowercase = inputs.get_value_data("lowercase")
+        do_isalpha = inputs.get_value_data("isalpha")
+        min_length = inputs.get_value_data("min_length")
+        sw_list = inputs.get_value_data("stopwords_list")
+        sw_set_value = inputs.get_value_obj("stopwords_set")
+        ignore_case = inputs.get_value_data("ignore_case")
+
+        _validate_chunking(num_workers=num_workers, chunk_size=chunk_size)
+        if engine == "nltk" and not tokenize_by_character:
+            ensure_nltk_resource("punkt")
+
+        stopwords = lower_stopwords = None
+        if sw_set_value.is_set:
+            stopwords, lower_stopwords = get_stopwords_values(sw_set_value.data.arrow_table)
+        elif sw_list:
+            stopwords, lower_stopwords = get_stopwords_values(build_stopwords_set(sw_list))
+
+        def clean(token_chunk: "pa.Array") -> "pa.Array":
+
+            values, keep = preprocess_token_values(
+                token_chunk.flatten(), lowercase=do_lowercase, isalpha=do_isalpha, min_length=min_length
+            )
+            if stopwords is not None:
+                not_stopword = stopwords_keep_mask(values, stopwords, ignore_case=ignore_case, lower_stopwords=lower_stopwords)
+                keep = not_stopword if keep is None else pc.and_(keep, not_stopword)
+            if keep is None:
+                keep = pc.is_valid(values)
+            return filter_list_values(token_chunk, keep, values=values)
+
+        try:
+            token_chunks = _iter_token_chunks(
+                corpus_array_pa, tokenize_by_character=tokenize_by_character, engine=engine, num_workers=num_workers, chunk_size=chunk_size
+            )
+            tokens_array = pa.chunked_array((clean(chunk) for chunk in token_chunks), type=pa.list_(pa.string()))
+        except Exception as e:
+            raise KiaraProcessingException(f"An error occurred while cleaning the tokens: {e}")
+
+        if inputs.get_value_data("encode_tokens"):
+            tokens_array = encode_tokens(tokens_array)
+        outputs.set_value("tokens_array", tokens_array)
+
+
+class NormalizeTokens(KiaraModule):
+    """
+    This module stems or lemmatizes an array of tokens.
+
+    Available methods are the NLTK 'porter', 'lancaster' and 'snowball' stemmers, and the NLTK 'wordnet' lemmatizer.
+    Only the snowball stemmer supports other languages than English, other methods fail for any other language.
+
+    The normalizer only runs once for every distinct token: the tokens are dictionary-encoded, the vocabulary is
+    normalized, and the result is mapped back to all tokens with a single 'take'. Recently normalized tokens are also
+    cached (up to a fixed number) per method and language, so later runs mostly only normalize tokens they haven't seen.
+    Dictionary-encoded token arrays are normalized on their vocabulary, and the result is dictionary-encoded again.
+
+    Dependencies:
+    - NLTK: https://www.nltk.org/
+    """
+
+    _module_type_name = "topic_modelling.normalize_tokens"
+
+    def create_inputs_schema(self):
+        return {
+            "tokens_array": {
+                "type": "array",
+                "doc": "Array that contains the tokens to normalize.",
+            },
+            "method": {
+                "type": "string",
+                "type_config": {"allowed_strings": ["porter", "lancaster", "snowball", "wordnet"]},
+                "doc": "The normalization method: 'porter', 'lancaster' or 'snowball' stemming, or 'wordnet' lemmatization.",
+                "optional": True,
+                "default": "snowball"
+            },
+            "language": {
+                "type": "string",
+                "doc": "The language of the tokens, e.g. 'english' or 'italian'. Only supported by the 'snowball' method.",
+                "optional": True,
+                "default": "english"
+            }
+        }
+
+    def create_outputs_schema(self):
+        return {
+            "tokens_array": {
+                "type": "array",
+                "doc": "The array that contains the normalized tokens."
+            }
+        }
+
+    def process(self, inputs, outputs):
+
+        import pyarrow as pa  # type: ignore
+
+        from kiara_plugin.topic_modelling.nltk_resources import (
+            get_normalizer,
+            normalize_tokens,
+        )
+        from kiara_plugin.topic_modelling.utils import (
+            decode_tokens,
+            encode_tokens,
+            get_vocabulary,
+            is_dictionary_encoded,
+            remap_vocabulary,
+        )
+
+        tokens_array_pa = inputs.get_value_data("tokens_array").arrow_array
+        method = inputs.get_value_data("method")
+        language = inputs.get_value_data("language")
 
+        # fail early on unsupported settings or missing resources
+        get_normalizer(method, language)
 
-        processed_tokens = process_nested(tokens_list)
-        processed_array = pa.array(processed_tokens)
+        try:
+            encoded_array = encode_tokens(tokens_array_pa)
+            vocabulary = get_vocabulary(encoded_array)
+            new_tokens = pa.array(normalize_tokens(vocabulary.to_pylist(), method, language), type=pa.string())
+            normalized_array = remap_vocabulary(encoded_array, new_tokens)
+            if not is_dictionary_encoded(tokens_array_pa.type):
+                normalized_array = decode_tokens(normalized_array)
+        except Exception as e:
+            raise KiaraProcessingException(f"An error occurred while normalizing the tokens: {e}")
 
-        outputs.set_value("tokens_array", processed_array)
\ No newline at end of file
+        outputs.set_value("tokens_array", normalized_array)
@@ -1,13 +1,19 @@
 # -*- coding: utf-8 -*-
+from typing import List
+
 from kiara.api import KiaraModule
 from kiara.exceptions import KiaraProcessingException
-from typing import List, Optional
 
 
 class CreateSwList(KiaraModule):
     """
     This module creates a stop words list and enables to combine predefined stop words lists from nltk and/or a custom additional stop words list.
 
+    Besides the list, the module outputs a stopword set: a table with the distinct, sorted stop words ('word'), and
+    their lowercased variants ('lower'). It can be passed to 'topic_modelling.remove_stopwords'
+    as is, so the lookup values don't have to be prepared again. Stopword sets are cached per combination of languages
+    and custom stop words for the lifetime of the process.
+
     Dependencies:
     - NLTK: https://www.nltk.org/
     """
@@ -25,8 +31,7 @@ class CreateSwList(KiaraModule):
             "stopwords_list": {
                 "type": "list",
                 "doc": "A python list of stopwords.",
-                "optional": True,
-                "default": False
+                "optional": True
             }
         }
 
@@ -35,16 +40,20 @@ class CreateSwList(KiaraModule):
             "stopwords_list": {
                 "type": "list",
                 "doc": "The combined stop words list."
+            },
+            "stopwords_set": {
+                "type": "table",
+                "doc": "The combined stop words, as a table with the columns 'word' and 'lower'."
             }
         }
 
     def process(self, inputs, outputs):
 
-        import nltk  # type: ignore
-        from nltk.corpus import stopwords  # type: ignore
-        nltk.download('stopwords', quiet=True)
+        from kiara_plugin.topic_modelling.nltk_resources import (
+            get_stopwords,
+            get_stopwords_set,
+        )
 
-        nltk_languages = set(stopwords.fileids())
         languages: List[str] = inputs.get_value_data("languages")
         custom_stopwords: List[str] = inputs.get_value_data("stopwords_list")
 
@@ -54,23 +63,37 @@ class CreateSwList(KiaraModule):
         sw_list: List[str] = []
 
         for lang in languages:
-            if lang not in nltk_languages:
-                raise KiaraProcessingException(f"Language '{lang}' not supported by NLTK.")
-            try:
-                sw_list.extend(stopwords.words(lang))
-            except LookupError as e:
-                raise KiaraProcessingException(f"Failed to create stopwords list for language '{lang}': {e}")
-
-        sw_list.extend(custom_stopwords)
+            sw_list.extend(get_stopwords(lang))
+
+        if custom_stopwords:
+            sw_list.extend(custom_stopwords)
         sw_list = list(dict.fromkeys(sw_list))
+
+        sw_set = get_stopwords_set(tuple(languages), tuple(str(word) for word in custom_stopwords or ()))
+
         outputs.set_value("stopwords_list", sw_list)
+        outputs.set_value("stopwords_set", sw_set)
 
 
 class RemoveSw(KiaraModule):
     """
     
     This module removes stop words from an array of tokens.
-    
+
+    Stop words are masked with an Arrow lookup ('is_in') on the flattened tokens of the array, against a value set that
+    is built once, the documents are then rebuilt from the tokens that are kept. Tokens are not converted to Python objects.
+    The result is a 'list<string>' array, also for 'large_list' or 'large_string' input.
+    If 'ignore_case' is set, stop words are matched case-insensitively, by lowercasing the distinct tokens only (with
+    Arrow's 'utf8_lower', which differs from Python's 'str.lower' for a few characters, like U+0130).
+
+    Stop words can be provided as a list, or as a stopword set (see 'topic_modelling.stopwords_list'), in which case
+    its columns are used as lookup value sets directly.
+
+    If 'chunk_size' is set, the array is processed in chunks of at most that many documents, so memory use for
+    intermediate results depends on the chunk size, and not on the size of the corpus.
+
+    Dictionary-encoded token arrays (see 'topic_modelling.tokenize_array') are filtered on their vocabulary, and the
+    result is dictionary-encoded again.
     """
 
     _module_type_name = "topic_modelling.remove_stopwords"
@@ -80,12 +103,28 @@ class RemoveSw(KiaraModule):
             "stopwords_list": {
                 "type": "list",
                 "doc": "A list of stop words to be removed from the tokens.",
-                "optional": False
+                "optional": True
+            },
+            "stopwords_set": {
+                "type": "table",
+                "doc": "A stopword set, as created by 'topic_modelling.stopwords_list'. Used instead of 'stopwords_list' if provided.",
+                "optional": True
             },
             "tokens_array": {
                 "type": "array",
                 "doc": "An array of tokens.",
                 "optional": False,
+            },
+            "ignore_case": {
+                "type": "boolean",
+                "doc": "Whether to match stop words case-insensitively.",
+                "optional": True,
+                "default": False
+            },
+            "chunk_size": {
+                "type": "integer",
+                "doc": "If set, process the array in chunks of at most this many documents, and return the tokens as a chunked array.",
+                "optional": True
             }
         }
 
@@ -98,21 +137,60 @@ class RemoveSw(KiaraModule):
         }
 
     def process(self, inputs, outputs):
-        import pyarrow as pa # type: ignore
-        from pyarrow import compute as pc # type: ignore
-        
+        import pyarrow as pa  # type: ignore
+        import pyarrow.compute as pc  # type: ignore
+
+        from kiara_plugin.topic_modelling.utils import (
+            build_stopwords_set,
+            filter_list_values,
+            get_stopwords_values,
+            get_vocabulary,
+            is_dictionary_encoded,
+            map_chunks,
+            remap_vocabulary,
+            stopwords_keep_mask,
+        )
+
         tokens_array = inputs.get_value_data("tokens_array")
         sw_list = inputs.get_value_data("stopwords_list")
-        
-        stopwords_set = set(sw_list)
+        sw_set_value = inputs.get_value_obj("stopwords_set")
+        ignore_case = inputs.get_value_data("ignore_case")
+
+        chunk_size = inputs.get_value_data("chunk_size")
+        if chunk_size is not None and chunk_size < 1:
+            raise KiaraProcessingException(
+                f"Invalid chunk size '{chunk_size}', must be at least 1."
+            )
+
+        if not sw_set_value.is_set and sw_list is None:
+            raise KiaraProcessingException("Either a stop words list or a stopword set must be provided.")
+
         tokens_array_pa = tokens_array.arrow_array
-        
-        def remove_stopwords(words, stopwords_set):
-            return [word for word in words if word not in stopwords_set]
 
         try:
-            tokens_nostop = pa.array([remove_stopwords(words, stopwords_set) for words in tokens_array_pa.to_pylist()])
+            # the value sets for the lookups, built once for the whole array
+            if sw_set_value.is_set:
+                sw_set = sw_set_value.data.arrow_table
+            else:
+                sw_set = build_stopwords_set(sw_list)
+            stopwords, lower_stopwords = get_stopwords_values(sw_set)
+
+            if is_dictionary_encoded(tokens_array_pa.type):
+                vocabulary = get_vocabulary(tokens_array_pa)
+                keep = stopwords_keep_mask(vocabulary, stopwords, ignore_case=ignore_case, lower_stopwords=lower_stopwords)
+                new_tokens = pc.if_else(keep, vocabulary, pa.scalar(None, pa.string()))
+                tokens_nostop = remap_vocabulary(tokens_array_pa, new_tokens)
+            else:
+                def remove_stopwords(chunk: "pa.Array") -> "pa.Array":
+                    # large (and non-string) tokens are cast, so all chunks of the result are 'list<string>'
+                    values = pc.cast(chunk.flatten(), pa.string())
+                    keep = stopwords_keep_mask(values, stopwords, ignore_case=ignore_case, lower_stopwords=lower_stopwords)
+                    return filter_list_values(chunk, keep, values=values)
+
+                tokens_nostop = map_chunks(
+                    tokens_array_pa, remove_stopwords, result_type=pa.list_(pa.string()), chunk_size=chunk_size
+                )
         except Exception as e:
             raise KiaraProcessingException(f"An error occurred while removing stop words: {e}")
 
-        outputs.set_value("tokens_array", tokens_nostop)
\ No newline at end of file
+        outputs.set_value("tokens_array", tokens_nostop)
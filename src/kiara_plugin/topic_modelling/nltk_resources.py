@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+"""Process-wide access to the NLTK data (tokenizer models, stopword corpora, ...) used by the modules of this plugin.
+
+Resources are looked up on disk once per process, and the loaded objects are kept in memory, so running a module
+many times doesn't cost a lookup (or a download attempt) every time. The network is only used if a resource can't
+be found on disk, and only if downloads are not disabled via the 'KIARA_TOPIC_MODELLING_NLTK_DOWNLOAD' environment
+variable (set it to 'false' for offline workers).
+"""
+
+import os
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, FrozenSet, Iterable, List, Tuple
+
+from kiara.exceptions import KiaraProcessingException
+
+if TYPE_CHECKING:
+    import pyarrow as pa  # type: ignore
+    from nltk.tokenize.punkt import PunktSentenceTokenizer  # type: ignore
+
+NLTK_DOWNLOAD_ENV_VAR = "KIARA_TOPIC_MODELLING_NLTK_DOWNLOAD"
+
+# resource (package) name -> path of the resource within the nltk data directories
+NLTK_RESOURCES: Dict[str, str] = {
+    "punkt": "tokenizers/punkt",
+    "stopwords": "corpora/stopwords",
+    "wordnet": "corpora/wordnet",
+}
+
+NORMALIZATION_METHODS = ["porter", "lancaster", "snowball", "wordnet"]
+
+# maximum number of normalized tokens that are cached per method and language
+NORMALIZATION_CACHE_SIZE = 2**18
+
+_found_resources: Dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def nltk_downloads_enabled() -> bool:
+    """Return whether missing NLTK resources may be downloaded."""
+
+    value = os.environ.get(NLTK_DOWNLOAD_ENV_VAR, "true")
+    return value.strip().lower() not in ("false", "0", "no", "off")
+
+
+def _find_on_disk(resource_path: str) -> str:
+
+    import nltk  # type: ignore
+
+    try:
+        return str(nltk.data.find(resource_path))
+    except LookupError:
+        return str(nltk.data.find(f"{resource_path}.zip"))
+
+
+def ensure_nltk_resource(name: str) -> str:
+    """Make sure an NLTK resource is available, and return its location.
+
+    The result is cached for the lifetime of the process. If the resource is not on disk, and downloads are enabled, a
+    download is attempted (once). If the resource is still missing, a 'KiaraProcessingException' is raised.
+    """
+
+    if name in _found_resources:
+        return _found_resources[name]
+
+    if name not in NLTK_RESOURCES:
+        raise KiaraProcessingException(f"Unknown NLTK resource '{name}', available: {', '.join(NLTK_RESOURCES.keys())}")
+
+    import nltk  # type: ignore
+
+    resource_path = NLTK_RESOURCES[name]
+
+    with _lock:
+        if name in _found_resources:
+            return _found_resources[name]
+
+        try:
+            location = _find_on_disk(resource_path)
+        except LookupError:
+            location = None
+
+        if location is None and nltk_downloads_enabled():
+            nltk.download(name, quiet=True)
+            try:
+                location = _find_on_disk(resource_path)
+            except LookupError:
+                location = None
+
+        if location is None:
+            if nltk_downloads_enabled():
+                reason = "it could not be found on disk, and downloading it failed"
+            else:
+                reason = f"it could not be found on disk, and downloads are disabled (environment variable '{NLTK_DOWNLOAD_ENV_VAR}')"
+            raise KiaraProcessingException(
+                f"NLTK resource '{name}' is not available: {reason}. Install it with 'python -m nltk.downloader {name}', or set the 'NLTK_DATA' environment variable to a directory that contains it. Searched in: {', '.join(nltk.data.path)}"
+            )
+
+        _found_resources[name] = location
+        return location
+
+
+@lru_cache(maxsize=None)
+def get_sentence_tokenizer(language: str = "english") -> "PunktSentenceTokenizer":
+    """Return the (cached) Punkt sentence tokenizer for a language."""
+
+    import nltk  # type: ignore
+
+    ensure_nltk_resource("punkt")
+    try:
+        return nltk.data.load(f"tokenizers/punkt/{language}.pickle")
+    except LookupError:
+        raise KiaraProcessingException(f"No NLTK Punkt sentence tokenizer available for language '{language}'.")
+
+
+@lru_cache(maxsize=None)
+def get_word_tokenizer(language: str = "english") -> Callable[[str], List[str]]:
+    """Return a (cached) function that tokenizes a text like 'nltk.word_tokenize', without looking up the model on every call."""
+
+    from nltk.tokenize import NLTKWordTokenizer  # type: ignore
+
+    sentence_tokenizer = get_sentence_tokenizer(language)
+    word_tokenizer = NLTKWordTokenizer()
+
+    def word_tokenize(text: str) -> List[str]:
+        return [
+            token
+            for sentence in sentence_tokenizer.tokenize(text)
+            for token in word_tokenizer.tokenize(sentence)
+        ]
+
+    return word_tokenize
+
+
+@lru_cache(maxsize=None)
+def get_stopwords_languages() -> FrozenSet[str]:
+    """Return the languages for which NLTK provides stopword lists."""
+
+    from nltk.corpus import stopwords  # type: ignore
+
+    ensure_nltk_resource("stopwords")
+    return frozenset(stopwords.fileids())
+
+
+@lru_cache(maxsize=None)
+def get_stopwords(language: str) -> Tuple[str, ...]:
+    """Return the (cached) NLTK stopwords for a language."""
+
+    from nltk.corpus import stopwords  # type: ignore
+
+    if language not in get_stopwords_languages():
+        raise KiaraProcessingException(f"Language '{language}' not supported by NLTK.")
+
+    try:
+        return tuple(stopwords.words(language))
+    except LookupError as e:
+        raise KiaraProcessingException(f"Failed to load NLTK stopwords for language '{language}': {e}")
+
+
+@lru_cache(maxsize=64)
+def get_stopwords_set(languages: Tuple[str, ...], custom_stopwords: Tuple[str, ...] = ()) -> "pa.Table":
+    """Return the (cached) stopword set table for a combination of NLTK languages and custom stop words.
+
+    See 'kiara_plugin.topic_modelling.utils.build_stopwords_set' for the format of the table.
+    """
+
+    from kiara_plugin.topic_modelling.utils import build_stopwords_set
+
+    words: List[str] = []
+    for language in languages:
+        words.extend(get_stopwords(language))
+    words.extend(custom_stopwords)
+
+    return build_stopwords_set(words)
+
+
+@lru_cache(maxsize=None)
+def get_normalizer(method: str, language: str = "english") -> Callable[[str], str]:
+    """Return a (cached) function that stems or lemmatizes a single token.
+
+    Supported methods are the NLTK 'porter', 'lancaster' and 'snowball' stemmers, and the 'wordnet' lemmatizer. Only the
+    snowball stemmer supports other languages than English, a 'KiaraProcessingException' is raised for any other
+    combination.
+    """
+
+    if method not in NORMALIZATION_METHODS:
+        raise KiaraProcessingException(f"Unknown normalization method '{method}', available: {', '.join(NORMALIZATION_METHODS)}")
+
+    if method != "snowball" and language != "english":
+        raise KiaraProcessingException(f"Language '{language}' not supported by the '{method}' method, only 'english' is (use 'snowball' for other languages).")
+
+    normalize: Callable[[str], str]
+    if method == "porter":
+        from nltk.stem import PorterStemmer  # type: ignore
+
+        normalize = PorterStemmer().stem
+    elif method == "lancaster":
+        from nltk.stem import LancasterStemmer  # type: ignore
+
+        normalize = LancasterStemmer().stem
+    elif method == "snowball":
+        from nltk.stem import SnowballStemmer  # type: ignore
+
+        if language not in SnowballStemmer.languages:
+            raise KiaraProcessingException(
+                f"Language '{language}' not supported by the snowball stemmer, available: {', '.join(SnowballStemmer.languages)}"
+            )
+        normalize = SnowballStemmer(language).stem
+    else:
+        from nltk.stem import WordNetLemmatizer  # type: ignore
+
+        ensure_nltk_resource("wordnet")
+        normalize = WordNetLemmatizer().lemmatize
+
+    return normalize
+
+
+@lru_cache(maxsize=None)
+def _get_cached_normalizer(method: str, language: str) -> Callable[[str], str]:
+    """Return the normalizer for a method and language, wrapped in a (bounded, thread-safe) LRU cache of its results."""
+
+    return lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)(get_normalizer(method, language))
+
+
+def normalize_tokens(tokens: Iterable[str], method: str, language: str = "english") -> List[str]:
+    """Stem or lemmatize a list of (distinct) tokens.
+
+    Results are cached per method and language for the lifetime of the process (the 'NORMALIZATION_CACHE_SIZE' most
+    recently used tokens of every combination), so tokens that were normalized recently with the same settings are
+    not passed to the normalizer again.
+    """
+
+    normalize = _get_cached_normalizer(method, language)
+    return [normalize(token) for token in tokens]
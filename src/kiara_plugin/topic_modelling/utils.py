@@ -0,0 +1,626 @@
+# -*- coding: utf-8 -*-
+
+"""Helper functions that operate directly on Arrow (list) arrays, shared by the modules of this plugin."""
+
+import sys
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pyarrow as pa
+    from gensim import corpora  # type: ignore
+
+# gensim's defaults for 'Dictionary.filter_extremes', used for the filters that are not set if any filter is set
+DEFAULT_NO_BELOW = 5
+DEFAULT_NO_ABOVE = 0.5
+DEFAULT_KEEP_N = 100000
+
+T = TypeVar("T")
+
+if sys.version_info >= (3, 10):
+    from itertools import pairwise
+else:
+
+    def pairwise(iterable: Iterable[T]) -> Iterator[Tuple[T, T]]:
+        """Iterate over successive pairs of items, like 'itertools.pairwise' (which was added in Python 3.10)."""
+
+        iterator = iter(iterable)
+        previous = next(iterator, None)
+        for item in iterator:
+            yield previous, item  # type: ignore
+            previous = item
+
+
+def iter_chunks(
+    array: Union["pa.Array", "pa.ChunkedArray"], chunk_size: Union[int, None] = None
+) -> Iterator["pa.Array"]:
+    """Iterate over contiguous, zero-copy slices of a (chunked) array, in order.
+
+    Slices never span more than one chunk of the array, and have at most 'chunk_size' rows. If 'chunk_size' is not
+    set, the chunks of the array are returned as they are.
+    """
+
+    import pyarrow as pa  # type: ignore
+
+    chunks = array.chunks if isinstance(array, pa.ChunkedArray) else [array]
+
+    for chunk in chunks:
+        if not chunk_size:
+            yield chunk
+            continue
+        for offset in range(0, len(chunk), chunk_size):
+            yield chunk.slice(offset, chunk_size)
+
+
+def map_chunks(
+    array: Union["pa.Array", "pa.ChunkedArray"],
+    func: Callable[["pa.Array"], "pa.Array"],
+    result_type: Union["pa.DataType", None] = None,
+    chunk_size: Union[int, None] = None,
+) -> "pa.ChunkedArray":
+    """Apply a function to every chunk of a (chunked) array, and assemble the results into a chunked array.
+
+    If 'chunk_size' is set, chunks of the array are further split, so the function never sees more than 'chunk_size' rows at once.
+    """
+
+    import pyarrow as pa  # type: ignore
+
+    chunks = [func(chunk) for chunk in iter_chunks(array, chunk_size=chunk_size)]
+
+    if not chunks:
+        if result_type is None:
+            raise Exception("Can't determine type of result: no chunks in array.")
+        return pa.chunked_array([], type=result_type)
+
+    return pa.chunked_array(chunks, type=result_type)
+
+
+def build_list_array(
+    counts: "np.ndarray", values: "pa.Array", is_null: Union["np.ndarray", None] = None
+) -> "pa.ListArray":
+    """Create a list array from its flat values and the number of values in each list.
+
+    Lists where 'is_null' is set are null in the result (they must not have any values).
+    """
+
+    import numpy as np
+    import pyarrow as pa  # type: ignore
+
+    offsets = np.zeros(len(counts) + 1, dtype=np.int32)
+    np.cumsum(counts, out=offsets[1:])
+
+    if is_null is not None and is_null.any():
+        offsets_array = pa.array(offsets, mask=np.append(is_null, False))
+    else:
+        offsets_array = pa.array(offsets)
+
+    return pa.ListArray.from_arrays(offsets_array, values)
+
+
+def filter_list_values(
+    list_array: "pa.ListArray", keep: "pa.Array", values: Union["pa.Array", None] = None
+) -> "pa.ListArray":
+    """Remove values from the lists of a list array.
+
+    The 'keep' mask is aligned with the flattened values of the array (as returned by 'list_array.flatten()'),
+    null values in the mask are treated as 'False'. Null lists stay null.
+
+    If 'values' is set, it replaces the flattened values of the array (and must be aligned with them).
+    """
+
+    import numpy as np
+    import pyarrow.compute as pc  # type: ignore
+
+    if values is None:
+        values = list_array.flatten()
+    parents = pc.list_parent_indices(list_array)
+
+    kept_values = values.filter(keep)
+    kept_parents = parents.filter(keep).to_numpy(zero_copy_only=False)
+    counts = np.bincount(kept_parents, minlength=len(list_array))
+
+    is_null = list_array.is_null().to_numpy(zero_copy_only=False)
+    return build_list_array(counts, kept_values, is_null=is_null)
+
+
+def split_characters(array: "pa.Array") -> "pa.ListArray":
+    """Split every string of an array into its characters (unicode code points).
+
+    This works on the UTF-8 buffer of the array directly: the character boundaries are the bytes that are not
+    continuation bytes, the character values share the data buffer of the input array.
+    """
+
+    import numpy as np
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+
+    if not pa.types.is_string(array.type):
+        array = pc.cast(array, pa.string())
+
+    is_null = array.is_null().to_numpy(zero_copy_only=False)
+    _, offsets_buffer, data_buffer = array.buffers()
+    offsets = np.frombuffer(offsets_buffer, dtype=np.int32)[
+        array.offset : array.offset + len(array) + 1
+    ]
+
+    start, end = int(offsets[0]), int(offsets[-1])
+    if data_buffer is None or start == end:
+        data = np.zeros(0, dtype=np.uint8)
+        data_buffer = pa.py_buffer(b"")
+    else:
+        data = np.frombuffer(data_buffer, dtype=np.uint8)[start:end]
+
+    # UTF-8 continuation bytes look like '10xxxxxx', every other byte starts a new character
+    is_start = (data & 0xC0) != 0x80
+    num_chars = int(np.count_nonzero(is_start))
+
+    char_offsets = np.empty(num_chars + 1, dtype=np.int32)
+    if num_chars == len(data):
+        # pure ASCII, no need to search for the character boundaries
+        char_offsets[:-1] = np.arange(start, end, dtype=np.int32)
+    else:
+        char_offsets[:-1] = np.flatnonzero(is_start) + start
+    char_offsets[-1] = end
+
+    chars = pa.StringArray.from_buffers(num_chars, pa.py_buffer(char_offsets), data_buffer)
+    counts = np.diff(np.searchsorted(char_offsets[:-1], offsets))
+
+    return build_list_array(counts, chars, is_null=is_null)
+
+
+def split_whitespace(array: "pa.Array") -> "pa.ListArray":
+    """Split every string of an array on (unicode) whitespace, like Python's 'str.split()'."""
+
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+
+    if not pa.types.is_string(array.type):
+        array = pc.cast(array, pa.string())
+
+    split = pc.utf8_split_whitespace(array)
+    # leading and trailing whitespace result in empty strings, which 'str.split()' doesn't return
+    keep = pc.greater(pc.binary_length(split.flatten()), 0)
+    return filter_list_values(split, keep)
+
+
+def is_dictionary_encoded(data_type: "pa.DataType") -> bool:
+    """Return whether a type is a list of dictionary-encoded tokens ('list<dictionary<int32, string>>')."""
+
+    import pyarrow as pa  # type: ignore
+
+    return (pa.types.is_list(data_type) or pa.types.is_large_list(data_type)) and pa.types.is_dictionary(data_type.value_type)
+
+
+def get_vocabulary(tokens_array: Union["pa.Array", "pa.ChunkedArray"]) -> "pa.Array":
+    """Return the vocabulary (the dictionary shared by all chunks) of a dictionary-encoded token array."""
+
+    import pyarrow as pa  # type: ignore
+
+    values = [chunk.flatten() for chunk in iter_chunks(tokens_array)]
+    values = [chunk_values for chunk_values in values if len(chunk_values)]
+    if not values:
+        return pa.array([], type=tokens_array.type.value_type.value_type)
+
+    vocabulary = values[0].dictionary
+    for chunk_values in values[1:]:
+        if not chunk_values.dictionary.equals(vocabulary):
+            raise Exception("Invalid dictionary-encoded token array: chunks don't share the same vocabulary.")
+    return vocabulary
+
+
+def encode_tokens(tokens_array: Union["pa.Array", "pa.ChunkedArray"]) -> "pa.ChunkedArray":
+    """Convert a 'list<string>' token array into a 'list<dictionary<int32, string>>' array.
+
+    Every document holds integer token ids into one vocabulary, which is shared by all chunks of the result.
+    """
+
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+
+    if is_dictionary_encoded(tokens_array.type):
+        get_vocabulary(tokens_array)
+        return tokens_array if isinstance(tokens_array, pa.ChunkedArray) else pa.chunked_array([tokens_array])
+
+    encoded_type = pa.list_(pa.dictionary(pa.int32(), pa.string()))
+    chunks = list(iter_chunks(tokens_array))
+    if not chunks:
+        return pa.chunked_array([], type=encoded_type)
+
+    chunk_values = [pc.cast(chunk.flatten(), pa.string()) for chunk in chunks]
+    # encoding all values at once gives every chunk the same dictionary; the result is sliced back into the original
+    # chunks by position, since 'dictionary_encode' doesn't keep the chunk layout (it drops chunks without values)
+    encoded_values = pc.dictionary_encode(pa.concat_arrays(chunk_values))
+
+    encoded_chunks = []
+    offset = 0
+    for chunk, values in zip(chunks, chunk_values):
+        counts = pc.fill_null(pc.list_value_length(chunk), 0).to_numpy(zero_copy_only=False)
+        is_null = chunk.is_null().to_numpy(zero_copy_only=False)
+        encoded_chunks.append(build_list_array(counts, encoded_values.slice(offset, len(values)), is_null=is_null))
+        offset += len(values)
+
+    return pa.chunked_array(encoded_chunks, type=encoded_type)
+
+
+def decode_tokens(tokens_array: Union["pa.Array", "pa.ChunkedArray"]) -> "pa.ChunkedArray":
+    """Convert a 'list<dictionary<int32, string>>' token array back into a 'list<string>' array."""
+
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+
+    def decode(chunk: "pa.Array") -> "pa.Array":
+        counts = pc.fill_null(pc.list_value_length(chunk), 0).to_numpy(zero_copy_only=False)
+        is_null = chunk.is_null().to_numpy(zero_copy_only=False)
+        return build_list_array(counts, chunk.flatten().dictionary_decode(), is_null=is_null)
+
+    return map_chunks(tokens_array, decode, result_type=pa.list_(pa.string()))
+
+
+def remap_vocabulary(tokens_array: Union["pa.Array", "pa.ChunkedArray"], new_tokens: "pa.Array") -> "pa.ChunkedArray":
+    """Replace the tokens of a dictionary-encoded token array, by changing its vocabulary only.
+
+    'new_tokens' is aligned with the current vocabulary, and contains the replacement for each vocabulary entry, or null
+    if all occurrences of that entry should be removed. Entries that end up with the same value are merged, so the
+    result again has a vocabulary of unique tokens. The work done per token in the corpus is a single 'take'.
+    """
+
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+
+    new_vocabulary = pc.unique(new_tokens.drop_null())
+    # position of every (old) vocabulary entry in the new vocabulary, null if removed
+    mapping = pc.index_in(new_tokens, value_set=new_vocabulary)
+
+    def remap(chunk: "pa.Array") -> "pa.Array":
+        new_ids = pc.take(mapping, chunk.flatten().indices)
+        values = pa.DictionaryArray.from_arrays(new_ids, new_vocabulary)
+        return filter_list_values(chunk, pc.is_valid(new_ids), values=values)
+
+    return map_chunks(tokens_array, remap, result_type=pa.list_(pa.dictionary(pa.int32(), pa.string())))
+
+
+def count_token_ids(tokens_array: Union["pa.Array", "pa.ChunkedArray"]) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Count how often each token id occurs in each document of a dictionary-encoded token array.
+
+    Returns three aligned arrays (document index, token id, count), with one item per distinct token of each document,
+    sorted by document index and token id. Null tokens are ignored.
+    """
+
+    import numpy as np
+    import pyarrow.compute as pc  # type: ignore
+
+    vocabulary_size = max(len(get_vocabulary(tokens_array)), 1)
+
+    keys = []
+    doc_offset = 0
+    for chunk in iter_chunks(tokens_array):
+        token_ids = chunk.flatten().indices
+        doc_index = pc.list_parent_indices(chunk)
+        if token_ids.null_count:
+            valid = pc.is_valid(token_ids)
+            token_ids = token_ids.filter(valid)
+            doc_index = doc_index.filter(valid)
+
+        doc_index_np = doc_index.to_numpy(zero_copy_only=False).astype(np.int64) + doc_offset
+        keys.append(doc_index_np * vocabulary_size + token_ids.to_numpy(zero_copy_only=False))
+        doc_offset += len(chunk)
+
+    if keys:
+        unique_keys, counts = np.unique(np.concatenate(keys), return_counts=True)
+    else:
+        unique_keys, counts = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    return unique_keys // vocabulary_size, unique_keys % vocabulary_size, counts
+
+
+def build_vocabulary(
+    vocabulary: "pa.Array",
+    doc_index: "np.ndarray",
+    token_ids: "np.ndarray",
+    counts: "np.ndarray",
+    num_docs: int,
+    no_below: Union[int, None] = None,
+    no_above: Union[float, None] = None,
+    keep_n: Union[int, None] = None,
+) -> Tuple["pa.Table", "np.ndarray"]:
+    """Build the (filtered) vocabulary of a corpus, from the output of 'count_token_ids'.
+
+    Document and term frequencies are computed with 'bincount' on the token ids. Tokens that occur in less than
+    'no_below' documents, or in more than 'no_above' (a fraction) of all documents are removed, and only the 'keep_n'
+    tokens with the highest document frequencies are kept, like gensim's 'Dictionary.filter_extremes' does, but in one pass.
+    Ids are assigned like gensim assigns them when a dictionary is built document by document: in the order of the
+    first document a token appears in, and alphabetically within that document.
+
+    Returns a table with the columns 'id', 'token', 'document_frequency' and 'term_frequency' (one row per kept token,
+    sorted by id), and an array that maps every position of 'vocabulary' to its new id (-1 if the token was removed).
+    """
+
+    import numpy as np
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+
+    vocabulary_size = len(vocabulary)
+    dfs = np.bincount(token_ids, minlength=vocabulary_size)
+    cfs = np.bincount(token_ids, weights=counts, minlength=vocabulary_size).astype(np.int64)
+
+    # token ids are sorted by document, so the first occurrence of a token is in its first document
+    used, first_position = np.unique(token_ids, return_index=True)
+    first_doc = doc_index[first_position]
+    string_rank = np.empty(vocabulary_size, dtype=np.int64)
+    string_rank[pc.array_sort_indices(vocabulary).to_numpy()] = np.arange(vocabulary_size)
+    ordered = used[np.lexsort((string_rank[used], first_doc))]
+
+    keep = np.ones(len(ordered), dtype=bool)
+    if no_below is not None:
+        keep &= dfs[ordered] >= no_below
+    if no_above is not None:
+        keep &= dfs[ordered] <= int(no_above * num_docs)
+    kept = ordered[keep]
+    if keep_n is not None and len(kept) > keep_n:
+        top = np.argsort(-dfs[kept], kind="stable")[:keep_n]
+        kept = kept[np.sort(top)]
+
+    id_map = np.full(vocabulary_size, -1, dtype=np.int64)
+    id_map[kept] = np.arange(len(kept))
+
+    vocabulary_table = pa.table(
+        {
+            "id": pa.array(np.arange(len(kept)), type=pa.int64()),
+            "token": pc.take(vocabulary, pa.array(kept, type=pa.int64())),
+            "document_frequency": pa.array(dfs[kept], type=pa.int64()),
+            "term_frequency": pa.array(cfs[kept], type=pa.int64()),
+        }
+    )
+    return vocabulary_table, id_map
+
+
+def create_gensim_dictionary(vocabulary_table: "pa.Table", num_docs: int = 0, num_pos: int = 0, num_nnz: int = 0) -> "corpora.Dictionary":
+    """Create a gensim dictionary from a vocabulary table (see 'build_vocabulary')."""
+
+    from gensim import corpora  # type: ignore
+
+    ids = vocabulary_table.column("id").to_pylist()
+
+    id2word = corpora.Dictionary()
+    id2word.token2id = dict(zip(vocabulary_table.column("token").to_pylist(), ids))
+    id2word.dfs = dict(zip(ids, vocabulary_table.column("document_frequency").to_pylist()))
+    id2word.cfs = dict(zip(ids, vocabulary_table.column("term_frequency").to_pylist()))
+    id2word.num_docs = num_docs
+    id2word.num_pos = num_pos
+    id2word.num_nnz = num_nnz
+    return id2word
+
+
+def vocabulary_filter_args(no_below: Union[int, None], no_above: Union[float, None]) -> Dict[str, Any]:
+    """Return the arguments for 'build_vocabulary', if any filter is set (gensim's defaults apply to the other ones)."""
+
+    if not no_below and not no_above:
+        return {}
+    return {
+        "no_below": no_below or DEFAULT_NO_BELOW,
+        "no_above": no_above or DEFAULT_NO_ABOVE,
+        "keep_n": DEFAULT_KEEP_N,
+    }
+
+
+def build_dictionary(
+    tokens_array: Union["pa.Array", "pa.ChunkedArray"], no_below: Union[int, None], no_above: Union[float, None],
+    doc_mask: Union["np.ndarray", None] = None
+) -> Tuple["pa.ChunkedArray", Tuple["np.ndarray", "np.ndarray", "np.ndarray"], "pa.Table", "np.ndarray", "corpora.Dictionary"]:
+    """Dictionary-encode a token array, count its tokens, and build the (filtered) vocabulary and gensim dictionary.
+
+    If a mask of documents is provided, the vocabulary (and its filters and frequencies) is built from those
+    documents only, e.g. to exclude held-out documents.
+
+    Returns the encoded token array, the per-document token counts of all documents (see 'count_token_ids'), the
+    vocabulary table, the map from token ids to dictionary ids (see 'build_vocabulary'), and the gensim dictionary.
+    """
+
+    tokens_array = encode_tokens(tokens_array)
+    doc_index, token_ids, counts = count_token_ids(tokens_array)
+    if doc_mask is None:
+        vocabulary_doc_index, vocabulary_token_ids, vocabulary_counts = doc_index, token_ids, counts
+        num_docs = len(tokens_array)
+    else:
+        vocabulary_doc_index, vocabulary_token_ids, vocabulary_counts, num_docs = select_documents(
+            doc_mask, doc_index, token_ids, counts
+        )
+
+    vocabulary_table, id_map = build_vocabulary(
+        get_vocabulary(tokens_array), vocabulary_doc_index, vocabulary_token_ids, vocabulary_counts, num_docs=num_docs,
+        **vocabulary_filter_args(no_below, no_above)
+    )
+    id2word = create_gensim_dictionary(
+        vocabulary_table, num_docs=num_docs, num_pos=int(vocabulary_counts.sum()), num_nnz=len(vocabulary_token_ids)
+    )
+    return tokens_array, (doc_index, token_ids, counts), vocabulary_table, id_map, id2word
+
+
+def select_documents(doc_mask: "np.ndarray", doc_index: "np.ndarray", token_ids: "np.ndarray", counts: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray", "np.ndarray", int]:
+    """Select the per-document token counts of the documents in a mask, and renumber the documents.
+
+    Returns the document index, token ids and counts of the selected documents, and the number of selected documents.
+    """
+
+    import numpy as np
+
+    keep = doc_mask[doc_index]
+    new_index = np.cumsum(doc_mask) - 1
+    return new_index[doc_index[keep]], token_ids[keep], counts[keep], int(doc_mask.sum())
+
+
+def csr_from_token_ids(id_map: "np.ndarray", doc_index: "np.ndarray", token_ids: "np.ndarray", counts: "np.ndarray", num_docs: int) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Create a sparse (CSR) document-term matrix from per-document token counts, using a map from token ids to dictionary ids.
+
+    Returns the row offsets ('indptr'), and the dictionary ids and counts of every row, sorted by id.
+    """
+
+    import numpy as np
+
+    ids = id_map[token_ids] if len(token_ids) else token_ids
+    keep = ids >= 0
+    doc_index, ids, counts = doc_index[keep], ids[keep], counts[keep]
+    order = np.lexsort((ids, doc_index))
+    doc_index, ids, counts = doc_index[order], ids[order], counts[order]
+
+    indptr = np.searchsorted(doc_index, np.arange(num_docs + 1))
+    return indptr, ids, counts
+
+
+def tfidf_weights(indptr: "np.ndarray", ids: "np.ndarray", counts: "np.ndarray", num_terms: int) -> "np.ndarray":
+    """Return the TF-IDF weights of the entries of a (CSR) document-term matrix.
+
+    Like gensim's default 'TfidfModel': the term count times log2(number of documents / document frequency), and the
+    weights of every document normalized to unit length.
+    """
+
+    import numpy as np
+
+    num_docs = len(indptr) - 1
+    document_frequencies = np.bincount(ids, minlength=num_terms)
+    idf = np.log2(num_docs / np.maximum(document_frequencies, 1))
+    weights = counts.astype(np.float64) * idf[ids]
+
+    rows = np.repeat(np.arange(num_docs), np.diff(indptr))
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=num_docs))
+    normalized: "np.ndarray" = weights / np.where(norms > 0, norms, 1.0)[rows]
+    return normalized
+
+
+def preprocess_token_values(
+    values: "pa.Array", lowercase: bool = False, isalpha: bool = False, min_length: Union[int, None] = None
+) -> Tuple["pa.Array", Union["pa.Array", None]]:
+    """Pre-process a flat array of tokens with Arrow compute kernels.
+
+    Returns the (possibly lowercased) tokens, and a boolean mask of the tokens to keep ('None' if all are kept).
+    Non-string tokens are converted to strings first, nulls become 'None', like they would with 'str()'.
+
+    Lowercasing uses Arrow's 'utf8_lower', which maps every character on its own. It differs from Python's
+    'str.lower' for the few characters with special casing rules: U+0130 (capital I with dot above) becomes 'i' (not
+    'i' followed by U+0307, combining dot above), and a final U+03A3 (capital sigma) becomes U+03C3 (small sigma, not
+    U+03C2, final sigma). The token lengths checked by 'min_length' are the ones of the Arrow result.
+    """
+
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+
+    if not pa.types.is_string(values.type):
+        values = pc.cast(values, pa.string())
+    if values.null_count:
+        values = pc.fill_null(values, "None")
+
+    if lowercase:
+        values = pc.utf8_lower(values)
+
+    keep = None
+    if isalpha:
+        keep = pc.utf8_is_alpha(values)
+    if min_length:
+        long_enough = pc.greater_equal(pc.utf8_length(values), min_length)
+        keep = long_enough if keep is None else pc.and_(keep, long_enough)
+
+    return values, keep
+
+
+def preprocess_tokens(
+    tokens_array: "pa.Array", lowercase: bool = False, isalpha: bool = False, min_length: Union[int, None] = None
+) -> "pa.Array":
+    """Pre-process an array of tokens, or a (nested) list array of tokens, keeping the list structure.
+
+    Tokens that don't pass the filters are removed from their lists, lists themselves are never removed.
+    """
+
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+
+    data_type = tokens_array.type
+    if not (pa.types.is_list(data_type) or pa.types.is_large_list(data_type)):
+        values, keep = preprocess_token_values(tokens_array, lowercase=lowercase, isalpha=isalpha, min_length=min_length)
+        return values if keep is None else values.filter(keep)
+
+    is_null = tokens_array.is_null().to_numpy(zero_copy_only=False)
+
+    if pa.types.is_list(data_type.value_type) or pa.types.is_large_list(data_type.value_type):
+        counts = pc.fill_null(pc.list_value_length(tokens_array), 0).to_numpy(zero_copy_only=False)
+        child = preprocess_tokens(tokens_array.flatten(), lowercase=lowercase, isalpha=isalpha, min_length=min_length)
+        return build_list_array(counts, child, is_null=is_null)
+
+    values, keep = preprocess_token_values(tokens_array.flatten(), lowercase=lowercase, isalpha=isalpha, min_length=min_length)
+    if keep is None:
+        counts = pc.fill_null(pc.list_value_length(tokens_array), 0).to_numpy(zero_copy_only=False)
+        return build_list_array(counts, values, is_null=is_null)
+    return filter_list_values(tokens_array, keep, values=values)
+
+
+def build_stopwords_set(words: Iterable[str]) -> "pa.Table":
+    """Build a stopword set table from a list of stop words.
+
+    The table has the (distinct, sorted) stop words in the 'word' column, and their lowercased variants in the 'lower'
+    column, so consumers can use them as lookup value sets without preparing them again.
+    """
+
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+
+    words_array = pc.unique(pa.array([str(word) for word in words], type=pa.string()))
+    words_array = pc.take(words_array, pc.array_sort_indices(words_array))
+
+    return pa.table({"word": words_array, "lower": pc.utf8_lower(words_array)})
+
+
+def get_stopwords_values(stopwords_set: "pa.Table") -> Tuple["pa.Array", "pa.Array"]:
+    """Return the stop words, and their distinct lowercased variants, of a stopword set table (see 'build_stopwords_set')."""
+
+    import pyarrow.compute as pc  # type: ignore
+
+    for column in ("word", "lower"):
+        if column not in stopwords_set.column_names:
+            raise ValueError(f"Invalid stopword set, missing column '{column}'.")
+
+    words = stopwords_set.column("word").combine_chunks()
+    lower = pc.unique(stopwords_set.column("lower").combine_chunks())
+    return words, lower
+
+
+def stopwords_keep_mask(
+    values: "pa.Array", stopwords: "pa.Array", ignore_case: bool = False, lower_stopwords: Union["pa.Array", None] = None
+) -> "pa.Array":
+    """Return a boolean mask of the tokens in a flat array of tokens that are not stopwords.
+
+    'stopwords' is used as the value set of the lookup as it is, so it should be built once and re-used.
+
+    If 'ignore_case' is set, tokens are matched case-insensitively: the lowercased tokens are only computed for the
+    distinct tokens of the array, not for every token, so there is no second (lowercased) copy of the tokens. If the
+    lowercased stop words were already computed, they can be passed in as 'lower_stopwords'. Lowercasing uses Arrow's
+    'utf8_lower' (see 'preprocess_token_values' for how it differs from 'str.lower').
+    """
+
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+
+    if not ignore_case:
+        return pc.invert(pc.is_in(values, value_set=stopwords))
+
+    encoded = values if pa.types.is_dictionary(values.type) else pc.dictionary_encode(values)
+    if lower_stopwords is None:
+        lower_stopwords = pc.unique(pc.utf8_lower(stopwords))
+    vocabulary_keep = pc.invert(pc.is_in(pc.utf8_lower(encoded.dictionary), value_set=lower_stopwords))
+    return pc.fill_null(pc.take(vocabulary_keep, encoded.indices), True)
+
+
+def decode_chunk(chunk: Union[str, bytes, bytearray, memoryview]) -> str:
+    """Return a chunk of serialized data (e.g. a path, or json data) as a string."""
+
+    if isinstance(chunk, str):
+        return chunk
+    return bytes(chunk).decode("utf-8")
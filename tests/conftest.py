@@ -15,6 +15,7 @@ import tempfile
 import uuid
 from pathlib import Path
 
+import pyarrow as pa
 import pytest
 from _pytest.compat import NotSetType
 
@@ -49,11 +50,16 @@ def get_job_alias(job_desc: JobDesc) -> str:
 
 
 @pytest.fixture
-def kiara_api() -> KiaraAPI:
+def kiara_config() -> KiaraConfig:
 
     instance_path = create_temp_dir()
-    kc = KiaraConfig.create_in_folder(instance_path)
-    api = KiaraAPI(kc)
+    return KiaraConfig.create_in_folder(instance_path)
+
+
+@pytest.fixture
+def kiara_api(kiara_config) -> KiaraAPI:
+
+    api = KiaraAPI(kiara_config)
     return api
 
 
@@ -111,3 +117,19 @@ def example_pipelines_folder() -> Path:
 @pytest.fixture()
 def tests_resources_folder() -> Path:
     return Path(os.path.join(ROOT_DIR, "tests"))
+
+
+@pytest.fixture
+def tokens_array() -> pa.Array:
+    """A small corpus of tokenized documents, about two clearly separated topics."""
+
+    return pa.array(
+        [
+            ["apple", "banana", "cherry", "apple", "banana"],
+            ["banana", "cherry", "apple", "cherry"],
+            ["engine", "wheel", "brake", "engine", "wheel"],
+            ["wheel", "brake", "engine", "brake"],
+            ["apple", "cherry", "banana", "banana"],
+            ["brake", "wheel", "engine", "engine"],
+        ]
+    )
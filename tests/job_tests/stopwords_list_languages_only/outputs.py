@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+from kiara.models.values.value import Value
+
+
+def check_stopwords_list(stopwords_list: Value):
+
+    words = stopwords_list.data.list_data
+    assert "the" in words, "English stop word 'the' missing from stop words list"
+    assert len(words) == len(set(words)), "Stop words list contains duplicates"
+
+
+def check_stopwords_set(stopwords_set: Value):
+
+    table = stopwords_set.data.arrow_table
+    assert "the" in table.column("word").to_pylist()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the 'topic_modelling.coherence' module."""
+
+import numpy as np
+import pyarrow as pa
+
+DOCUMENTS = [
+    ["human", "interface", "computer"],
+    ["survey", "user", "computer", "system", "response", "time"],
+    ["eps", "user", "interface", "system"],
+    ["system", "human", "system", "eps"],
+    ["user", "response", "time"],
+    ["trees"],
+    ["graph", "trees"],
+    ["graph", "minors", "trees"],
+    ["graph", "minors", "survey"],
+]
+
+TOPICS = [
+    ["human", "computer", "system", "interface"],
+    ["graph", "minors", "trees", "eps"],
+    ["user", "response", "time", "survey"],
+]
+
+
+def test_coherence_matches_gensim(kiara_api):
+
+    from gensim.corpora import Dictionary  # type: ignore
+    from gensim.models import CoherenceModel  # type: ignore
+
+    results = kiara_api.run_job(
+        "topic_modelling.coherence",
+        inputs={"tokens_array": pa.array(DOCUMENTS), "topics": TOPICS, "measures": ["u_mass", "c_v"], "num_workers": 1},
+        comment="Score topics against a small corpus",
+    )
+    coherence = results["coherence"].data.arrow_table
+
+    # all documents are shorter than the 'c_v' window, so the sliding window counts are the same as gensim's
+    dictionary = Dictionary(DOCUMENTS)
+    corpus = [dictionary.doc2bow(document) for document in DOCUMENTS]
+    for measure in ("u_mass", "c_v"):
+        expected = CoherenceModel(
+            topics=TOPICS, texts=DOCUMENTS, corpus=corpus, dictionary=dictionary, coherence=measure, processes=1
+        ).get_coherence_per_topic()
+        np.testing.assert_allclose(coherence.column(measure).to_numpy(), expected, rtol=1e-6)
+
+
+def test_co_occurrence_statistics_merge_new_words():
+
+    from kiara_plugin.topic_modelling.modules.coherence import (
+        get_co_occurrence_statistics,
+    )
+    from kiara_plugin.topic_modelling.utils import encode_tokens
+
+    tokens_array = encode_tokens(pa.array(DOCUMENTS))
+    words = [word for topic in TOPICS for word in topic]
+
+    # the second call only counts the words that are not cached yet
+    get_co_occurrence_statistics("merge-test", tokens_array, words[:6], window_size=3, num_workers=1)
+    merged = get_co_occurrence_statistics("merge-test", tokens_array, words[4:], window_size=3, num_workers=1)
+    counted = get_co_occurrence_statistics("count-test", tokens_array, words, window_size=3, num_workers=1)
+
+    assert merged["index"] == counted["index"]
+    assert merged["num_windows"] == counted["num_windows"]
+    np.testing.assert_array_equal(merged["occurrences"], counted["occurrences"])
+    np.testing.assert_array_equal(merged["co_occurrences"].toarray(), counted["co_occurrences"].toarray())
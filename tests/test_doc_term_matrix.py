@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the 'topic_modelling.doc_term_matrix' module, and the modules that use its result."""
+
+import numpy as np
+
+from kiara.api import KiaraAPI
+
+
+def test_lda_from_doc_term_matrix(kiara_api, tokens_array):
+
+    doc_term_matrix = kiara_api.run_job(
+        "topic_modelling.doc_term_matrix", inputs={"tokens_array": tokens_array}, comment="Count the tokens"
+    )["doc_term_matrix"]
+
+    # the same corpus and dictionary, so the same model as when training on the tokens
+    settings = {"num_topics": 2, "passes": 2, "random_state": 1}
+    from_tokens = kiara_api.run_job(
+        "topic_modelling.lda", inputs={"tokens_array": tokens_array, **settings}, comment="Train on the tokens"
+    )
+    from_matrix = kiara_api.run_job(
+        "topic_modelling.lda", inputs={"doc_term_matrix": doc_term_matrix, **settings}, comment="Train on the matrix"
+    )
+
+    assert from_matrix["vocabulary"].data.arrow_table.equals(from_tokens["vocabulary"].data.arrow_table)
+    np.testing.assert_allclose(from_matrix["model"].data.topic_word, from_tokens["model"].data.topic_word)
+
+
+def test_doc_term_matrix_roundtrip(kiara_config, kiara_api, tokens_array):
+
+    matrix = kiara_api.run_job(
+        "topic_modelling.doc_term_matrix",
+        inputs={"tokens_array": tokens_array, "tfidf": True},
+        comment="Count and weight the tokens",
+    )["doc_term_matrix"]
+    kiara_api.store_value(matrix, "doc_term_matrix")
+
+    # a new api instance doesn't have the value cached, so the matrix is deserialized from the store
+    loaded = KiaraAPI(kiara_config).get_value("alias:doc_term_matrix").data
+
+    assert loaded is not matrix.data
+    assert loaded.array_paths
+    assert loaded.weighting == matrix.data.weighting == "tfidf"
+    np.testing.assert_allclose(loaded.to_scipy().toarray(), matrix.data.to_scipy().toarray())
+    assert loaded.instance_id == matrix.data.instance_id
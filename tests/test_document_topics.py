@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the 'topic_modelling.document_topics' module."""
+
+import numpy as np
+import pyarrow as pa
+
+from kiara_plugin.topic_modelling.models import LdaModel
+
+
+def _create_documents():
+
+    rng = np.random.default_rng(0)
+    documents = []
+    for doc_id in range(200):
+        # most tokens of a document are from one of three groups of 20 words, a few from any group
+        word_ids = (doc_id % 3) * 20 + rng.integers(0, 20, size=rng.integers(5, 40))
+        word_ids = np.concatenate([word_ids, rng.integers(0, 60, size=3)])
+        documents.append([f"word{word_id}" for word_id in word_ids])
+    return documents
+
+
+def _gensim_document_topics(model, bow_corpus):
+
+    result = np.zeros((len(bow_corpus), model.num_topics))
+    for doc_id, bow in enumerate(bow_corpus):
+        for topic_id, probability in model.get_document_topics(bow, minimum_probability=0.0):
+            result[doc_id, topic_id] = probability
+    return result
+
+
+def test_document_topics_match_gensim(kiara_api):
+
+    from gensim.corpora import Dictionary  # type: ignore
+    from gensim.models import LdaModel as GensimLdaModel  # type: ignore
+
+    documents = _create_documents()
+    dictionary = Dictionary(documents)
+    bow_corpus = [dictionary.doc2bow(tokens) for tokens in documents]
+
+    # gensim initializes the topic weights of a document randomly, and stops once they change by less than the
+    # threshold, so results only match closely if inference runs (almost) to convergence
+    for gamma_threshold, iterations, tolerance in ((1e-8, 1000, 1e-4), (0.001, 50, 0.05)):
+        gensim_model = GensimLdaModel(
+            bow_corpus, id2word=dictionary, num_topics=4, passes=3, random_state=1,
+            iterations=iterations, gamma_threshold=gamma_threshold
+        )
+
+        results = kiara_api.run_job(
+            "topic_modelling.document_topics",
+            inputs={"model": LdaModel.create_from_gensim(gensim_model), "tokens_array": pa.array(documents)},
+            comment="Infer the topics of the training documents",
+        )
+        table = results["document_topics"].data.arrow_table
+        document_topics = np.column_stack([table.column(f"topic_{idx}").to_numpy() for idx in range(4)])
+
+        expected = _gensim_document_topics(gensim_model, bow_corpus)
+        np.testing.assert_allclose(document_topics, expected, atol=tolerance)
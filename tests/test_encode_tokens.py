@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for dictionary-encoded token arrays."""
+
+import numpy as np
+import pyarrow as pa
+
+from kiara_plugin.topic_modelling.utils import (
+    build_dictionary,
+    decode_tokens,
+    encode_tokens,
+)
+
+
+def _chunked_tokens() -> pa.ChunkedArray:
+
+    # chunks whose tokens were all filtered out: one without documents, one with empty documents only
+    return pa.chunked_array(
+        [
+            [["a", "b"]],
+            pa.array([], type=pa.list_(pa.string())),
+            [[], []],
+            [["c"], None, ["a"]],
+        ]
+    )
+
+
+def test_encode_tokens_keeps_chunks_without_values():
+
+    tokens_array = _chunked_tokens()
+    encoded = encode_tokens(tokens_array)
+
+    assert len(encoded) == len(tokens_array) == 6
+    assert [len(chunk) for chunk in encoded.chunks] == [len(chunk) for chunk in tokens_array.chunks]
+    assert decode_tokens(encoded).to_pylist() == tokens_array.to_pylist()
+
+
+def test_build_dictionary_keeps_chunks_without_values():
+
+    encoded, (doc_index, _, _), vocabulary_table, _, _ = build_dictionary(_chunked_tokens(), no_below=None, no_above=None)
+
+    assert len(encoded) == 6
+    np.testing.assert_array_equal(doc_index, [0, 0, 3, 5])
+    assert vocabulary_table.column("token").to_pylist() == ["a", "b", "c"]
+
+
+def test_normalize_tokens_keeps_chunks_without_values(kiara_api):
+
+    tokens_array = _chunked_tokens()
+    results = kiara_api.run_job(
+        "topic_modelling.normalize_tokens",
+        inputs={"tokens_array": tokens_array, "method": "porter"},
+        comment="Normalize a chunked token array",
+    )
+
+    assert results["tokens_array"].data.arrow_array.to_pylist() == tokens_array.to_pylist()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the 'lda_model' data type."""
+
+import numpy as np
+
+from kiara.api import KiaraAPI
+
+
+def test_lda_model_roundtrip(kiara_config, kiara_api, tokens_array):
+
+    results = kiara_api.run_job(
+        "topic_modelling.lda",
+        inputs={"tokens_array": tokens_array, "num_topics": 2, "random_state": 1},
+        comment="Train an LDA model to store",
+    )
+    model = results["model"]
+    kiara_api.store_value(model, "lda_model")
+
+    # a new api instance doesn't have the value cached, so the model is deserialized from the store
+    loaded = KiaraAPI(kiara_config).get_value("alias:lda_model").data
+
+    assert loaded is not model.data
+    assert loaded.topic_word_path is not None
+    assert loaded.num_topics == model.data.num_topics == 2
+    assert loaded.num_documents == model.data.num_documents
+    assert loaded.vocabulary.equals(model.data.vocabulary)
+    np.testing.assert_allclose(loaded.topic_word, model.data.topic_word, rtol=1e-6)
+    np.testing.assert_allclose(loaded.get_topics(), model.data.get_topics(), rtol=1e-6)
+    # the hash only depends on the content, not on whether it is memory-mapped from the store
+    assert loaded.instance_id == model.data.instance_id
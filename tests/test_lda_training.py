@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the pass-by-pass training of 'topic_modelling.lda'."""
+
+import numpy as np
+
+
+def test_train_passes_match_gensim_passes(tokens_array):
+
+    from gensim.corpora import Dictionary  # type: ignore
+    from gensim.models import LdaModel as GensimLdaModel  # type: ignore
+
+    from kiara_plugin.topic_modelling.modules.lda import _log_perplexity, _train_pass
+
+    documents = tokens_array.to_pylist() * 20
+    dictionary = Dictionary(documents)
+    corpus = [dictionary.doc2bow(document) for document in documents]
+    # several updates per pass, so the learning rate changes within a pass
+    settings = {"id2word": dictionary, "num_topics": 2, "chunksize": 20, "random_state": 1}
+
+    expected = GensimLdaModel(corpus, passes=4, **settings)
+
+    model = GensimLdaModel(**settings)
+    for pass_ in range(4):
+        _train_pass(model, corpus, pass_)
+        # evaluating the model between passes doesn't change how it is trained
+        _log_perplexity(model, corpus[:10])
+
+    assert model.state.numdocs == expected.state.numdocs == len(corpus)
+    assert model.num_updates == expected.num_updates
+    np.testing.assert_allclose(model.get_topics(), expected.get_topics(), rtol=1e-6)
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the 'topic_modelling.remove_stopwords' module."""
+
+import pyarrow as pa
+
+
+def test_remove_stopwords_from_large_lists(kiara_api):
+
+    tokens_array = pa.chunked_array(
+        [[["The", "apple"], ["a", "banana", "and", "cherry"]], [["the", "engine"]]],
+        type=pa.large_list(pa.large_string()),
+    )
+    results = kiara_api.run_job(
+        "topic_modelling.remove_stopwords",
+        inputs={"tokens_array": tokens_array, "stopwords_list": ["the", "a", "and"], "ignore_case": True},
+        comment="Remove stop words from a large list array",
+    )
+    tokens_nostop = results["tokens_array"].data.arrow_array
+
+    assert tokens_nostop.type == pa.list_(pa.string())
+    assert tokens_nostop.to_pylist() == [["apple"], ["banana", "cherry"], ["engine"]]